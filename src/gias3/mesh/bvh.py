@@ -0,0 +1,446 @@
+"""
+FILE: bvh.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Axis-aligned bounding box hierarchy over triangle mesh faces
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+FaceBVH is a linear bounding volume hierarchy. Faces are binned on a
+2^10 grid over the bounding box of their barycenters, sorted along the
+Morton (Z-order) curve of their bins, and split into leaves of leaf_size
+consecutive faces. The leaves are the bottom level of a complete binary
+tree stored in heap order in two contiguous (nodes, 3) arrays of box
+corners: the children of node i are 2i + 1 and 2i + 2, and every level is
+a contiguous block. Unused leaves past the last face have empty boxes.
+The box of each face is kept as well, to filter the faces of the leaves
+reached by a query.
+
+Box bounds are computed level by level from the bottom, so refitting the
+tree after the vertices move is O(n) in vectorised numpy. The face order
+is kept, so a refitted tree stays correct but gets looser if the mesh
+deforms a lot; call build again in that case.
+
+Queries take many points, boxes or rays at once. They descend the tree one
+level at a time with a frontier of (query, node) pairs, and return
+(query, face) candidate pairs for exact tests.
+"""
+import logging
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+log = logging.getLogger(__name__)
+
+LEAF_SIZE = 8
+MORTON_BITS = 10
+# maximum number of queries traversed together
+CHUNK_QUERIES = 2 ** 14
+# relative padding of the nearest vertex distance in nearest_candidates
+NEAREST_RADIUS_SLACK = 1e-9
+
+
+def _spread_bits(x: np.ndarray) -> np.ndarray:
+    """
+    Insert two zero bits after each of the lower 10 bits of x
+    """
+    x = x.astype(np.uint32)
+    x = (x | (x << 16)) & np.uint32(0x030000FF)
+    x = (x | (x << 8)) & np.uint32(0x0300F00F)
+    x = (x | (x << 4)) & np.uint32(0x030C30C3)
+    x = (x | (x << 2)) & np.uint32(0x09249249)
+    return x
+
+
+def morton_codes(points: np.ndarray) -> np.ndarray:
+    """
+    30 bit Morton codes of points binned on a 2^10 grid over their bounding
+    box
+    """
+    lo = points.min(0)
+    extent = points.max(0) - lo
+    scale = np.zeros(3)
+    np.divide((1 << MORTON_BITS) - 1, extent, out=scale, where=extent > 0)
+    bins = ((points - lo) * scale).astype(np.uint32)
+    return (_spread_bits(bins[:, 0]) << 2) | (_spread_bits(bins[:, 1]) << 1) | _spread_bits(bins[:, 2])
+
+
+def _dot(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Dot products of the rows of two (k, 3) arrays
+    """
+    return np.einsum('ij,ij->i', a, b)
+
+
+def _norm2(x: np.ndarray) -> np.ndarray:
+    """
+    Squared lengths of the rows of an (k, 3) array
+    """
+    return _dot(x, x)
+
+
+def _box_distance2(points: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """
+    Squared distances from points to boxes, zero inside. Empty boxes are
+    at infinite distance.
+    """
+    d = np.maximum(np.maximum(lower - points, points - upper), 0.0)
+    return np.where(lower[:, 0] <= upper[:, 0], _norm2(d), np.inf)
+
+
+class FaceBVH(object):
+    """
+    Bounding volume hierarchy over the faces of a triangle mesh.
+    """
+
+    def __init__(self, v: np.ndarray, f: np.ndarray, leaf_size: int = LEAF_SIZE):
+        """
+        :param v: (n, 3) vertex coordinates
+        :param f: (m, 3) face vertex indices
+        :param leaf_size: maximum number of faces in each leaf
+        """
+        self.f = np.asarray(f)
+        self.leaf_size = leaf_size
+        self.n_faces = len(self.f)
+        self.n_leaves = max(-(-self.n_faces // leaf_size), 1)
+        self.depth = int(np.ceil(np.log2(self.n_leaves)))
+        self.n_nodes = 2 ** (self.depth + 1) - 1
+        self.first_leaf = 2 ** self.depth - 1
+        self.face_vertices = np.unique(self.f)
+        self.order = None
+        self.lower = None
+        self.upper = None
+        self.face_lower = None
+        self.face_upper = None
+        self.v = None
+        self._vertex_tree = None
+        self._vertex_tree_lock = threading.Lock()
+        self.build(v)
+
+    def build(self, v: np.ndarray) -> None:
+        """
+        Sort the faces along the Morton curve of their barycenters and fit
+        the boxes to vertex coordinates v.
+        """
+        v = np.asarray(v)
+        if self.n_faces:
+            codes = morton_codes(v[self.f].mean(1))
+            self.order = np.argsort(codes, kind='stable')
+        else:
+            self.order = np.zeros(0, dtype=np.intp)
+        self.refit(v)
+
+    def refit(self, v: np.ndarray) -> None:
+        """
+        Recompute the box bounds for new vertex coordinates v, keeping the
+        face order and tree structure. v is referenced in its own dtype,
+        so compact and memory-mapped vertex arrays are not copied; the
+        face boxes are float64.
+        """
+        self.v = np.asarray(v)
+        self._vertex_tree = None
+        self.lower = np.full((self.n_nodes, 3), np.inf)
+        self.upper = np.full((self.n_nodes, 3), -np.inf)
+        self.face_lower = np.zeros((self.n_faces, 3))
+        self.face_upper = np.zeros((self.n_faces, 3))
+        if not self.n_faces:
+            return
+
+        fv = self.v[self.f]
+        self.face_lower = np.minimum(np.minimum(fv[:, 0], fv[:, 1]), fv[:, 2]).astype(float)
+        self.face_upper = np.maximum(np.maximum(fv[:, 0], fv[:, 1]), fv[:, 2]).astype(float)
+        starts = np.arange(0, self.n_faces, self.leaf_size)
+        leaves = slice(self.first_leaf, self.first_leaf + len(starts))
+        self.lower[leaves] = np.minimum.reduceat(self.face_lower[self.order], starts)
+        self.upper[leaves] = np.maximum.reduceat(self.face_upper[self.order], starts)
+
+        # each level is the elementwise min and max of its child pairs
+        for d in range(self.depth - 1, -1, -1):
+            level = slice(2 ** d - 1, 2 ** (d + 1) - 1)
+            children = slice(2 ** (d + 1) - 1, 2 ** (d + 2) - 1)
+            self.lower[level] = self.lower[children].reshape((-1, 2, 3)).min(1)
+            self.upper[level] = self.upper[children].reshape((-1, 2, 3)).max(1)
+
+    def __getstate__(self):
+        # the lock cannot be copied and the kd-tree is rebuilt on demand
+        state = self.__dict__.copy()
+        state['_vertex_tree'] = None
+        del state['_vertex_tree_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._vertex_tree_lock = threading.Lock()
+
+    @property
+    def bounds(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Lower and upper corners of the box of all faces
+        """
+        return self.lower[0], self.upper[0]
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.lower.nbytes + self.upper.nbytes + self.face_lower.nbytes + self.face_upper.nbytes +
+            self.order.nbytes + self.face_vertices.nbytes
+        )
+
+    def leaf_faces(self, leaves: np.ndarray, queries: Optional[np.ndarray] = None
+                   ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Expand (query, leaf) pairs to (query, face) pairs.
+
+        :param leaves: leaf numbers, from 0 to n_leaves - 1
+        :param queries: query index of each leaf, defaults to range
+        :return: query and face index arrays
+        """
+        if queries is None:
+            queries = np.arange(len(leaves))
+        start = leaves * self.leaf_size
+        count = np.clip(self.n_faces - start, 0, self.leaf_size)
+        q = np.repeat(queries, count)
+        offset = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        return q, self.order[np.repeat(start, count) + offset]
+
+    def _traverse(self, keep, n_queries: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Descend the tree with a frontier of (query, node) pairs, keeping
+        children for which keep(queries, nodes) is True, and return the
+        (query, face) pairs of the leaves reached.
+        """
+        q = np.arange(n_queries)
+        node = np.zeros(n_queries, dtype=np.intp)
+        mask = keep(q, node)
+        q, node = q[mask], node[mask]
+        for _ in range(self.depth):
+            side = np.tile([0, 1], len(node))
+            q = np.repeat(q, 2)
+            node = 2 * np.repeat(node, 2) + 1 + side
+            mask = keep(q, node)
+            q, node = q[mask], node[mask]
+        return self.leaf_faces(node - self.first_leaf, q)
+
+    def _chunked(self, n_queries: int, query, chunk_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Run query(start, stop) on chunks of queries and concatenate the
+        (query, face) pairs
+        """
+        qs = []
+        fs = []
+        for start in range(0, n_queries, chunk_size):
+            q, f = query(start, min(start + chunk_size, n_queries))
+            qs.append(q + start)
+            fs.append(f)
+        if not qs:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        return np.concatenate(qs), np.concatenate(fs)
+
+    def query_boxes(self, lower: np.ndarray, upper: np.ndarray,
+                    chunk_size: int = CHUNK_QUERIES) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Faces whose boxes overlap each query box.
+
+        :param lower: (k, 3) lower corners of the query boxes
+        :param upper: (k, 3) upper corners of the query boxes
+        :return: (query, face) index pairs
+        """
+        lower = np.atleast_2d(np.asarray(lower, dtype=float))
+        upper = np.atleast_2d(np.asarray(upper, dtype=float))
+
+        def query(start, stop):
+            lo, hi = lower[start:stop], upper[start:stop]
+
+            def keep(q, node):
+                return (
+                    (self.lower[node] <= hi[q]).all(1) & (self.upper[node] >= lo[q]).all(1)
+                )
+
+            q, f = self._traverse(keep, stop - start)
+            # the faces of a leaf share its box, so test each face box
+            mask = (self.face_lower[f] <= hi[q]).all(1) & (self.face_upper[f] >= lo[q]).all(1)
+            return q[mask], f[mask]
+
+        return self._chunked(len(lower), query, chunk_size)
+
+    def query_radius(self, points: np.ndarray, radius, chunk_size: int = CHUNK_QUERIES
+                     ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Faces whose boxes are within radius of each point. This is a
+        superset of the faces within radius.
+
+        :param points: (k, 3) query points
+        :param radius: a radius for all points or an array of one per point
+        :return: (query, face) index pairs, sorted by query
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        r2 = np.broadcast_to(np.square(np.asarray(radius, dtype=float)), (len(points),))
+
+        def query(start, stop):
+            p, r = points[start:stop], r2[start:stop]
+
+            def keep(q, node):
+                return _box_distance2(p[q], self.lower[node], self.upper[node]) <= r[q]
+
+            q, f = self._traverse(keep, stop - start)
+            mask = _box_distance2(p[q], self.face_lower[f], self.face_upper[f]) <= r[q]
+            return q[mask], f[mask]
+
+        return self._chunked(len(points), query, chunk_size)
+
+    def nearest_vertex_distances(self, points: np.ndarray) -> np.ndarray:
+        """
+        Distance from each point to the nearest vertex of any face, an
+        upper bound of its distance to the surface. Uses a kd-tree of the
+        face vertices, built on first use after each build or refit. Safe
+        to call from the worker threads of surfacequery.run_chunked, which
+        wait for the first of them to build the tree.
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        if not self.n_faces:
+            return np.full(len(points), np.inf)
+        tree = self._vertex_tree
+        if tree is None:
+            with self._vertex_tree_lock:
+                if self._vertex_tree is None:
+                    self._vertex_tree = cKDTree(self.v[self.face_vertices])
+                tree = self._vertex_tree
+        return tree.query(points)[0]
+
+    def nearest_candidates(self, points: np.ndarray, chunk_size: int = CHUNK_QUERIES
+                           ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Candidate faces for the nearest face of each point: the faces
+        whose boxes are no farther than the nearest vertex, see
+        nearest_vertex_distances. The nearest face is always among them.
+
+        :param points: (k, 3) query points
+        :return: (query, face) index pairs, sorted by query
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        # the kd-tree distance squared can round below the box distance of
+        # the faces of the nearest vertex, which would drop them all
+        radius = self.nearest_vertex_distances(points) * (1.0 + NEAREST_RADIUS_SLACK)
+        return self.query_radius(points, radius, chunk_size)
+
+    def query_rays(self, origins: np.ndarray, directions: np.ndarray, t_max=np.inf,
+                   chunk_size: int = CHUNK_QUERIES) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Faces whose boxes are hit by each ray segment origin + t direction,
+        0 <= t <= t_max, by the slab test.
+
+        :param origins: (k, 3) ray origins
+        :param directions: (k, 3) ray directions
+        :param t_max: a maximum ray parameter for all rays or an array of
+            one per ray
+        :return: (query, face) index pairs
+        """
+        origins = np.atleast_2d(np.asarray(origins, dtype=float))
+        directions = np.atleast_2d(np.asarray(directions, dtype=float))
+        directions = np.broadcast_to(directions, origins.shape)
+        t_max = np.broadcast_to(np.asarray(t_max, dtype=float), (len(origins),))
+        with np.errstate(divide='ignore'):
+            inverse = 1.0 / directions
+
+        def query(start, stop):
+            o, inv, tm = origins[start:stop], inverse[start:stop], t_max[start:stop]
+
+            def keep(q, node):
+                lower, upper = self.lower[node], self.upper[node]
+                oq, iq = o[q], inv[q]
+                t_near = np.zeros(len(q))
+                t_far = tm[q]
+                with np.errstate(invalid='ignore'):
+                    for k in range(3):
+                        t0 = (lower[:, k] - oq[:, k]) * iq[:, k]
+                        t1 = (upper[:, k] - oq[:, k]) * iq[:, k]
+                        # 0 * inf is nan for rays in the plane of a slab,
+                        # which is ignored by fmin and fmax
+                        t_near = np.fmax(t_near, np.fmin(t0, t1))
+                        t_far = np.fmin(t_far, np.fmax(t0, t1))
+                return (t_near <= t_far) & (lower[:, 0] <= upper[:, 0])
+
+            return self._traverse(keep, stop - start)
+
+        return self._chunked(len(origins), query, chunk_size)
+
+    def ray_face_hits(self, origins: np.ndarray, directions: np.ndarray, t_max=np.inf,
+                      chunk_size: int = CHUNK_QUERIES
+                      ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        All intersections of ray segments with faces, by the Moller-Trumbore
+        test on the candidates of query_rays.
+
+        :return: ray index, face index, ray parameter t and (k, 2)
+            barycentric coordinates (u, w) of the second and third face
+            vertices of each hit
+        """
+        origins = np.atleast_2d(np.asarray(origins, dtype=float))
+        directions = np.broadcast_to(np.atleast_2d(np.asarray(directions, dtype=float)), origins.shape)
+        t_max = np.broadcast_to(np.asarray(t_max, dtype=float), (len(origins),))
+        q, f = self.query_rays(origins, directions, t_max, chunk_size)
+        t, uw, hit = ray_triangle_intersect(origins[q], directions[q], self.v[self.f[f]].astype(float, copy=False))
+        hit &= (t >= 0.0) & (t <= t_max[q])
+        return q[hit], f[hit], t[hit], uw[hit]
+
+    def intersect_rays(self, origins: np.ndarray, directions: np.ndarray, t_max=np.inf,
+                       chunk_size: int = CHUNK_QUERIES
+                       ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        First face hit by each ray segment.
+
+        :return: face index, or -1 for rays that hit nothing, ray parameter
+            t, inf for misses, and (k, 2) barycentric coordinates (u, w)
+        """
+        origins = np.atleast_2d(np.asarray(origins, dtype=float))
+        n = len(origins)
+        face = np.full(n, -1, dtype=np.intp)
+        t_hit = np.full(n, np.inf)
+        uw_hit = np.zeros((n, 2))
+        q, f, t, uw = self.ray_face_hits(origins, directions, t_max, chunk_size)
+        first = np.lexsort((t, q))
+        q, f, t, uw = q[first], f[first], t[first], uw[first]
+        is_first = np.ones(len(q), dtype=bool)
+        is_first[1:] = q[1:] != q[:-1]
+        q = q[is_first]
+        face[q] = f[is_first]
+        t_hit[q] = t[is_first]
+        uw_hit[q] = uw[is_first]
+        return face, t_hit, uw_hit
+
+
+def ray_triangle_intersect(origins: np.ndarray, directions: np.ndarray, triangles: np.ndarray,
+                           eps: float = 1e-12) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Moller-Trumbore intersection of k lines with k triangles.
+
+    :param origins: (k, 3) ray origins
+    :param directions: (k, 3) ray directions
+    :param triangles: (k, 3, 3) triangle vertex coordinates
+    :param eps: determinant threshold below which a ray is parallel to a
+        triangle, relative to the squared lengths involved
+    :return: line parameter t, (k, 2) barycentric coordinates (u, w) and a
+        boolean array of whether the line crosses the triangle
+    """
+    e1 = triangles[:, 1] - triangles[:, 0]
+    e2 = triangles[:, 2] - triangles[:, 0]
+    p = np.cross(directions, e2)
+    det = _dot(e1, p)
+    scale = np.sqrt(_norm2(directions) * _norm2(e1) * _norm2(e2))
+    valid = np.abs(det) > eps * scale
+    inv_det = np.zeros_like(det)
+    np.divide(1.0, det, out=inv_det, where=valid)
+    s = origins - triangles[:, 0]
+    u = _dot(s, p) * inv_det
+    qv = np.cross(s, e1)
+    w = _dot(directions, qv) * inv_det
+    t = _dot(e2, qv) * inv_det
+    hit = valid & (u >= 0.0) & (w >= 0.0) & (u + w <= 1.0)
+    return t, np.column_stack([u, w]), hit
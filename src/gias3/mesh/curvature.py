@@ -0,0 +1,204 @@
+"""
+FILE: curvature.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Discrete curvature of triangle meshes
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+Curvature signs follow the vertex normals, which are oriented by the face
+winding: mean and principal curvatures are positive where the surface bends
+away from the normals, e.g. on a sphere with outward normals.
+"""
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from gias3.mesh import operators
+from gias3.mesh import topology
+
+log = logging.getLogger(__name__)
+
+
+def mean_curvature(
+        v: np.ndarray,
+        f: np.ndarray,
+        areas: np.ndarray,
+        normals: np.ndarray,
+        cot: Optional[np.ndarray] = None,
+        laplacian: Optional[sparse.spmatrix] = None) -> np.ndarray:
+    """
+    Mean curvature of each vertex from the cotangent Laplacian of the
+    vertex coordinates.
+
+    :param areas: mixed Voronoi area of each vertex
+    :param normals: unit normal of each vertex
+    :param cot: corner cotangents if already computed
+    :param laplacian: cotangent Laplacian if already computed
+    """
+    if laplacian is None:
+        laplacian = operators.cotangent_laplacian(v, f, len(areas), cot)
+    mean_curvature_normal = -(laplacian @ np.asarray(v, dtype=float))
+    h = (mean_curvature_normal * normals).sum(1)
+    return _divide(h, 2.0 * areas)
+
+
+def gaussian_curvature(
+        v: np.ndarray,
+        f: np.ndarray,
+        areas: np.ndarray,
+        boundary: Optional[np.ndarray] = None,
+        geometry: Optional[operators.CornerGeometry] = None) -> np.ndarray:
+    """
+    Gaussian curvature of each vertex from its angle defect.
+
+    :param areas: mixed Voronoi area of each vertex
+    :param boundary: boolean array marking boundary vertices, whose angle
+        defect is measured from pi instead of 2 pi
+    :param geometry: corner geometry of the mesh if already computed
+    """
+    angles = operators.corner_angles(v, f, geometry)
+    angle_sum = np.bincount(np.ravel(f), weights=angles.ravel(), minlength=len(areas))
+    defect = 2.0 * np.pi - angle_sum
+    if boundary is not None:
+        defect[boundary] -= np.pi
+    return _divide(defect, areas)
+
+
+def principal_curvatures(h: np.ndarray, k: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Principal curvatures k1 >= k2 from mean curvature h and Gaussian
+    curvature k. Where h^2 < k due to discretisation error, k1 = k2 = h.
+    """
+    d = np.sqrt(np.maximum(h * h - k, 0.0))
+    return h + d, h - d
+
+
+def _tangent_frames(normals: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Two unit vectors spanning the plane perpendicular to each normal
+    """
+    axis = np.zeros_like(normals)
+    axis[np.arange(len(normals)), np.abs(normals).argmin(1)] = 1.0
+    u = np.cross(normals, axis)
+    u /= np.sqrt((u * u).sum(1))[:, np.newaxis]
+    w = np.cross(normals, u)
+    return u, w
+
+
+def principal_directions(v: np.ndarray, normals: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """
+    Principal curvature directions of each vertex from a least-squares fit
+    of its shape operator to the change in normal along each of its edges.
+    All vertices are fitted together by accumulating the 3x3 normal
+    equations of every vertex and solving them in one batch.
+
+    :param normals: unit normal of each vertex
+    :param edges: (e, 2) array of the vertex indices of each edge
+    :return: (n, 2, 3) array of the unit directions of the larger and
+        smaller principal curvature of each vertex
+    """
+    v = np.asarray(v, dtype=float)
+    n = len(normals)
+    u, w = _tangent_frames(normals)
+
+    # each edge seen from both of its vertices
+    i = np.concatenate([edges[:, 0], edges[:, 1]])
+    j = np.concatenate([edges[:, 1], edges[:, 0]])
+    dx = v[j] - v[i]
+    dn = normals[j] - normals[i]
+    a = (dx * u[i]).sum(1)
+    b = (dx * w[i]).sum(1)
+    c = (dn * u[i]).sum(1)
+    d = (dn * w[i]).sum(1)
+
+    # fit dn = S dx in the tangent frame, with S = [[s11, s12], [s12, s22]]
+    # and unknowns (s11, s12, s22): a s11 + b s12 = c, a s12 + b s22 = d
+    def accumulate(x):
+        return np.bincount(i, weights=x, minlength=n)
+
+    aa, ab, bb = accumulate(a * a), accumulate(a * b), accumulate(b * b)
+    ata = np.zeros((n, 3, 3))
+    ata[:, 0, 0] = aa
+    ata[:, 0, 1] = ata[:, 1, 0] = ab
+    ata[:, 1, 1] = aa + bb
+    ata[:, 1, 2] = ata[:, 2, 1] = ab
+    ata[:, 2, 2] = bb
+    aty = np.column_stack([accumulate(a * c), accumulate(b * c + a * d), accumulate(b * d)])
+
+    # regularise vertices with too few edges for a unique fit
+    scale = np.trace(ata, axis1=1, axis2=2)
+    ata += (1e-12 * scale + 1e-300)[:, np.newaxis, np.newaxis] * np.eye(3)
+    s = np.linalg.solve(ata, aty[:, :, np.newaxis])[:, :, 0]
+
+    shape_operator = np.empty((n, 2, 2))
+    shape_operator[:, 0, 0] = s[:, 0]
+    shape_operator[:, 0, 1] = shape_operator[:, 1, 0] = s[:, 1]
+    shape_operator[:, 1, 1] = s[:, 2]
+    _, vectors = np.linalg.eigh(shape_operator)
+
+    # eigh sorts eigenvalues in ascending order, so the last eigenvector is
+    # the direction of the larger curvature
+    directions = np.empty((n, 2, 3))
+    directions[:, 0] = vectors[:, 0, 1, np.newaxis] * u + vectors[:, 1, 1, np.newaxis] * w
+    directions[:, 1] = np.cross(normals, directions[:, 0])
+    return directions
+
+
+def calc_curvature(
+        v: np.ndarray,
+        f: np.ndarray,
+        mesh_topology: Optional[topology.MeshTopology] = None,
+        mesh_operators: Optional[operators.MeshOperators] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Calculate discrete curvatures of a triangle mesh: mean curvature from
+    the cotangent Laplacian, Gaussian curvature from the angle defect over
+    the mixed Voronoi vertex area (Meyer et al. 2003), and principal
+    directions from per-vertex shape operator fits.
+
+    :param v: (n, 3) vertex coordinates
+    :param f: (m, 3) face vertex indices
+    :param mesh_topology: MeshTopology of f, if already built
+    :param mesh_operators: MeshOperators of f, if already built
+    :return: mean curvature H, Gaussian curvature K, principal curvatures k1
+        and k2, and (n, 2, 3) principal directions E of k1 and k2. Unused
+        vertices have zero curvature.
+    """
+    n = len(v)
+    if mesh_topology is None:
+        mesh_topology = topology.MeshTopology(f, n)
+
+    geometry = operators.CornerGeometry(v, f)
+    cot = operators.corner_cotangents(v, f, geometry)
+    areas = operators.vertex_areas(v, f, n, cot, geometry)
+    normals = operators.area_weighted_vertex_normals(v, f, n, geometry)
+
+    # boundary edges are used by one face
+    edges = mesh_topology.edges
+    edge_faces = np.bincount(mesh_topology.face_edges.ravel(), minlength=len(edges))
+    boundary = np.zeros(n, dtype=bool)
+    boundary[edges[edge_faces == 1].ravel()] = True
+
+    laplacian = None
+    if mesh_operators is not None:
+        laplacian = mesh_operators.cotangent_laplacian(v, cot)
+
+    h = mean_curvature(v, f, areas, normals, cot, laplacian)
+    k = gaussian_curvature(v, f, areas, boundary, geometry)
+    k1, k2 = principal_curvatures(h, k)
+    e = principal_directions(v, normals, edges)
+    return h, k, k1, k2, e
+
+
+def _divide(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    out = np.zeros_like(x)
+    np.divide(x, y, out=out, where=y > 0)
+    return out
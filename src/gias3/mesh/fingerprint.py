@@ -0,0 +1,158 @@
+"""
+FILE: fingerprint.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Content fingerprints of triangle meshes
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+Fingerprints are BLAKE2b digests of the array contents of a mesh, returned
+as hex strings that are stable across runs, platforms and storage types.
+Arrays are converted to a canonical type, little-endian int64 for faces and
+float64 for coordinates, and hashed in chunks of CHUNK_BYTES, so compact
+and full precision meshes with the same values have the same fingerprint
+and memory-mapped arrays are read once without being copied whole.
+
+- topology_fingerprint: faces only. Keys data derived from connectivity,
+  e.g. adjacency and operator sparsity patterns.
+- geometry_fingerprint: vertex coordinates only, optionally quantised to a
+  tolerance so that tiny differences are ignored. Coordinates that straddle
+  a quantisation boundary can still hash differently.
+- mesh_fingerprint: both, for data that depends on the whole mesh, e.g.
+  normals or curvature.
+
+find_duplicates groups meshes by fingerprint, so duplicates in a corpus are
+found in linear time.
+"""
+import hashlib
+import logging
+from typing import Dict, Hashable, Iterable, List, Optional
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# digest length in bytes
+DIGEST_SIZE = 16
+# size of the blocks of converted array data passed to the hash
+CHUNK_BYTES = 2 ** 22
+_INDEX_DTYPE = np.dtype('<i8')
+_FLOAT_DTYPE = np.dtype('<f8')
+
+
+def _update(h, a: np.ndarray, dtype: np.dtype, tol: Optional[float] = None) -> None:
+    """
+    Add the shape and the values of a, converted to dtype or quantised to
+    tol, to hash h, one block of rows at a time
+    """
+    a = np.asarray(a)
+    h.update(repr(a.shape).encode())
+    if tol is not None:
+        h.update(b'tol' + np.float64(tol).tobytes())
+        dtype = _INDEX_DTYPE
+    if a.ndim:
+        # an explicit width, since -1 cannot be inferred for empty arrays
+        rows = a.reshape((a.shape[0], int(np.prod(a.shape[1:], dtype=np.int64))))
+    else:
+        rows = a.reshape((1, 1))
+    row_bytes = max(rows.shape[1], 1) * dtype.itemsize
+    step = max(CHUNK_BYTES // row_bytes, 1)
+    for start in range(0, len(rows), step):
+        block = rows[start:start + step]
+        if tol is not None:
+            block = np.round(block.astype(_FLOAT_DTYPE) / tol).astype(dtype)
+        elif dtype.kind == 'f':
+            # adding 0.0 turns -0.0 into 0.0
+            block = block.astype(dtype) + 0.0
+        else:
+            block = block.astype(dtype)
+        h.update(np.ascontiguousarray(block).data)
+
+
+def topology_fingerprint(f: np.ndarray) -> str:
+    """
+    Fingerprint of the face vertex indices of a mesh
+
+    :param f: (m, 3) face vertex indices
+    """
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE, person=b'gias3.f')
+    _update(h, f, _INDEX_DTYPE)
+    return h.hexdigest()
+
+
+def geometry_fingerprint(v: np.ndarray, tol: Optional[float] = None) -> str:
+    """
+    Fingerprint of the vertex coordinates of a mesh
+
+    :param v: (n, 3) vertex coordinates
+    :param tol: if given, coordinates are rounded to multiples of tol
+        before hashing
+    """
+    if tol is not None and tol <= 0:
+        raise ValueError('tol must be positive, got {}'.format(tol))
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE, person=b'gias3.v')
+    _update(h, v, _FLOAT_DTYPE, tol)
+    return h.hexdigest()
+
+
+def combine_fingerprints(topology: str, geometry: str) -> str:
+    """
+    Fingerprint of a mesh from its topology and geometry fingerprints
+    """
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE, person=b'gias3.mesh')
+    h.update(bytes.fromhex(topology))
+    h.update(bytes.fromhex(geometry))
+    return h.hexdigest()
+
+
+def mesh_fingerprint(v: np.ndarray, f: np.ndarray, tol: Optional[float] = None) -> str:
+    """
+    Fingerprint of the vertex coordinates and faces of a mesh
+
+    :param v: (n, 3) vertex coordinates
+    :param f: (m, 3) face vertex indices
+    :param tol: quantisation tolerance of the coordinates, see
+        geometry_fingerprint
+    """
+    return combine_fingerprints(topology_fingerprint(f), geometry_fingerprint(v, tol))
+
+
+def find_duplicates(
+        meshes: Iterable,
+        tol: Optional[float] = None,
+        geometry: bool = True) -> List[List[Hashable]]:
+    """
+    Groups of meshes with the same fingerprint.
+
+    :param meshes: iterable of SimpleMesh or (v, f) tuples, or a dict of
+        them keyed by name
+    :param tol: quantisation tolerance of the coordinates, see
+        geometry_fingerprint
+    :param geometry: if False, group by topology only
+    :return: lists of the keys, or positions, of meshes with the same
+        fingerprint, for groups of two or more
+    """
+    items = meshes.items() if isinstance(meshes, dict) else enumerate(meshes)
+    groups: Dict[str, List[Hashable]] = {}
+    for key, mesh in items:
+        if tol is None and hasattr(mesh, 'topologyFingerprint'):
+            # cached on SimpleMesh
+            digest = mesh.fingerprint() if geometry else mesh.topologyFingerprint
+        else:
+            if hasattr(mesh, 'v') and hasattr(mesh, 'f'):
+                v, f = mesh.v, mesh.f
+            else:
+                v, f = mesh
+            if geometry:
+                digest = mesh_fingerprint(v, f, tol)
+            else:
+                digest = topology_fingerprint(f)
+        groups.setdefault(digest, []).append(key)
+    duplicates = [keys for keys in groups.values() if len(keys) > 1]
+    log.debug('found %d groups of duplicate meshes', len(duplicates))
+    return duplicates
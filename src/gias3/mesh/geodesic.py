@@ -0,0 +1,221 @@
+"""
+FILE: geodesic.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Geodesic distances on triangle meshes
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+Two methods are provided. dijkstra_distances finds shortest paths along the
+mesh edges, which are exact for paths restricted to edges and overestimate
+true geodesic distances by a few percent. HeatGeodesicSolver implements the
+heat method (Crane et al. 2013), which approximates smooth geodesic
+distances across faces with two sparse linear solves per source. Both
+systems are factorised once when the solver is created, so each further
+source costs only triangular solves.
+
+Vertices that cannot be reached from any source have infinite distance.
+"""
+import logging
+from typing import Optional, Sequence, Union
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+from scipy.sparse import linalg as splinalg
+
+from gias3.mesh import operators
+from gias3.mesh import topology
+
+log = logging.getLogger(__name__)
+
+# maximum number of sources solved together by HeatGeodesicSolver.distances
+CHUNK_SOURCES = 256
+# memory budget of each (n_faces, 3, k) float64 array of face gradients in
+# HeatGeodesicSolver._solve, which bounds the number of sources k per chunk
+CHUNK_BYTES = 2 ** 28
+
+
+def edge_length_graph(v: np.ndarray, edges: np.ndarray, n_vertices: Optional[int] = None) -> sparse.csr_matrix:
+    """
+    Symmetric sparse matrix of the length of each edge
+
+    :param v: (n, 3) vertex coordinates
+    :param edges: (e, 2) vertex indices of each unique edge
+    :param n_vertices: number of vertices, defaults to len(v)
+    """
+    if n_vertices is None:
+        n_vertices = len(v)
+    v = np.asarray(v, dtype=float)
+    d = v[edges[:, 1]] - v[edges[:, 0]]
+    lengths = np.sqrt((d * d).sum(1))
+    # zero length edges would be dropped as missing by csgraph
+    lengths = np.maximum(lengths, np.finfo(float).tiny)
+    rows = np.concatenate([edges[:, 0], edges[:, 1]])
+    cols = np.concatenate([edges[:, 1], edges[:, 0]])
+    return sparse.csr_matrix(
+        (np.concatenate([lengths, lengths]), (rows, cols)), shape=(n_vertices, n_vertices)
+    )
+
+
+def dijkstra_distances(
+        v: np.ndarray,
+        edges: np.ndarray,
+        sources: Union[int, Sequence[int], np.ndarray],
+        combined: bool = False,
+        limit: float = np.inf,
+        graph: Optional[sparse.csr_matrix] = None) -> np.ndarray:
+    """
+    Shortest path distances along mesh edges from each source vertex.
+
+    :param v: (n, 3) vertex coordinates
+    :param edges: (e, 2) vertex indices of each unique edge
+    :param sources: index or indices of the source vertices
+    :param combined: if True, return the distance to the nearest source.
+        Otherwise return the distances from each source.
+    :param limit: distances beyond limit are not explored and are inf
+    :param graph: edge length graph from edge_length_graph, if already built
+    :return: (n,) distances for a single source index or combined sources,
+        otherwise (k, n) distances from each of k sources
+    """
+    if graph is None:
+        graph = edge_length_graph(v, edges)
+    single = np.ndim(sources) == 0
+    sources = np.atleast_1d(sources)
+    d = csgraph.dijkstra(graph, directed=False, indices=sources, limit=limit, min_only=combined)
+    if single and not combined:
+        d = d[0]
+    return d
+
+
+class HeatGeodesicSolver(object):
+    """
+    Geodesic distances by the heat method, for many sources on one mesh.
+
+    Heat is diffused from the sources for a short time t by one backward
+    Euler step, (A - t L) u = delta, where L is the cotangent Laplacian and
+    A the lumped mass matrix. The normalised negative gradient X of u in
+    each face points along the geodesics, and the distance is the solution
+    of the Poisson equation -L phi = G^T A_f X that best fits X, where G is
+    the face gradient operator and A_f the face areas. Boundaries use
+    Neumann conditions.
+
+    The solver holds the factorisations of both systems and must be
+    rebuilt when the vertex coordinates change.
+    """
+
+    def __init__(
+            self,
+            v: np.ndarray,
+            f: np.ndarray,
+            n_vertices: Optional[int] = None,
+            mesh_operators: Optional[operators.MeshOperators] = None,
+            mesh_topology: Optional[topology.MeshTopology] = None,
+            time_scale: float = 1.0):
+        """
+        :param v: (n, 3) vertex coordinates
+        :param f: (m, 3) face vertex indices
+        :param n_vertices: number of vertices, defaults to len(v)
+        :param mesh_operators: MeshOperators of f, if already built
+        :param mesh_topology: MeshTopology of f, if already built
+        :param time_scale: heat diffusion time as a multiple of the squared
+            mean edge length. Larger values give smoother distances.
+        """
+        if n_vertices is None:
+            n_vertices = len(v)
+        if mesh_operators is None:
+            mesh_operators = operators.MeshOperators(f, n_vertices)
+        if mesh_topology is None:
+            mesh_topology = topology.MeshTopology(f, n_vertices)
+        v = np.asarray(v, dtype=float)
+        self.n_vertices = n_vertices
+        self.n_faces = len(f)
+
+        geometry = operators.CornerGeometry(v, f)
+        cot = operators.corner_cotangents(v, f, geometry)
+        laplacian = mesh_operators.cotangent_laplacian(v, cot, geometry)
+        mass = mesh_operators.mass_matrix(v, lumped=True, geometry=geometry)
+        self.gradient = mesh_operators.gradient(v, geometry)
+        self.face_areas = 0.5 * geometry.double_area
+
+        self.graph = edge_length_graph(v, mesh_topology.edges, n_vertices)
+        self.mean_edge_length = self.graph.data.mean() if self.graph.nnz else 0.0
+        self.time_step = time_scale * self.mean_edge_length ** 2
+        _, self.components = csgraph.connected_components(self.graph, directed=False)
+
+        log.debug('factorising heat method systems for %d vertices', n_vertices)
+        # isolated vertices have empty rows, keep both systems non-singular
+        isolated = sparse.diags((mass.diagonal() == 0).astype(float))
+        self._heat = splinalg.splu((mass - self.time_step * laplacian + isolated).tocsc())
+        # -L is singular with constant null vectors on each component, which
+        # a small multiple of the mass matrix removes
+        scale = 1e-10 * abs(laplacian.diagonal()).mean() / max(mass.diagonal().mean(), np.finfo(float).tiny)
+        self._poisson = splinalg.splu((-laplacian + scale * mass + isolated).tocsc())
+
+    def _solve(self, delta: np.ndarray) -> np.ndarray:
+        """
+        Unshifted distance functions for the heat sources in the columns of
+        the (n, k) array delta
+        """
+        k = delta.shape[1]
+        u = self._heat.solve(delta)
+        grad = (self.gradient @ u).reshape((self.n_faces, 3, k))
+        norm = np.sqrt((grad * grad).sum(1))
+        scale = np.zeros_like(norm)
+        np.divide(-self.face_areas[:, np.newaxis], norm, out=scale, where=norm > 0)
+        x = grad * scale[:, np.newaxis, :]
+        return self._poisson.solve(self.gradient.T @ x.reshape((3 * self.n_faces, k)))
+
+    def distances(
+            self,
+            sources: Union[int, Sequence[int], np.ndarray],
+            combined: bool = False,
+            chunk_size: Optional[int] = None) -> np.ndarray:
+        """
+        Geodesic distances from each source vertex.
+
+        :param sources: index or indices of the source vertices
+        :param combined: if True, return the distance to the nearest source
+            using a single solve with heat at all sources. Otherwise return
+            the distances from each source.
+        :param chunk_size: number of sources solved together, defaults to
+            as many as fit the CHUNK_BYTES budget per face gradient array, up
+            to CHUNK_SOURCES
+        :return: (n,) distances for a single source index or combined sources,
+            otherwise (k, n) distances from each of k sources
+        """
+        single = np.ndim(sources) == 0
+        sources = np.atleast_1d(sources).astype(int)
+        if combined:
+            delta = np.zeros((self.n_vertices, 1))
+            delta[sources, 0] = 1.0
+            phi = self._solve(delta)[:, 0]
+            # each component has its own offset, shift it by the minimum
+            # over the sources on it
+            offset = np.full(self.components.max() + 1, np.inf)
+            np.minimum.at(offset, self.components[sources], phi[sources])
+            phi -= offset[self.components]
+            reached = np.isin(self.components, self.components[sources])
+            return np.where(reached, np.maximum(phi, 0.0), np.inf)
+
+        if chunk_size is None:
+            chunk_size = min(max(CHUNK_BYTES // (3 * 8 * max(self.n_faces, 1)), 1), CHUNK_SOURCES)
+        d = np.empty((len(sources), self.n_vertices))
+        for start in range(0, len(sources), chunk_size):
+            chunk = sources[start:start + chunk_size]
+            k = len(chunk)
+            delta = np.zeros((self.n_vertices, k))
+            delta[chunk, np.arange(k)] = 1.0
+            phi = self._solve(delta).T
+            phi -= phi[np.arange(k), chunk][:, np.newaxis]
+            reached = self.components[np.newaxis, :] == self.components[chunk][:, np.newaxis]
+            d[start:start + k] = np.where(reached, np.maximum(phi, 0.0), np.inf)
+
+        if single:
+            d = d[0]
+        return d
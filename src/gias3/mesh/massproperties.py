@@ -0,0 +1,81 @@
+"""
+FILE: massproperties.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Solid mass properties of closed triangle meshes
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+Volume integrals over the solid bounded by a closed, consistently oriented
+triangle mesh are computed with the divergence theorem as sums over the
+signed tetrahedra formed by each face and a reference point. Outward
+facing triangles give positive volumes. Inward facing triangles give the
+same centroid, with negative volume and second moments.
+"""
+import logging
+from typing import Tuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def _weighted_outer(w: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """
+    Sum of w[k] * outer(x[k], x[k]) over the second last axis of x
+    """
+    return np.matmul((x * w[..., np.newaxis]).swapaxes(-1, -2), x)
+
+
+def mass_properties(v: np.ndarray, f: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Volume, centroid and second moment tensor of the solid bounded by a
+    closed triangle mesh, in one pass over the faces.
+
+    :param v: (n, 3) vertex coordinates, or (N, n, 3) vertex coordinates of
+        N meshes with the same faces
+    :param f: (m, 3) face vertex indices
+    :return: volume, centroid (3,) and second moment tensor (3, 3) about
+        the centroid, the integral of (x - c)(x - c)^T over the solid, with
+        a leading axis of length N for batched input
+    """
+    v = np.asarray(v, dtype=float)
+    # integrate relative to a point near the mesh to limit cancellation
+    origin = v.mean(axis=-2, keepdims=True)
+    a = (v[..., f[:, 0], :] - origin)
+    b = (v[..., f[:, 1], :] - origin)
+    c = (v[..., f[:, 2], :] - origin)
+
+    # 6 x the signed volume of the tetrahedron (origin, a, b, c)
+    det = (a * np.cross(b, c)).sum(-1)
+    s = a + b + c
+
+    volume = det.sum(-1) / 6.0
+    first_moment = np.einsum('...m,...mi->...i', det, s) / 24.0
+    second_moment = (
+        _weighted_outer(det, a) + _weighted_outer(det, b) + _weighted_outer(det, c) + _weighted_outer(det, s)
+    ) / 120.0
+
+    offset = np.zeros_like(first_moment)
+    np.divide(first_moment, volume[..., np.newaxis], out=offset, where=volume[..., np.newaxis] != 0)
+    centroid = offset + origin[..., 0, :]
+    # parallel axis theorem to move from the reference point to the centroid
+    second_moment -= volume[..., np.newaxis, np.newaxis] * offset[..., :, np.newaxis] * offset[..., np.newaxis, :]
+    return volume, centroid, second_moment
+
+
+def inertia_tensor(second_moment: np.ndarray, density: float = 1.0) -> np.ndarray:
+    """
+    Inertia tensor about the centroid from the second moment tensor
+    returned by mass_properties, for a solid of uniform density.
+
+    :param second_moment: (3, 3) or (N, 3, 3) second moment tensors
+    :param density: mass per unit volume
+    """
+    trace = np.trace(second_moment, axis1=-2, axis2=-1)
+    return density * (trace[..., np.newaxis, np.newaxis] * np.eye(3) - second_moment)
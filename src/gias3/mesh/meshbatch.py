@@ -0,0 +1,430 @@
+"""
+FILE: meshbatch.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Ensembles of meshes sharing one triangulation
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+"""
+import logging
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from gias3.mesh import massproperties
+from gias3.mesh import operators
+from gias3.mesh import simplemesh
+from gias3.mesh import smoothing
+from gias3.mesh import topology
+from gias3.mesh.simplemesh import SimpleMesh, _cached_property
+
+log = logging.getLogger(__name__)
+
+# face properties are computed for chunks of meshes with about this many
+# faces in total at a time
+CHUNK_FACES = 2 ** 16
+
+
+class SimpleMeshBatch(object):
+    """
+    An ensemble of N meshes with the same faces and different vertex
+    coordinates, e.g. the instances of a shape model.
+
+    Vertex coordinates are stored in one (N, nv, 3) array v with one shared
+    (m, 3) face array f. Derived attributes are computed for all meshes at
+    once with the same definitions as SimpleMesh and are cached until v is
+    reassigned or markModified is called:
+
+    faceNormals, faceAreas, faceBarycenters: (N, m, 3), (N, m), (N, m, 3)
+    CoM: (N, 3)
+    inertial_mat: (N, 3, 3)
+    principalMoments, principalAxes: (N, 3), (N, 3, 3)
+    volume, solidCentroid, solidSecondMoment: (N,), (N, 3), (N, 3, 3)
+
+    Indexing with an integer returns a SimpleMesh whose v is a view into the
+    batch vertex array, with the batch topology and operator patterns shared
+    and copies of any cached attributes. Indexing with a slice or an index
+    array returns a batch.
+    """
+
+    faceNormals = _cached_property('faceNormals', '_calcFaceProperties', 'unit normal of each face of each mesh')
+    faceAreas = _cached_property('faceAreas', '_calcFaceProperties', 'area of each face of each mesh')
+    faceBarycenters = _cached_property(
+        'faceBarycenters', '_calcFaceProperties', 'barycenter of each face of each mesh'
+    )
+    CoM = _cached_property('CoM', 'calcCoM', 'area-weighted centre of mass of each mesh')
+    inertial_mat = _cached_property('inertial_mat', 'calcPMoments', 'area-weighted inertia tensor of each mesh')
+    principalMoments = _cached_property('principalMoments', 'calcPMoments', 'principal moments of each mesh')
+    principalAxes = _cached_property('principalAxes', 'calcPMoments', 'principal axes of each mesh in columns')
+    volume = _cached_property('volume', 'calcSolidMassProperties', 'volume enclosed by each mesh')
+    solidCentroid = _cached_property('solidCentroid', 'calcSolidMassProperties', 'centroid of each enclosed solid')
+    solidSecondMoment = _cached_property(
+        'solidSecondMoment', 'calcSolidMassProperties', 'second moment tensor of each enclosed solid'
+    )
+
+    def __init__(
+            self,
+            v: np.ndarray,
+            f: np.ndarray,
+            compact: Optional[bool] = None,
+            copy: bool = True):
+        """
+        :param v: (N, nv, 3) array of the vertex coordinates of each mesh
+        :param f: (m, 3) array of face vertex indices shared by all meshes
+        :param compact: store vertex coordinates as float32 and faces as
+            int32, see SimpleMesh
+        :param copy: if False, v and f are used without copying when their
+            dtypes match the compact setting
+        """
+        self._cache = {}
+        self._vVersion = 0
+        self.compact = simplemesh.get_compact_default() if compact is None else bool(compact)
+        self._topology: Optional[topology.MeshTopology] = None
+        self._meshOperators: Optional[operators.MeshOperators] = None
+
+        if copy:
+            f = np.array(f)
+        else:
+            f = np.asanyarray(f)
+        if self.compact:
+            f = f.astype(simplemesh.COMPACT_INT_DTYPE, copy=False)
+        if f.ndim != 2 or f.shape[1] != 3:
+            raise ValueError('f must be an (m, 3) array')
+        self._f = f
+        self.v = np.array(v) if copy else np.asanyarray(v)
+
+    @classmethod
+    def fromMeshes(cls, meshes: Sequence[SimpleMesh], compact: Optional[bool] = None) -> 'SimpleMeshBatch':
+        """
+        Create a batch from a sequence of SimpleMesh instances with
+        identical faces. The vertex coordinates are copied.
+        """
+        if len(meshes) == 0:
+            raise ValueError('no meshes given')
+        f = meshes[0].f
+        for i, m in enumerate(meshes[1:], 1):
+            if m.f.shape != f.shape or not np.array_equal(m.f, f):
+                raise ValueError('mesh {} has different faces to mesh 0'.format(i))
+        if compact is None:
+            compact = meshes[0].compact
+        return cls(np.stack([m.v for m in meshes]), f, compact=compact, copy=False)
+
+    @property
+    def v(self) -> np.ndarray:
+        return self._v
+
+    @v.setter
+    def v(self, v: np.ndarray) -> None:
+        if self.compact:
+            v = np.asanyarray(v, dtype=simplemesh.COMPACT_FLOAT_DTYPE)
+        if v.ndim != 3 or v.shape[2] != 3:
+            raise ValueError('v must be an (N, nv, 3) array')
+        self._v = v
+        self._vVersion += 1
+
+    @property
+    def f(self) -> np.ndarray:
+        return self._f
+
+    @property
+    def topology(self) -> topology.MeshTopology:
+        """
+        Adjacency of the shared faces, built on first access
+        """
+        if self._topology is None:
+            self._topology = topology.MeshTopology(self.f, self.v.shape[1])
+        return self._topology
+
+    @property
+    def meshOperators(self) -> operators.MeshOperators:
+        """
+        Sparsity patterns of the mesh operators of the shared faces, built
+        on first access, see SimpleMesh.meshOperators
+        """
+        if self._meshOperators is None:
+            self._meshOperators = operators.MeshOperators(self.f, self.v.shape[1])
+        return self._meshOperators
+
+    def markModified(self) -> None:
+        """
+        Invalidate cached attributes after v has been modified in place.
+        """
+        self._vVersion += 1
+
+    def _getCached(self, name: str, compute):
+        entry = self._cache.get(name)
+        if entry is None or entry[0] != self._vVersion:
+            compute()
+            entry = self._cache[name]
+        return entry[1]
+
+    def _peekCached(self, name: str) -> Optional[np.ndarray]:
+        entry = self._cache.get(name)
+        if entry is None or entry[0] != self._vVersion:
+            return None
+        return entry[1]
+
+    def _setCached(self, name: str, value: Optional[np.ndarray]) -> None:
+        if value is None:
+            self._cache.pop(name, None)
+        else:
+            self._cache[name] = (self._vVersion, value)
+
+    def __len__(self) -> int:
+        return self.v.shape[0]
+
+    def __iter__(self) -> Iterator[SimpleMesh]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, index: Union[int, slice, Sequence[int], np.ndarray]) -> Union[SimpleMesh, 'SimpleMeshBatch']:
+        if isinstance(index, (int, np.integer)):
+            return self._getMesh(int(index))
+
+        batch = SimpleMeshBatch(self.v[index], self.f, compact=self.compact, copy=False)
+        batch._topology = self._topology
+        batch._meshOperators = self._meshOperators
+        for name, (version, value) in self._cache.items():
+            if version == self._vVersion:
+                batch._setCached(name, value[index])
+        return batch
+
+    def _getMesh(self, i: int) -> SimpleMesh:
+        n = len(self)
+        if not -n <= i < n:
+            raise IndexError('mesh index {} out of range for batch of {}'.format(i, n))
+
+        mesh = SimpleMesh(self.v[i], self.f, compact=self.compact, copy=False)
+        if self._topology is not None:
+            mesh.setTopology(self._topology, self._meshOperators)
+        elif self._meshOperators is not None:
+            mesh._meshOperators = self._meshOperators
+        for name in SimpleMesh._CACHE_DEPENDENCIES:
+            value = self._peekCached(name)
+            if value is not None:
+                # a copy, so that in-place updates by the mesh do not
+                # change the batch cache
+                mesh._setCached(name, value[i].copy())
+        return mesh
+
+    def _chunks(self) -> Iterator[slice]:
+        """
+        Slices of meshes with about CHUNK_FACES faces in total, so that
+        intermediate arrays stay small
+        """
+        chunk = max(1, CHUNK_FACES // max(1, self.f.shape[0]))
+        for start in range(0, len(self), chunk):
+            yield slice(start, start + chunk)
+
+    def _faceProperties(self, index: slice) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Face normals, areas and barycenters of the meshes in index
+        """
+        v = self.v[index]
+        v0 = v[:, self.f[:, 0]]
+        v1 = v[:, self.f[:, 1]]
+        v2 = v[:, self.f[:, 2]]
+        e1 = v1 - v0
+        e2 = v2 - v0
+        v1v2 = np.empty_like(e1)
+        v1v2[..., 0] = e1[..., 1] * e2[..., 2] - e1[..., 2] * e2[..., 1]
+        v1v2[..., 1] = e1[..., 2] * e2[..., 0] - e1[..., 0] * e2[..., 2]
+        v1v2[..., 2] = e1[..., 0] * e2[..., 1] - e1[..., 1] * e2[..., 0]
+        scale = np.sqrt(np.einsum('...i,...i->...', v1v2, v1v2))
+        normals = v1v2 / scale[..., np.newaxis]
+        areas = 0.5 * scale
+        barycenters = (v0 + v1 + v2) / 3.0
+        return normals, areas, barycenters
+
+    def _calcFaceProperties(self) -> None:
+        n, m = len(self), self.f.shape[0]
+        dtype = np.result_type(self.v.dtype, np.float32)
+        normals = np.empty((n, m, 3), dtype=dtype)
+        areas = np.empty((n, m), dtype=dtype)
+        barycenters = np.empty((n, m, 3), dtype=dtype)
+        for s in self._chunks():
+            normals[s], areas[s], barycenters[s] = self._faceProperties(s)
+        self.faceNormals = normals
+        self.faceAreas = areas
+        self.faceBarycenters = barycenters
+
+    def calcFaceProperties(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Calculate face normals, areas and barycenters of all meshes
+        """
+        self._calcFaceProperties()
+        return self.faceNormals, self.faceAreas, self.faceBarycenters
+
+    def _iterFaceProperties(self) -> Iterator[Tuple[slice, np.ndarray, np.ndarray]]:
+        """
+        Yield face areas and barycenters in chunks of meshes, using the
+        cached values if available so that full face property arrays are
+        not allocated just to compute mass properties.
+        """
+        areas = self._peekCached('faceAreas')
+        barycenters = self._peekCached('faceBarycenters')
+        for s in self._chunks():
+            if areas is not None and barycenters is not None:
+                yield s, areas[s], barycenters[s]
+            else:
+                _, chunk_areas, chunk_barycenters = self._faceProperties(s)
+                yield s, chunk_areas, chunk_barycenters
+
+    def _calcMassProperties(self, inertia: bool) -> None:
+        """
+        Calculate CoM, and the inertia tensor if inertia is True, of all
+        meshes in one pass over the faces
+        """
+        dtype = np.result_type(self.v.dtype, np.float32)
+        com = np.empty((len(self), 3), dtype=dtype)
+        inertial_mat = np.empty((len(self), 3, 3), dtype=dtype) if inertia else None
+        for s, areas, barycenters in self._iterFaceProperties():
+            com[s] = np.einsum('nm,nmi->ni', areas, barycenters) / areas.sum(1)[:, np.newaxis]
+            if inertia:
+                d = barycenters - com[s][:, np.newaxis, :]
+                second_moment = np.matmul((d * areas[..., np.newaxis]).transpose(0, 2, 1), d)
+                trace = np.trace(second_moment, axis1=1, axis2=2)
+                inertial_mat[s] = trace[:, np.newaxis, np.newaxis] * np.eye(3) - second_moment
+
+        self.CoM = com
+        if inertia:
+            self.inertial_mat = inertial_mat
+
+    def calcCoM(self) -> np.ndarray:
+        self._calcMassProperties(inertia=False)
+        return self.CoM
+
+    def calcPMoments(self) -> Tuple[np.ndarray, np.ndarray]:
+        self._calcMassProperties(inertia=True)
+
+        u, s, vh = np.linalg.svd(self.inertial_mat)
+        principal_moments = s.real[:, ::-1]
+        principal_axes = np.ascontiguousarray(u.real[:, :, ::-1])
+
+        # same sign convention as SimpleMesh.calcPMoments
+        for axis, component in ((0, 2), (1, 0), (2, 1)):
+            flip = principal_axes[:, component, axis] < 0.0
+            principal_axes[flip, :, axis] *= -1.0
+
+        self.principalMoments = principal_moments
+        self.principalAxes = principal_axes
+        return principal_moments, principal_axes
+
+    def calcSolidMassProperties(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Calculate the volume, centroid and second moment tensor of the solid
+        enclosed by each mesh, see SimpleMesh.calcSolidMassProperties
+        """
+        n = len(self)
+        volume = np.empty(n)
+        centroid = np.empty((n, 3))
+        second_moment = np.empty((n, 3, 3))
+        for s in self._chunks():
+            volume[s], centroid[s], second_moment[s] = massproperties.mass_properties(self.v[s], self.f)
+        self.volume = volume
+        self.solidCentroid = centroid
+        self.solidSecondMoment = second_moment
+        return volume, centroid, second_moment
+
+    def calcSolidInertia(self, density: float = 1.0) -> np.ndarray:
+        """
+        (N, 3, 3) inertia tensors of the enclosed solids about their
+        centroids, for a uniform density
+        """
+        return massproperties.inertia_tensor(self.solidSecondMoment, density)
+
+    def transformAffine(self, t: np.ndarray) -> None:
+        """
+        Transform the vertices of all meshes by an affine transformation
+        matrix t of shape (3, 4) or (4, 4), or of each mesh by its own
+        matrix in t of shape (N, 3, 4) or (N, 4, 4).
+        """
+        t = np.asarray(t, dtype=float)
+        if t.ndim == 2:
+            t = t[np.newaxis]
+        if t.shape[0] not in (1, len(self)):
+            raise ValueError('expected 1 or {} transforms, got {}'.format(len(self), t.shape[0]))
+        a = t[:, :3, :3]
+        b = t[:, :3, 3]
+
+        face_normals = self._peekCached('faceNormals')
+        face_areas = self._peekCached('faceAreas')
+        face_barycenters = self._peekCached('faceBarycenters')
+
+        self.v = (np.matmul(self.v, a.transpose(0, 2, 1)) + b[:, np.newaxis, :]).astype(self.v.dtype, copy=False)
+
+        # carry over cached face properties as in SimpleMesh.transformAffine
+        if face_barycenters is not None:
+            self.faceBarycenters = (
+                    np.matmul(face_barycenters, a.transpose(0, 2, 1)) + b[:, np.newaxis, :]
+            ).astype(face_barycenters.dtype, copy=False)
+        det = np.linalg.det(a)
+        if face_normals is not None and face_areas is not None and np.all(det != 0.0):
+            cofactor = (det[:, np.newaxis, np.newaxis] * np.linalg.inv(a).transpose(0, 2, 1)).astype(
+                face_normals.dtype
+            )
+            scaled_normals = np.matmul(face_normals, cofactor.transpose(0, 2, 1))
+            scale = np.sqrt((scaled_normals * scaled_normals).sum(-1))
+            self.faceNormals = scaled_normals / scale[..., np.newaxis]
+            self.faceAreas = face_areas * scale
+
+    def smooth(
+            self,
+            method: str = 'taubin',
+            iterations: int = 10,
+            weights: str = 'uniform',
+            lock_boundary: bool = True,
+            locked: Optional[np.ndarray] = None,
+            relaxation: float = 0.5,
+            lam: float = smoothing.TAUBIN_LAMBDA,
+            mu: float = smoothing.TAUBIN_MU,
+            time_step: float = 1.0) -> 'SimpleMeshBatch':
+        """
+        Smooth all meshes, see SimpleMesh.smooth. With uniform weights the
+        operator is shared, so all meshes are smoothed together with one
+        sparse product, or one factorisation for implicit smoothing, per
+        step. With cotangent weights the meshes are smoothed one at a time
+        with the shared operator patterns.
+
+        :return: a new batch of the smoothed meshes sharing the faces,
+            topology and operator patterns of this batch
+        """
+        n_meshes, n_vertices = self.v.shape[:2]
+        if weights == 'uniform':
+            mask = smoothing.locked_vertices(self.v[0], self.topology, lock_boundary, None, locked)
+            laplacian = self.meshOperators.uniform_laplacian()
+            # vertices in rows, the coordinates of all meshes in columns
+            x = self.v.transpose(1, 0, 2).reshape(n_vertices, 3 * n_meshes)
+            if method == 'laplacian':
+                x = smoothing.laplacian_smooth(x, laplacian, iterations, relaxation, mask)
+            elif method == 'taubin':
+                x = smoothing.taubin_smooth(x, laplacian, iterations, lam, mu, mask)
+            elif method == 'implicit':
+                x = smoothing.implicit_smooth(x, laplacian, None, time_step, iterations, mask)
+            else:
+                raise ValueError('unknown smoothing method {}'.format(method))
+            v = x.reshape(n_vertices, n_meshes, 3).transpose(1, 0, 2)
+        elif weights == 'cotangent':
+            v = np.stack([
+                mesh.smooth(
+                    method, iterations, weights, lock_boundary, None, locked, relaxation, lam, mu, time_step
+                ).v for mesh in self
+            ])
+        else:
+            raise ValueError('unknown weights {}'.format(weights))
+
+        batch = SimpleMeshBatch(v.astype(self.v.dtype, copy=False), self.f, compact=self.compact, copy=False)
+        batch._topology = self._topology
+        batch._meshOperators = self._meshOperators
+        return batch
+
+    def toMeshes(self) -> List[SimpleMesh]:
+        """
+        List of SimpleMesh views of each mesh, see __getitem__
+        """
+        return list(self)
@@ -0,0 +1,268 @@
+"""
+FILE: meshfile.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Versioned single-file binary container for SimpleMesh arrays
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+File layout
+-----------
+magic            8 bytes, b'GIASMESH'
+format version   uint32, little-endian
+header length    uint32, little-endian
+header           utf-8 JSON, header length bytes
+padding          zeros up to the next multiple of ALIGNMENT bytes
+arrays           raw C-ordered array bytes, each starting at a multiple of
+                 ALIGNMENT bytes from the start of the array section
+
+The header maps each stored name to its dtype, shape, and byte offset from
+the start of the array section. Arrays can be read individually without
+reading the rest of the file.
+"""
+import json
+import logging
+import pickle
+import struct
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'GIASMESH'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct('<8sII')
+
+# SimpleMesh attribute stored under each name, in SimpleMesh.__init__ order
+MESH_ATTRIBUTES = [
+    ('vertices', 'v'),
+    ('faces', 'f'),
+    ('mean_curvature', 'H'),
+    ('gaussian_curvature', 'K'),
+    ('k1', 'k1'),
+    ('k2', 'k2'),
+    ('E', 'E'),
+    ('data', 'data'),
+]
+MESH_ATTRIBUTE_NAMES = [name for name, _ in MESH_ATTRIBUTES]
+
+# ways the SimpleMesh data attribute can be stored
+_DATA_ARRAY = 'array'
+_DATA_DICT = 'dict'
+_DATA_PICKLE = 'pickle'
+
+
+class MeshFileError(IOError):
+    pass
+
+
+def _align(n: int) -> int:
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+
+def is_mesh_file(filename: str) -> bool:
+    """
+    Check if a file is a mesh container file
+    """
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except (IOError, OSError):
+        return False
+
+
+def _is_array_attribute(x: Any) -> bool:
+    """
+    True for arrays that should be stored, False for unset attributes,
+    which are None or 0-d object arrays of None.
+    """
+    if x is None:
+        return False
+    x = np.asarray(x)
+    return x.dtype != object
+
+
+def _data_entries(data: Any) -> Dict[str, np.ndarray]:
+    """
+    Arrays to store for the SimpleMesh data attribute
+    """
+    if data is None:
+        return {}
+    if isinstance(data, np.ndarray) and data.dtype != object:
+        return {'data': data}
+    if isinstance(data, dict) and all(
+            isinstance(k, str) and isinstance(d, np.ndarray) and d.dtype != object for k, d in data.items()):
+        return {'data/' + k: d for k, d in data.items()}
+    return {'data': np.frombuffer(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8)}
+
+
+def write_mesh_file(filename: str, arrays: Dict[str, np.ndarray], attributes: Optional[Dict] = None) -> None:
+    """
+    Write named arrays to a mesh container file.
+
+    :param filename: output filename
+    :param arrays: dict of name to array
+    :param attributes: optional JSON-serialisable dict stored in the header
+    """
+    entries = {}
+    offset = 0
+    contiguous = {}
+    for name, a in arrays.items():
+        a = np.ascontiguousarray(a)
+        contiguous[name] = a
+        entries[name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+        offset = _align(offset + a.nbytes)
+
+    header = {'arrays': entries, 'attributes': attributes or {}}
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _align(_PREFIX.size + len(header_bytes))
+
+    with open(filename, 'wb') as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, a in contiguous.items():
+            f.write(b'\0' * (data_start + entries[name]['offset'] - f.tell()))
+            a.tofile(f)
+
+
+class MeshFile(object):
+    """
+    Reader for mesh container files. Only the header is read on opening.
+    Arrays are read individually on request, either into memory or as
+    read-only memory maps.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            prefix = f.read(_PREFIX.size)
+            if len(prefix) < _PREFIX.size:
+                raise MeshFileError('{} is not a mesh file'.format(filename))
+            magic, version, header_length = _PREFIX.unpack(prefix)
+            if magic != MAGIC:
+                raise MeshFileError('{} is not a mesh file'.format(filename))
+            if version > FORMAT_VERSION:
+                raise MeshFileError(
+                    '{} has format version {}, newest supported is {}'.format(filename, version, FORMAT_VERSION)
+                )
+            header = json.loads(f.read(header_length).decode('utf-8'))
+
+        self.version = version
+        self.data_start = _align(_PREFIX.size + header_length)
+        self.arrays = header['arrays']
+        self.attributes = header.get('attributes', {})
+
+    def keys(self) -> List[str]:
+        return list(self.arrays.keys())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.arrays
+
+    def read(self, name: str, mmap: bool = False) -> np.ndarray:
+        """
+        Read a stored array.
+
+        :param name: name of the array
+        :param mmap: return a read-only numpy.memmap of the array instead
+            of reading it into memory
+        """
+        try:
+            entry = self.arrays[name]
+        except KeyError:
+            raise KeyError('{} not in {}'.format(name, self.filename))
+
+        dtype = np.dtype(entry['dtype'])
+        shape = tuple(entry['shape'])
+        offset = self.data_start + entry['offset']
+        count = int(np.prod(shape))
+        if mmap and count > 0:
+            return np.memmap(self.filename, dtype=dtype, mode='r', offset=offset, shape=shape)
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            a = np.fromfile(f, dtype=dtype, count=count)
+        return a.reshape(shape)
+
+    def read_data(self, mmap: bool = False) -> Any:
+        """
+        Read the stored SimpleMesh data attribute
+
+        :param mmap: memory-map stored data arrays, see read
+        """
+        kind = self.attributes.get('data_kind')
+        if kind == _DATA_DICT:
+            return {k[len('data/'):]: self.read(k, mmap) for k in self.keys() if k.startswith('data/')}
+        elif kind == _DATA_PICKLE:
+            return pickle.loads(self.read('data').tobytes())
+        elif kind == _DATA_ARRAY:
+            return self.read('data', mmap)
+        return None
+
+
+def save_simple_mesh(sm, filename: str) -> None:
+    """
+    Save a SimpleMesh to a mesh container file. Unset attributes are not
+    stored.
+    """
+    arrays = {}
+    for name, attr in MESH_ATTRIBUTES[:-1]:
+        x = getattr(sm, attr)
+        if _is_array_attribute(x):
+            arrays[name] = np.asarray(x)
+
+    data = getattr(sm, 'data', None)
+    data_arrays = _data_entries(data)
+    arrays.update(data_arrays)
+    if data is None:
+        data_kind = None
+    elif 'data' in data_arrays and data_arrays['data'] is not data:
+        data_kind = _DATA_PICKLE
+    elif 'data' in data_arrays:
+        data_kind = _DATA_ARRAY
+    else:
+        data_kind = _DATA_DICT
+
+    write_mesh_file(filename, arrays, attributes={'data_kind': data_kind})
+
+
+def load_simple_mesh_arrays(
+        filename: str,
+        attributes: Optional[Iterable[str]] = None,
+        mmap: bool = False) -> List[Any]:
+    """
+    Read SimpleMesh arrays from a mesh container file.
+
+    :param filename: input filename
+    :param attributes: names of the attributes to read, from
+        MESH_ATTRIBUTE_NAMES. All are read if None.
+    :param mmap: return read-only numpy.memmap arrays instead of reading
+        the arrays into memory
+    :return: list of the attribute values in MESH_ATTRIBUTE_NAMES order,
+        with None for unset or unread attributes
+    """
+    if attributes is None:
+        attributes = MESH_ATTRIBUTE_NAMES
+    else:
+        unknown = set(attributes).difference(MESH_ATTRIBUTE_NAMES)
+        if unknown:
+            raise ValueError('unknown mesh attributes {}'.format(sorted(unknown)))
+
+    mf = MeshFile(filename)
+    out = []
+    for name in MESH_ATTRIBUTE_NAMES:
+        if name not in attributes:
+            out.append(None)
+        elif name == 'data':
+            out.append(mf.read_data(mmap))
+        elif name in mf:
+            out.append(mf.read(name, mmap))
+        else:
+            out.append(None)
+
+    return out
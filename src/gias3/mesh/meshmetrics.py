@@ -0,0 +1,231 @@
+"""
+FILE: meshmetrics.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Surface distance metrics between triangle meshes
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+Distances are measured from the vertices of one mesh to the closest point
+on the faces of the other, using surfacequery and a bvh.FaceBVH of the
+target surface. Metrics are symmetric: both meshes are sampled at their
+vertices, and the distances of both directions are pooled.
+
+- hausdorff: the largest distance in either direction
+- assd: average symmetric surface distance, the mean of the pooled
+  distances
+- rms: root mean square of the pooled distances
+
+The Hausdorff distance alone does not need every distance. Points are
+visited in decreasing order of an upper bound of their distance, the
+distance to the nearest target vertex, and points whose bound is below the
+largest distance found so far are skipped (Taha and Hanbury 2015). The
+second direction starts from the result of the first.
+"""
+import logging
+import os
+from typing import Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from gias3.mesh import bvh
+from gias3.mesh import surfacequery
+
+log = logging.getLogger(__name__)
+
+
+class MeshDistances(NamedTuple):
+    """
+    Distance metrics between a mesh and a reference mesh
+    """
+    hausdorff: float
+    assd: float
+    rms: float
+    # distance from each vertex of the mesh to the reference surface
+    distances: np.ndarray
+    # distance from each vertex of the reference to the mesh surface
+    reference_distances: np.ndarray
+
+
+def _as_surface(mesh) -> Tuple[np.ndarray, np.ndarray, bvh.FaceBVH]:
+    """
+    Vertices, faces and FaceBVH of a SimpleMesh-like object with v and f
+    attributes, whose faceBVH is used if it has one, or of a (v, f) or
+    (v, f, face_bvh) tuple
+    """
+    if hasattr(mesh, 'v') and hasattr(mesh, 'f'):
+        v, f = mesh.v, mesh.f
+        face_bvh = getattr(mesh, 'faceBVH', None)
+    elif len(mesh) == 3:
+        v, f, face_bvh = mesh
+    else:
+        v, f = mesh
+        face_bvh = None
+    v = np.asarray(v, dtype=float)
+    f = np.asarray(f)
+    if len(f) == 0:
+        raise ValueError('mesh has no faces')
+    if face_bvh is None:
+        face_bvh = bvh.FaceBVH(v, f)
+    return v, f, face_bvh
+
+
+def surface_distances(
+        face_bvh: bvh.FaceBVH,
+        points: np.ndarray,
+        chunk_size: int = surfacequery.CHUNK_POINTS,
+        n_workers: Optional[int] = None) -> np.ndarray:
+    """
+    Distance from each point to the closest point on the faces of a
+    FaceBVH.
+
+    :param face_bvh: FaceBVH of the target surface
+    :param points: (k, 3) points
+    :param chunk_size: number of points per chunk
+    :param n_workers: number of threads, see surfacequery.run_chunked
+    """
+    return surfacequery.closest_points(face_bvh.v, face_bvh.f, points, face_bvh, chunk_size, n_workers)[3]
+
+
+def directed_hausdorff(
+        face_bvh: bvh.FaceBVH,
+        points: np.ndarray,
+        lower_bound: float = 0.0,
+        chunk_size: int = surfacequery.CHUNK_POINTS,
+        n_workers: Optional[int] = None) -> Tuple[float, int]:
+    """
+    Largest distance from any of a set of points to a surface, evaluating
+    only the points that could exceed the largest distance found so far.
+
+    :param face_bvh: FaceBVH of the target surface
+    :param points: (k, 3) points
+    :param lower_bound: a known lower bound of the result, e.g. the
+        Hausdorff distance of the other direction. Points that cannot
+        exceed it are skipped.
+    :param chunk_size: number of points per chunk
+    :param n_workers: number of threads, see surfacequery.run_chunked
+    :return: the larger of lower_bound and the largest distance, and the
+        index of the point at that distance, or -1 if no point exceeds
+        lower_bound
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    # the nearest vertex lies on the surface, so is no closer than the
+    # closest point
+    upper = face_bvh.nearest_vertex_distances(points)
+    # padded like in FaceBVH.nearest_candidates, so that rounding cannot
+    # drop the faces of the nearest vertex
+    radius = upper * (1.0 + bvh.NEAREST_RADIUS_SLACK)
+    order = np.argsort(-upper, kind='stable')
+    n_workers = n_workers or os.cpu_count() or 1
+    batch = chunk_size * n_workers
+
+    h = float(lower_bound)
+    index = -1
+    n_evaluated = 0
+    for start in range(0, len(order), batch):
+        idx = order[start:start + batch]
+        idx = idx[upper[idx] > h]
+        if not len(idx):
+            # bounds are sorted, no later point can exceed h
+            break
+        d2 = np.empty(len(idx))
+
+        def query(a, b):
+            p = points[idx[a:b]]
+            q, fi = face_bvh.query_radius(p, radius[idx[a:b]], chunk_size=b - a)
+            d2[a:b] = surfacequery.nearest_of_candidates(face_bvh.v, face_bvh.f, p, q, fi)[3]
+
+        surfacequery.run_chunked(query, len(idx), chunk_size, n_workers)
+        n_evaluated += len(idx)
+        i = d2.argmax()
+        if d2[i] > h * h:
+            h = float(np.sqrt(d2[i]))
+            index = int(idx[i])
+
+    log.debug('directed Hausdorff evaluated %d of %d points', n_evaluated, len(points))
+    return h, index
+
+
+def hausdorff_distance(
+        mesh,
+        reference,
+        chunk_size: int = surfacequery.CHUNK_POINTS,
+        n_workers: Optional[int] = None) -> float:
+    """
+    Symmetric Hausdorff distance between the vertices and surfaces of two
+    meshes, with early exit, see directed_hausdorff.
+
+    :param mesh: SimpleMesh, or (v, f) or (v, f, face_bvh) tuple
+    :param reference: SimpleMesh, or (v, f) or (v, f, face_bvh) tuple
+    :param chunk_size: number of points per chunk
+    :param n_workers: number of threads, see surfacequery.run_chunked
+    """
+    v, _, face_bvh = _as_surface(mesh)
+    ref_v, _, ref_bvh = _as_surface(reference)
+    h = directed_hausdorff(ref_bvh, v, 0.0, chunk_size, n_workers)[0]
+    return directed_hausdorff(face_bvh, ref_v, h, chunk_size, n_workers)[0]
+
+
+def mesh_distances(
+        mesh,
+        reference,
+        chunk_size: int = surfacequery.CHUNK_POINTS,
+        n_workers: Optional[int] = None) -> MeshDistances:
+    """
+    Distance maps and metrics between the vertices and surfaces of two
+    meshes, see the module docstring.
+
+    :param mesh: SimpleMesh, or (v, f) or (v, f, face_bvh) tuple
+    :param reference: SimpleMesh, or (v, f) or (v, f, face_bvh) tuple
+    :param chunk_size: number of points per chunk
+    :param n_workers: number of threads, see surfacequery.run_chunked
+    """
+    v, _, face_bvh = _as_surface(mesh)
+    ref_v, _, ref_bvh = _as_surface(reference)
+    d = surface_distances(ref_bvh, v, chunk_size, n_workers)
+    ref_d = surface_distances(face_bvh, ref_v, chunk_size, n_workers)
+    pooled = np.concatenate([d, ref_d])
+    return MeshDistances(
+        hausdorff=float(pooled.max()),
+        assd=float(pooled.mean()),
+        rms=float(np.sqrt((pooled * pooled).mean())),
+        distances=d,
+        reference_distances=ref_d,
+    )
+
+
+def compare_to_reference(
+        reference,
+        meshes: Iterable,
+        hausdorff_only: bool = False,
+        chunk_size: int = surfacequery.CHUNK_POINTS,
+        n_workers: Optional[int] = None) -> Union[np.ndarray, List[MeshDistances]]:
+    """
+    Compare many meshes against one reference, whose FaceBVH is built once
+    and reused for every mesh.
+
+    :param reference: SimpleMesh, or (v, f) or (v, f, face_bvh) tuple
+    :param meshes: iterable of SimpleMesh or (v, f) tuples, e.g. a
+        SimpleMeshBatch
+    :param hausdorff_only: compute only the Hausdorff distances, with
+        early exit
+    :param chunk_size: number of points per chunk
+    :param n_workers: number of threads, see surfacequery.run_chunked
+    :return: array of Hausdorff distances if hausdorff_only, otherwise a
+        list of MeshDistances
+    """
+    reference = _as_surface(reference)
+    results = []
+    for mesh in meshes:
+        if hausdorff_only:
+            results.append(hausdorff_distance(mesh, reference, chunk_size, n_workers))
+        else:
+            results.append(mesh_distances(mesh, reference, chunk_size, n_workers))
+    if hausdorff_only:
+        return np.array(results)
+    return results
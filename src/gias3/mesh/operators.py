@@ -0,0 +1,318 @@
+"""
+FILE: operators.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Discrete differential geometry quantities and operators for
+triangle meshes
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+Corner k of face i is the vertex f[i, k]. Per-corner quantities are (m, 3)
+arrays, and the edge opposite corner k joins corners k+1 and k+2 (mod 3).
+"""
+import logging
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+
+from gias3.mesh import topology
+
+log = logging.getLogger(__name__)
+
+# next and previous corner of each face corner
+_NEXT = [1, 2, 0]
+_PREV = [2, 0, 1]
+
+
+class CornerGeometry(object):
+    """
+    Per-corner edge vectors of a triangle mesh, shared by the functions
+    below so that they can be computed once
+
+    Attributes
+    ----------
+    to_next, to_prev : (m, 3, 3) arrays
+        edge vectors from each corner to the next and previous corner
+    dot : (m, 3) array
+        dot product of to_next and to_prev at each corner
+    double_area : (m,) array
+        twice the area of each face
+    """
+
+    def __init__(self, v: np.ndarray, f: np.ndarray):
+        fv = np.asarray(v, dtype=float)[f]
+        self.to_next = fv[:, _NEXT] - fv
+        self.to_prev = fv[:, _PREV] - fv
+        self.dot = (self.to_next * self.to_prev).sum(2)
+        cross = np.cross(self.to_next[:, 0], self.to_prev[:, 0])
+        self.double_area = np.sqrt((cross * cross).sum(1))
+
+
+def corner_angles(v: np.ndarray, f: np.ndarray, geometry: Optional[CornerGeometry] = None) -> np.ndarray:
+    """
+    Interior angle at each face corner, (m, 3)
+    """
+    if geometry is None:
+        geometry = CornerGeometry(v, f)
+    return np.arctan2(geometry.double_area[:, np.newaxis], geometry.dot)
+
+
+def corner_cotangents(v: np.ndarray, f: np.ndarray, geometry: Optional[CornerGeometry] = None) -> np.ndarray:
+    """
+    Cotangent of the interior angle at each face corner, (m, 3). Zero for
+    degenerate faces.
+    """
+    if geometry is None:
+        geometry = CornerGeometry(v, f)
+    double_area = geometry.double_area[:, np.newaxis]
+    cot = np.zeros_like(geometry.dot)
+    np.divide(geometry.dot, double_area, out=cot, where=double_area > 0)
+    return cot
+
+
+def mixed_corner_areas(
+        v: np.ndarray,
+        f: np.ndarray,
+        cot: Optional[np.ndarray] = None,
+        geometry: Optional[CornerGeometry] = None) -> np.ndarray:
+    """
+    Share of each face's area assigned to each of its corners, (m, 3),
+    using the mixed Voronoi areas of Meyer et al. 2003: the Voronoi region
+    for non-obtuse faces, and half the face area for the obtuse corner and a
+    quarter for the other corners of obtuse faces.
+
+    :param cot: corner cotangents if already computed
+    """
+    if geometry is None:
+        geometry = CornerGeometry(v, f)
+    if cot is None:
+        cot = corner_cotangents(v, f, geometry)
+    area = 0.5 * geometry.double_area
+
+    # |edge to next corner|^2 * cot(previous corner) + |edge to previous
+    # corner|^2 * cot(next corner)
+    next_len2 = (geometry.to_next * geometry.to_next).sum(2)
+    prev_len2 = (geometry.to_prev * geometry.to_prev).sum(2)
+    corner_area = 0.125 * (next_len2 * cot[:, _PREV] + prev_len2 * cot[:, _NEXT])
+
+    obtuse_corner = cot < 0.0
+    obtuse_face = obtuse_corner.any(1)
+    corner_area[obtuse_face] = np.where(
+        obtuse_corner[obtuse_face], 0.5, 0.25
+    ) * area[obtuse_face, np.newaxis]
+    return corner_area
+
+
+def vertex_areas(
+        v: np.ndarray,
+        f: np.ndarray,
+        n_vertices: Optional[int] = None,
+        cot: Optional[np.ndarray] = None,
+        geometry: Optional[CornerGeometry] = None) -> np.ndarray:
+    """
+    Mixed Voronoi area of each vertex, see mixed_corner_areas
+    """
+    if n_vertices is None:
+        n_vertices = len(v)
+    corner_area = mixed_corner_areas(v, f, cot, geometry)
+    return np.bincount(np.ravel(f), weights=corner_area.ravel(), minlength=n_vertices)
+
+
+def cotangent_laplacian(v: np.ndarray, f: np.ndarray, n_vertices: Optional[int] = None,
+                        cot: Optional[np.ndarray] = None) -> sparse.csr_matrix:
+    """
+    Cotangent Laplacian L, with L[i, j] = (cot(a_ij) + cot(b_ij)) / 2 for
+    each edge ij, where a_ij and b_ij are the angles opposite the edge, and
+    rows summing to zero. L is symmetric and negative semi-definite, and
+    -(L x)[i] / (2 A[i]) is the mean curvature normal at vertex i, where A
+    is the vertex area.
+
+    To assemble L repeatedly for the same faces, use
+    MeshOperators.cotangent_laplacian.
+
+    :param cot: corner cotangents if already computed
+    """
+    if n_vertices is None:
+        n_vertices = len(v)
+    return MeshOperators(f, n_vertices).cotangent_laplacian(v, cot)
+
+
+class MeshOperators(object):
+    """
+    Sparse operators of a triangle mesh with fixed faces.
+
+    The sparsity patterns and the map from face corners to matrix entries
+    depend only on the faces and are built once. Assembling an operator
+    for new vertex coordinates is then a single numeric refill of the
+    matrix data, without sorting or deduplicating indices.
+
+    Laplacians and mass matrices are (n, n) and share one pattern: the
+    vertex adjacency plus the diagonal. The gradient operator is (3m, n)
+    and maps a scalar per vertex to the gradient in each face, with the
+    x, y, z components of face i in rows 3i, 3i+1, 3i+2.
+    """
+
+    def __init__(self, f: np.ndarray, n_vertices: Optional[int] = None):
+        f = np.asarray(f)
+        if n_vertices is None:
+            n_vertices = int(f.max()) + 1 if f.size else 0
+        self.f = f
+        self.n_vertices = n_vertices
+        self.n_faces = len(f)
+
+        # entries (i, j), (j, i), (i, i), (j, j) for the edge ij opposite
+        # each face corner
+        i = f[:, _NEXT].ravel().astype(np.int64)
+        j = f[:, _PREV].ravel().astype(np.int64)
+        rows = np.concatenate([i, j, i, j])
+        cols = np.concatenate([j, i, i, j])
+        keys, inverse = topology._unique_keys(rows * n_vertices + cols, return_inverse=True)
+
+        dtype = topology._index_dtype(max(n_vertices, len(keys)))
+        key_rows = keys // n_vertices
+        self._indices = (keys % n_vertices).astype(dtype)
+        self._indptr = np.zeros(n_vertices + 1, dtype=dtype)
+        np.cumsum(np.bincount(key_rows, minlength=n_vertices), out=self._indptr[1:])
+        self._inverse = inverse.astype(dtype)
+        self._diagonal = key_rows == self._indices
+        self._degree = np.bincount(key_rows[~self._diagonal], minlength=n_vertices)
+
+        self._uniform_laplacian = None
+        self._gradient_indptr = None
+        self._gradient_indices = None
+
+    @property
+    def nnz(self) -> int:
+        """
+        Number of stored entries of the Laplacian and mass matrices
+        """
+        return len(self._indices)
+
+    def _assemble(self, corner_values: np.ndarray) -> sparse.csr_matrix:
+        """
+        Matrix in the Laplacian pattern from the values of the (i, j), (j, i),
+        (i, i) and (j, j) entries of each face corner, stacked in that
+        order. Values of the same entry are summed.
+        """
+        data = np.bincount(self._inverse, weights=corner_values, minlength=self.nnz)
+        return sparse.csr_matrix(
+            (data, self._indices, self._indptr), shape=(self.n_vertices, self.n_vertices), copy=False
+        )
+
+    def uniform_laplacian(self) -> sparse.csr_matrix:
+        """
+        Graph Laplacian with L[i, j] = 1 for each edge ij and L[i, i] = minus
+        the number of neighbours of i. Depends only on the faces, so it is
+        built once.
+        """
+        if self._uniform_laplacian is None:
+            row_degree = np.repeat(self._degree, np.diff(self._indptr))
+            data = np.where(self._diagonal, -row_degree, 1).astype(float)
+            self._uniform_laplacian = sparse.csr_matrix(
+                (data, self._indices, self._indptr), shape=(self.n_vertices, self.n_vertices), copy=False
+            )
+        return self._uniform_laplacian
+
+    def cotangent_laplacian(self, v: np.ndarray, cot: Optional[np.ndarray] = None,
+                            geometry: Optional[CornerGeometry] = None) -> sparse.csr_matrix:
+        """
+        Cotangent Laplacian for vertex coordinates v, see
+        cotangent_laplacian.
+
+        :param cot: corner cotangents if already computed
+        :param geometry: corner geometry if already computed
+        """
+        if cot is None:
+            cot = corner_cotangents(v, self.f, geometry)
+        w = 0.5 * cot.ravel()
+        return self._assemble(np.concatenate([w, w, -w, -w]))
+
+    def mass_matrix(self, v: np.ndarray, lumped: bool = True,
+                    geometry: Optional[CornerGeometry] = None) -> sparse.csr_matrix:
+        """
+        Mass matrix for vertex coordinates v.
+
+        :param lumped: if True, the diagonal matrix of mixed Voronoi vertex
+            areas, see vertex_areas. Otherwise the consistent linear finite
+            element mass matrix, with area / 6 on the diagonal and area / 12
+            off the diagonal for each face.
+        :param geometry: corner geometry if already computed
+        """
+        if geometry is None:
+            geometry = CornerGeometry(v, self.f)
+        if lumped:
+            areas = vertex_areas(v, self.f, self.n_vertices, geometry=geometry)
+            return sparse.diags(areas, format='csr')
+
+        # each vertex is an end of two of the edges of each of its faces
+        a = np.repeat(geometry.double_area / 24.0, 3)
+        return self._assemble(np.concatenate([a, a, a, a]))
+
+    def gradient(self, v: np.ndarray, geometry: Optional[CornerGeometry] = None) -> sparse.csr_matrix:
+        """
+        Gradient operator for vertex coordinates v, mapping a scalar per
+        vertex to a (3m,) array of the gradient vector in each face.
+        Degenerate faces have zero gradient.
+
+        :param geometry: corner geometry if already computed
+        """
+        if geometry is None:
+            geometry = CornerGeometry(v, self.f)
+        m = self.n_faces
+        if self._gradient_indptr is None:
+            dtype = topology._index_dtype(max(self.n_vertices, 9 * m))
+            self._gradient_indptr = np.arange(0, 9 * m + 1, 3, dtype=dtype)
+            self._gradient_indices = np.repeat(self.f[:, np.newaxis, :], 3, axis=1).ravel().astype(dtype)
+
+        # the gradient of the hat function of corner k is n x e_k / (2 A),
+        # where e_k is the opposite edge from the next to the previous corner
+        double_area = geometry.double_area
+        normals = np.cross(geometry.to_next[:, 0], geometry.to_prev[:, 0])
+        scale = np.zeros_like(double_area)
+        np.divide(1.0, double_area * double_area, out=scale, where=double_area > 0)
+        normals *= scale[:, np.newaxis]
+        opposite = geometry.to_prev - geometry.to_next
+        grad = np.cross(normals[:, np.newaxis, :], opposite)
+        data = grad.transpose(0, 2, 1).ravel()
+        return sparse.csr_matrix(
+            (data, self._gradient_indices, self._gradient_indptr), shape=(3 * m, self.n_vertices), copy=False
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the index arrays
+        """
+        n = self._indices.nbytes + self._indptr.nbytes + self._inverse.nbytes + self._diagonal.nbytes
+        if self._gradient_indices is not None:
+            n += self._gradient_indices.nbytes + self._gradient_indptr.nbytes
+        return n
+
+
+def area_weighted_vertex_normals(
+        v: np.ndarray,
+        f: np.ndarray,
+        n_vertices: Optional[int] = None,
+        geometry: Optional[CornerGeometry] = None) -> np.ndarray:
+    """
+    Unit vertex normals from the area-weighted sum of the normals of
+    incident faces. Their orientation follows the face winding.
+    """
+    if n_vertices is None:
+        n_vertices = len(v)
+    if geometry is None:
+        geometry = CornerGeometry(v, f)
+    face_normals = np.cross(geometry.to_next[:, 0], geometry.to_prev[:, 0])
+    normals = np.column_stack([
+        np.bincount(np.ravel(f), weights=np.repeat(face_normals[:, k], 3), minlength=n_vertices)
+        for k in range(3)
+    ])
+    norm = np.sqrt((normals * normals).sum(1))
+    np.divide(normals, norm[:, np.newaxis], out=normals, where=norm[:, np.newaxis] > 0)
+    return normals
@@ -0,0 +1,170 @@
+"""
+FILE: progress.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Throttled progress and timing callbacks for long-running mesh
+operations
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+Long-running operations create a ProgressReporter and call its update
+method as items are processed. The reporter passes a ProgressInfo to a
+callback at most once per interval seconds, and once more when the
+operation finishes, so the final report gives the total elapsed time and
+throughput.
+
+Reporting is disabled by default. Enable it for all operations with
+set_progress_callback, e.g. set_progress_callback(log_progress), or for
+one call by passing a callback as its progress argument.
+"""
+import logging
+import time
+from typing import Callable, NamedTuple, Optional
+
+log = logging.getLogger(__name__)
+
+
+class ProgressInfo(NamedTuple):
+    """
+    One progress report of an operation
+    """
+    task: str
+    done: int
+    total: Optional[int]
+    elapsed: float
+    rate: float
+    finished: bool
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """
+        Fraction of items processed, or None if the total is unknown
+        """
+        if not self.total:
+            return None
+        return self.done / self.total
+
+
+ProgressCallback = Callable[[ProgressInfo], None]
+
+DEFAULT_INTERVAL = 1.0
+
+_callback: Optional[ProgressCallback] = None
+_interval = DEFAULT_INTERVAL
+
+
+def set_progress_callback(callback: Optional[ProgressCallback], interval: float = DEFAULT_INTERVAL) -> None:
+    """
+    Set the callback used by operations that are not given their own.
+
+    :param callback: called with a ProgressInfo, or None to disable
+        reporting
+    :param interval: minimum number of seconds between reports of an
+        operation before it finishes
+    """
+    global _callback, _interval
+    if interval < 0:
+        raise ValueError('interval must be non-negative')
+    _callback = callback
+    _interval = interval
+
+
+def get_progress_callback() -> Optional[ProgressCallback]:
+    return _callback
+
+
+def log_progress(info: ProgressInfo) -> None:
+    """
+    Progress callback that logs each report at INFO level
+    """
+    if info.total:
+        log.info(
+            '%s: %d/%d (%.0f%%) in %.2f s, %.0f items/s%s',
+            info.task, info.done, info.total, 100.0 * info.fraction, info.elapsed, info.rate,
+            ' (done)' if info.finished else ''
+        )
+    else:
+        log.info(
+            '%s: %d in %.2f s, %.0f items/s%s',
+            info.task, info.done, info.elapsed, info.rate, ' (done)' if info.finished else ''
+        )
+
+
+class ProgressReporter(object):
+    """
+    Counts the items processed by an operation and reports to a callback.
+    update costs one clock read when a callback is set, and nothing else
+    when reporting is disabled.
+
+    Can be used as a context manager, which calls finish on exit.
+    """
+
+    def __init__(
+            self,
+            task: str,
+            total: Optional[int] = None,
+            callback: Optional[ProgressCallback] = None,
+            interval: Optional[float] = None):
+        """
+        :param task: name of the operation
+        :param total: number of items to process, if known
+        :param callback: callback for this operation. Defaults to the one
+            set by set_progress_callback.
+        :param interval: minimum number of seconds between reports.
+            Defaults to the one set by set_progress_callback.
+        """
+        self.task = task
+        self.total = total
+        self.callback = _callback if callback is None else callback
+        self.interval = _interval if interval is None else interval
+        self.done = 0
+        self.finished = False
+        self._start = time.perf_counter()
+        self._last = self._start
+
+    @property
+    def enabled(self) -> bool:
+        return self.callback is not None
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def update(self, n: int = 1) -> None:
+        """
+        Record n more processed items, reporting if interval seconds have
+        passed since the last report.
+        """
+        self.done += n
+        if self.callback is None:
+            return
+        now = time.perf_counter()
+        if now - self._last >= self.interval:
+            self._last = now
+            self._report(now)
+
+    def finish(self) -> None:
+        """
+        Send the final report. Later calls do nothing.
+        """
+        if self.finished:
+            return
+        self.finished = True
+        if self.callback is not None:
+            self._report(time.perf_counter())
+
+    def _report(self, now: float) -> None:
+        elapsed = now - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        self.callback(ProgressInfo(self.task, self.done, self.total, elapsed, rate, self.finished))
+
+    def __enter__(self) -> 'ProgressReporter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.finish()
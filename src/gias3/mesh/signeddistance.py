@@ -0,0 +1,363 @@
+"""
+FILE: signeddistance.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Signed distance fields of closed triangle meshes
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+Distances are negative inside and positive outside a closed mesh. The sign
+is found by one of
+
+- 'pseudonormal': the sign of the offset from the closest point along the
+  angle-weighted pseudo-normal of the closest face, edge or vertex
+  (Baerentzen and Aanaes 2005). Needs consistently oriented faces with
+  outward normals, and the closest point of every point.
+- 'parity': the parity of the number of faces crossed by a ray from the
+  point. Independent of face orientation. On grids one ray is cast per
+  grid row, so the sign of every voxel costs almost nothing.
+
+With a narrow band, distances are only computed for points whose nearest
+face box is within the band, and all other points get plus or minus the
+band width, signed by ray parity. Grids are evaluated in blocks of voxels,
+and only blocks near a face are visited.
+"""
+import logging
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from gias3.mesh import bvh
+from gias3.mesh import operators
+from gias3.mesh import surfacequery
+from gias3.mesh import topology
+
+log = logging.getLogger(__name__)
+
+SIGN_METHODS = ('pseudonormal', 'parity')
+# slightly off-axis so that rays rarely pass exactly through edges and
+# vertices of axis-aligned meshes
+RAY_DIRECTION = np.array([1.0, np.sqrt(2.0) * 1e-4, np.sqrt(3.0) * 1e-4])
+RAY_DIRECTION /= np.sqrt((RAY_DIRECTION * RAY_DIRECTION).sum())
+# number of voxels per side of the blocks of a grid
+GRID_BLOCK = 8
+
+
+class PseudoNormals(object):
+    """
+    Angle-weighted pseudo-normals of the faces, edges and vertices of a
+    triangle mesh.
+    """
+
+    def __init__(self, v: np.ndarray, f: np.ndarray, mesh_topology: Optional[topology.MeshTopology] = None):
+        """
+        :param v: (n, 3) vertex coordinates
+        :param f: (m, 3) face vertex indices
+        :param mesh_topology: MeshTopology of f, if already built
+        """
+        v = np.asarray(v, dtype=float)
+        self.f = np.asarray(f)
+        n = len(v)
+        if mesh_topology is None:
+            mesh_topology = topology.MeshTopology(self.f, n)
+        self.face_edges = mesh_topology.face_edges
+
+        geometry = operators.CornerGeometry(v, self.f)
+        normals = np.cross(v[self.f[:, 1]] - v[self.f[:, 0]], v[self.f[:, 2]] - v[self.f[:, 0]])
+        length = np.sqrt((normals * normals).sum(1))
+        np.divide(normals, length[:, np.newaxis], out=normals, where=length[:, np.newaxis] > 0)
+        self.face_normals = normals
+
+        angles = operators.corner_angles(v, self.f, geometry)
+        n_edges = len(mesh_topology.edges)
+        self.vertex_normals = np.column_stack([
+            np.bincount(self.f.ravel(), weights=(angles * normals[:, k, np.newaxis]).ravel(), minlength=n)
+            for k in range(3)
+        ])
+        self.edge_normals = np.column_stack([
+            np.bincount(self.face_edges.ravel(), weights=np.repeat(normals[:, k], 3), minlength=n_edges)
+            for k in range(3)
+        ])
+
+    def signs(self, points: np.ndarray, faces: np.ndarray, bary: np.ndarray, closest: np.ndarray) -> np.ndarray:
+        """
+        Sign of each point from its closest point on the surface.
+
+        :param points: (k, 3) points
+        :param faces: (k,) face of the closest point of each point
+        :param bary: (k, 3) barycentric coordinates of the closest points,
+            with exact zeros on edges and vertices, as returned by
+            surfacequery.closest_points
+        :param closest: (k, 3) closest points
+        :return: -1 inside and 1 outside
+        """
+        zero = bary <= 0.0
+        n_zero = zero.sum(1)
+        normals = self.face_normals[faces]
+
+        # on the edge opposite the zero corner, which is edge (k + 1) % 3
+        # of the face in the order of topology.mesh_edges
+        on_edge = n_zero == 1
+        corner = zero[on_edge].argmax(1)
+        normals[on_edge] = self.edge_normals[self.face_edges[faces[on_edge], (corner + 1) % 3]]
+
+        on_vertex = n_zero == 2
+        corner = (~zero[on_vertex]).argmax(1)
+        normals[on_vertex] = self.vertex_normals[self.f[faces[on_vertex], corner]]
+
+        offset = bvh._dot(points - closest, normals)
+        return np.where(offset < 0.0, -1.0, 1.0)
+
+
+def ray_parity_inside(
+        face_bvh: bvh.FaceBVH,
+        points: np.ndarray,
+        chunk_size: int = surfacequery.CHUNK_POINTS,
+        n_workers: Optional[int] = None) -> np.ndarray:
+    """
+    Whether each point is inside a closed mesh, from the parity of the
+    number of faces crossed by a ray from the point along RAY_DIRECTION.
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    inside = np.empty(len(points), dtype=bool)
+
+    def query(start, stop):
+        q = face_bvh.ray_face_hits(points[start:stop], RAY_DIRECTION, chunk_size=stop - start)[0]
+        inside[start:stop] = np.bincount(q, minlength=stop - start) % 2 == 1
+
+    surfacequery.run_chunked(query, len(points), chunk_size, n_workers)
+    return inside
+
+
+def grid_parity_inside(
+        face_bvh: bvh.FaceBVH,
+        shape: Sequence[int],
+        origin: Sequence[float] = (0.0, 0.0, 0.0),
+        spacing: Sequence[float] = (1.0, 1.0, 1.0),
+        chunk_size: int = surfacequery.CHUNK_POINTS,
+        n_workers: Optional[int] = None) -> np.ndarray:
+    """
+    Whether each point of a regular grid is inside a closed mesh. One ray is
+    cast along the first axis for each row of the grid, from in front of
+    the mesh, and the crossings are accumulated along the row.
+
+    :param shape: (nx, ny, nz) grid shape
+    :param origin: coordinates of grid point (0, 0, 0)
+    :param spacing: grid spacing along each axis
+    :return: boolean array of the grid shape
+    """
+    nx, ny, nz = shape
+    origin = np.asarray(origin, dtype=float)
+    spacing = np.asarray(spacing, dtype=float)
+    n_rows = ny * nz
+    # rows of the grid are the columns of a (nx, ny * nz) view
+    inside = np.empty((n_rows, nx), dtype=bool)
+    x_start = min(origin[0], face_bvh.bounds[0][0]) - spacing[0]
+    direction = np.array([1.0, 0.0, 0.0])
+
+    def query(start, stop):
+        rows = np.arange(start, stop)
+        origins = np.empty((len(rows), 3))
+        origins[:, 0] = x_start
+        # nudge rays off the grid lines that axis-aligned meshes lie on
+        origins[:, 1] = origin[1] + (rows // nz) * spacing[1] + spacing[1] * np.sqrt(2.0) * 1e-6
+        origins[:, 2] = origin[2] + (rows % nz) * spacing[2] + spacing[2] * np.sqrt(3.0) * 1e-6
+        q, _, t, _ = face_bvh.ray_face_hits(origins, direction, chunk_size=len(rows))
+        # each crossing flips the inside state of the grid points after it
+        first = np.clip(np.ceil((x_start + t - origin[0]) / spacing[0]), 0, nx).astype(np.intp)
+        keys, counts = np.unique(q * (nx + 1) + first, return_counts=True)
+        flips = np.zeros((len(rows), nx + 1), dtype=bool)
+        flips.ravel()[keys[counts % 2 == 1]] = True
+        inside[start:stop] = np.logical_xor.accumulate(flips[:, :nx], axis=1)
+
+    surfacequery.run_chunked(query, n_rows, max(chunk_size // max(nx, 1), 1), n_workers)
+    return inside.T.reshape((nx, ny, nz))
+
+
+def _check_sign(sign: str) -> None:
+    if sign not in SIGN_METHODS:
+        raise ValueError('unknown sign method {}, expected one of {}'.format(sign, SIGN_METHODS))
+
+
+def signed_distance(
+        v: np.ndarray,
+        f: np.ndarray,
+        points: np.ndarray,
+        face_bvh: Optional[bvh.FaceBVH] = None,
+        pseudo_normals: Optional[PseudoNormals] = None,
+        sign: str = 'pseudonormal',
+        band: Optional[float] = None,
+        chunk_size: int = surfacequery.CHUNK_POINTS,
+        n_workers: Optional[int] = None) -> np.ndarray:
+    """
+    Signed distance from a closed triangle mesh to each point.
+
+    :param v: (n, 3) vertex coordinates
+    :param f: (m, 3) face vertex indices
+    :param points: (k, 3) points
+    :param face_bvh: FaceBVH of the mesh, built if None
+    :param pseudo_normals: PseudoNormals of the mesh, built if None and
+        needed
+    :param sign: 'pseudonormal' or 'parity', see module docstring
+    :param band: if given, distances are clipped to [-band, band], and
+        points farther than band from every face box are signed by parity
+    :param chunk_size: number of points per chunk
+    :param n_workers: number of threads, see surfacequery.run_chunked
+    :return: (k,) signed distances, negative inside
+    """
+    _check_sign(sign)
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    if len(f) == 0:
+        raise ValueError('mesh has no faces')
+    if face_bvh is None:
+        face_bvh = bvh.FaceBVH(v, f)
+    if sign == 'pseudonormal' and pseudo_normals is None:
+        pseudo_normals = PseudoNormals(face_bvh.v, face_bvh.f)
+
+    d = np.empty(len(points))
+
+    def query(start, stop):
+        d[start:stop] = _signed_distance_chunk(face_bvh, pseudo_normals, points[start:stop], sign, band)
+
+    surfacequery.run_chunked(query, len(points), chunk_size, n_workers)
+    return d
+
+
+def _signed_distance_chunk(
+        face_bvh: bvh.FaceBVH,
+        pseudo_normals: Optional[PseudoNormals],
+        points: np.ndarray,
+        sign: str,
+        band: Optional[float],
+        inside: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Signed distances of one chunk of points, see signed_distance.
+
+    :param inside: inside state of each point, if already known
+    """
+    if band is None:
+        q, fi = face_bvh.nearest_candidates(points, chunk_size=len(points))
+    else:
+        q, fi = face_bvh.query_radius(points, band, chunk_size=len(points))
+    faces, bary, closest, d2 = surfacequery.nearest_of_candidates(face_bvh.v, face_bvh.f, points, q, fi)
+    d = np.sqrt(d2)
+    if band is None:
+        near = faces >= 0
+    else:
+        # a candidate face box within band does not make the candidate the
+        # true closest face, so only points within band are pseudo-normal signed
+        near = d2 <= band * band
+        d = np.minimum(d, band)
+
+    s = np.ones(len(points))
+    if sign == 'pseudonormal':
+        s[near] = pseudo_normals.signs(points[near], faces[near], bary[near], closest[near])
+        if not near.all():
+            if inside is None:
+                s[~near] = np.where(ray_parity_inside(face_bvh, points[~near], n_workers=1), -1.0, 1.0)
+            else:
+                s[~near] = np.where(inside[~near], -1.0, 1.0)
+    else:
+        if inside is None:
+            inside = ray_parity_inside(face_bvh, points, n_workers=1)
+        s = np.where(inside, -1.0, 1.0)
+    return s * d
+
+
+def signed_distance_grid(
+        v: np.ndarray,
+        f: np.ndarray,
+        shape: Sequence[int],
+        origin: Sequence[float] = (0.0, 0.0, 0.0),
+        spacing: Sequence[float] = (1.0, 1.0, 1.0),
+        band: Optional[float] = None,
+        face_bvh: Optional[bvh.FaceBVH] = None,
+        pseudo_normals: Optional[PseudoNormals] = None,
+        sign: str = 'parity',
+        dtype: type = np.float32,
+        n_workers: Optional[int] = None) -> np.ndarray:
+    """
+    Signed distance field of a closed triangle mesh on a regular grid,
+    where grid point (i, j, k) is at origin + (i, j, k) * spacing.
+
+    Every grid point is classified by grid_parity_inside. Distances are
+    then computed in blocks of GRID_BLOCK^3 grid points. With a band, only
+    blocks within band of a face box are evaluated and the rest of the grid
+    is set to plus or minus band, so the cost scales with the area of the
+    surface rather than the volume of the grid.
+
+    :param shape: (nx, ny, nz) grid shape
+    :param origin: coordinates of grid point (0, 0, 0)
+    :param spacing: grid spacing along each axis
+    :param band: narrow band half width, in the units of v
+    :param sign: 'parity' to sign every point by grid_parity_inside, or
+        'pseudonormal' to sign points within the band by pseudo-normals
+    :param dtype: output dtype, float32 by default to halve the memory of
+        large grids
+    :param n_workers: number of threads, see surfacequery.run_chunked
+    :return: array of the grid shape, negative inside
+    """
+    _check_sign(sign)
+    if len(f) == 0:
+        raise ValueError('mesh has no faces')
+    if face_bvh is None:
+        face_bvh = bvh.FaceBVH(v, f)
+    if sign == 'pseudonormal' and pseudo_normals is None:
+        pseudo_normals = PseudoNormals(face_bvh.v, face_bvh.f)
+    shape = tuple(int(x) for x in shape)
+    origin = np.asarray(origin, dtype=float)
+    spacing = np.asarray(spacing, dtype=float)
+
+    inside = grid_parity_inside(face_bvh, shape, origin, spacing, n_workers=n_workers)
+    if band is None:
+        out = np.empty(shape, dtype=dtype)
+    else:
+        out = np.full(shape, band, dtype=dtype)
+        out[inside] = -band
+
+    blocks = _grid_blocks(face_bvh, shape, origin, spacing, band)
+    log.debug('evaluating %d of %d grid blocks', len(blocks), np.prod(_n_blocks(shape)))
+    offsets = np.indices((GRID_BLOCK,) * 3).reshape((3, -1)).T
+    blocks_per_chunk = max(surfacequery.CHUNK_POINTS // len(offsets), 1)
+
+    def query(start, stop):
+        index = (blocks[start:stop, np.newaxis, :] * GRID_BLOCK + offsets).reshape((-1, 3))
+        index = index[(index < shape).all(1)]
+        i, j, k = index.T
+        points = origin + index * spacing
+        out[i, j, k] = _signed_distance_chunk(
+            face_bvh, pseudo_normals, points, sign, band, inside[i, j, k]
+        )
+
+    surfacequery.run_chunked(query, len(blocks), blocks_per_chunk, n_workers)
+    return out
+
+
+def _n_blocks(shape: Tuple[int, ...]) -> np.ndarray:
+    return -(-np.asarray(shape) // GRID_BLOCK)
+
+
+def _grid_blocks(
+        face_bvh: bvh.FaceBVH,
+        shape: Tuple[int, ...],
+        origin: np.ndarray,
+        spacing: np.ndarray,
+        band: Optional[float]) -> np.ndarray:
+    """
+    (b, 3) indices of the grid blocks to evaluate: all of them without a
+    band, otherwise those whose box grown by band overlaps a face box.
+    """
+    n_blocks = _n_blocks(shape)
+    blocks = np.indices(n_blocks).reshape((3, -1)).T
+    if band is None:
+        return blocks
+    lower = origin + blocks * GRID_BLOCK * spacing - band
+    last = np.minimum((blocks + 1) * GRID_BLOCK, shape) - 1
+    upper = origin + last * spacing + band
+    q, _ = face_bvh.query_boxes(lower, upper)
+    return blocks[np.unique(q)]
@@ -13,42 +13,125 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 """
 import logging
 import shelve
-from typing import List, Optional, Union, Tuple, Set, Callable
+from typing import List, Optional, Sequence, Union, Tuple, Callable
 
 import numpy
-import sys
 import vtk
 from numpy.linalg import svd, eigh
 
 from gias3.common import transform3D
+from gias3.mesh import bvh
+from gias3.mesh import curvature
+from gias3.mesh import fingerprint
+from gias3.mesh import geodesic
 from gias3.mesh import inp
+from gias3.mesh import massproperties
+from gias3.mesh import meshfile
+from gias3.mesh import meshmetrics
+from gias3.mesh import operators
+from gias3.mesh import signeddistance
+from gias3.mesh import smoothing
+from gias3.mesh import surfacequery
+from gias3.mesh import topology
+from gias3.mesh import vtkarrays
+from gias3.mesh import winding
+from gias3.mesh.progress import ProgressCallback, ProgressReporter
 from gias3.registration import alignment_analytic as alignment
 
 log = logging.getLogger(__name__)
 log.debug('WARNING: Mayavi not installed, simpleMesh.disp will not work')
 
+# storage types of compact meshes
+COMPACT_FLOAT_DTYPE = numpy.float32
+COMPACT_INT_DTYPE = numpy.int32
+# fraction of the faces above which markVerticesModified invalidates face
+# properties instead of updating them
+INCREMENTAL_FACE_FRACTION = 0.25
+# number of unchanged faces used to find the orientation of cached face
+# normals
+_ORIENTATION_SAMPLE = 64
+
+_compact_default = False
+
+
+def set_compact_default(compact: bool) -> None:
+    """
+    Set whether SimpleMesh instances created without an explicit compact
+    argument use compact storage. See SimpleMesh.
+    """
+    global _compact_default
+    _compact_default = bool(compact)
+
+
+def get_compact_default() -> bool:
+    return _compact_default
+
+
+def _load_simple_mesh(filename: str, attributes: Optional[List[str]] = None, mmap: bool = False):
+    """
+    Read SimpleMesh attributes from a mesh container file, or from a legacy
+    shelve file.
+    """
+    if meshfile.is_mesh_file(filename):
+        return meshfile.load_simple_mesh_arrays(filename, attributes, mmap=mmap)
+
+    if mmap:
+        log.warning('{} is a legacy shelve file and cannot be memory-mapped'.format(filename))
 
-def _load_simple_mesh(filename: str):
     try:
         s = shelve.open(filename, 'r')
     except:
         raise IOError('unable to open ' + filename)
 
-    attrList = ['vertices', 'faces', 'mean_curvature', 'gaussian_curvature', 'k1', 'k2', 'E', 'data']
+    if attributes is None:
+        attributes = meshfile.MESH_ATTRIBUTE_NAMES
 
     out = []
-    for a in attrList:
-        out.append(s.get(a, None))
+    for a in meshfile.MESH_ATTRIBUTE_NAMES:
+        if a in attributes:
+            out.append(s.get(a, None))
+        else:
+            out.append(None)
 
     s.close()
 
     return out
 
 
-def vrml_2_simple_mesh(vrml_filename: str) -> List['SimpleMesh']:
+def load_simple_mesh(
+        filename: str,
+        attributes: Optional[List[str]] = None,
+        mmap: bool = False,
+        compact: Optional[bool] = None) -> 'SimpleMesh':
+    """
+    Load a SimpleMesh saved by SimpleMesh.save, or a legacy shelve file.
+
+    :param filename: input filename
+    :param attributes: names of the attributes to load, see SimpleMesh.load
+    :param mmap: memory-map the arrays instead of reading them, see
+        SimpleMesh.load
+    :param compact: use compact storage, see SimpleMesh. If None and mmap
+        is True, compact storage is used if the stored vertices are float32
+        so that they are not converted.
+    :return: a SimpleMesh instance
+    """
+    s = _load_simple_mesh(filename, attributes, mmap)
+    if compact is None and mmap and isinstance(s[0], numpy.ndarray):
+        compact = s[0].dtype == COMPACT_FLOAT_DTYPE
+    return SimpleMesh(*s, compact=compact, copy=not mmap)
+
+
+def vrml_2_simple_mesh(
+        vrml_filename: str,
+        compact: Optional[bool] = None,
+        copy: bool = True) -> List['SimpleMesh']:
     """
     Read the meshes in a VRML file
     :param vrml_filename: filename of the VRML file
+    :param compact: use compact storage, see SimpleMesh
+    :param copy: if False, vertices and faces are views of the VTK arrays
+        where possible, see vtkarrays.polydata_points and
+        vtkarrays.polydata_triangles
     :return: a list of SimpleMesh instances
     """
     vrml_2_vtk = vtk.vtkVRMLImporter()
@@ -64,24 +147,21 @@ def vrml_2_simple_mesh(vrml_filename: str) -> List['SimpleMesh']:
 
     for i in range(number_of_actors):
         polydata = actors.GetNextActor().GetMapper().GetInput()
-        number_of_points = polydata.GetNumberOfPoints()
-        number_of_cells = polydata.GetNumberOfCells()
-
-        points = numpy.array([polydata.GetPoint(pi) for pi in range(number_of_points)])
-
-        polys = polydata.GetPolys().GetData()
-        polys_data = numpy.array([polys.GetValue(i) for i in range(number_of_cells * 4)])
-        tri = polys_data.reshape((-1, 4))[:, 1:4]
-
-        simple_meshes.append(SimpleMesh(points, tri))
+        points = vtkarrays.polydata_points(polydata, copy=copy)
+        tri = vtkarrays.polydata_triangles(polydata, copy=copy)
+        simple_meshes.append(SimpleMesh(points, tri, compact=compact, copy=False))
 
     return simple_meshes
 
 
-def stl_2_simple_mesh(stl_filename: str) -> 'SimpleMesh':
+def stl_2_simple_mesh(stl_filename: str, compact: Optional[bool] = None, copy: bool = True) -> 'SimpleMesh':
     """
     Read an STL mesh
     :param stl_filename: filename of the stl file
+    :param compact: use compact storage, see SimpleMesh
+    :param copy: if False, vertices and faces are views of the VTK arrays,
+        in the float32 and vtkIdType dtypes of the reader. Otherwise they
+        are float64 and int64 copies, unless compact.
     :return: a SimpleMesh representation of the stl mesh
     """
     stl_reader = vtk.vtkSTLReader()
@@ -89,21 +169,103 @@ def stl_2_simple_mesh(stl_filename: str) -> 'SimpleMesh':
     stl_reader.MergingOn()
     stl_reader.Update()
     polydata = stl_reader.GetOutput()
-    number_of_points = polydata.GetNumberOfPoints()
-    number_of_cells = polydata.GetNumberOfCells()
+    points = vtkarrays.polydata_points(polydata, copy=copy)
+    tri = vtkarrays.polydata_triangles(polydata, copy=copy)
 
-    points = numpy.array([polydata.GetPoint(pi) for pi in range(number_of_points)])
+    sm = SimpleMesh(points, tri, compact=compact, copy=False)
 
-    polys = polydata.GetPolys().GetData()
-    polys_data = numpy.array([polys.GetValue(i) for i in range(number_of_cells * 4)])
-    tri = polys_data.reshape((-1, 4))[:, 1:4]
+    return sm
 
-    sm = SimpleMesh(points, tri)
 
-    return sm
+def _cached_property(name: str, compute: str, doc: str) -> property:
+    """
+    A SimpleMesh attribute that is computed by the method named compute on
+    first access and memoised until the mesh arrays it depends on change.
+    Assigning to the attribute stores the assigned value in the cache.
+    """
+
+    def fget(self):
+        return self._getCached(name, getattr(self, compute))
+
+    def fset(self, value):
+        self._setCached(name, value)
+
+    return property(fget, fset, doc=doc)
 
 
 class SimpleMesh(object):
+    # mesh arrays that each cached derived attribute depends on
+    _CACHE_DEPENDENCIES = {
+        'faceNormals': ('v', 'f'),
+        'faceAreas': ('v', 'f'),
+        'faceBarycenters': ('v', 'f'),
+        'boundingBox': ('v',),
+        'surfaceArea': ('v', 'f'),
+        'CoM': ('v', 'f'),
+        'normCoM': ('v', 'f'),
+        'inertial_mat': ('v', 'f'),
+        'principalMoments': ('v', 'f'),
+        'principalAxes': ('v', 'f'),
+        'uniformLaplacian': ('f',),
+        'cotangentLaplacian': ('v', 'f'),
+        'lumpedMassMatrix': ('v', 'f'),
+        'massMatrix': ('v', 'f'),
+        'gradientOperator': ('v', 'f'),
+        'volume': ('v', 'f'),
+        'solidCentroid': ('v', 'f'),
+        'solidSecondMoment': ('v', 'f'),
+        'geodesicSolver': ('v', 'f'),
+        'pseudoNormals': ('v', 'f'),
+        'windingTree': ('v', 'f'),
+        'topologyFingerprint': ('f',),
+        'geometryFingerprint': ('v',),
+    }
+
+    faceNormals = _cached_property('faceNormals', '_calcFaceProperties', 'unit normal of each face')
+    faceAreas = _cached_property('faceAreas', '_calcFaceProperties', 'area of each face')
+    faceBarycenters = _cached_property('faceBarycenters', '_calcFaceProperties', 'barycenter of each face')
+    boundingBox = _cached_property('boundingBox', 'calcBoundingBox', '3x2 array of vertex coordinate min and max')
+    surfaceArea = _cached_property('surfaceArea', 'calcSurfaceArea', 'total area of the faces')
+    CoM = _cached_property('CoM', 'calcCoM', 'area-weighted centre of mass of the surface')
+    normCoM = _cached_property('normCoM', 'calcNormCoM', 'CoM normalised to the bounding box')
+    inertial_mat = _cached_property('inertial_mat', 'calcPMoments', 'area-weighted inertia tensor of the surface')
+    principalMoments = _cached_property('principalMoments', 'calcPMoments', 'principal moments of inertia')
+    principalAxes = _cached_property('principalAxes', 'calcPMoments', 'principal axes of inertia in columns')
+    uniformLaplacian = _cached_property(
+        'uniformLaplacian', '_calcUniformLaplacian', 'sparse graph Laplacian, see MeshOperators'
+    )
+    cotangentLaplacian = _cached_property(
+        'cotangentLaplacian', '_calcCotangentLaplacian', 'sparse cotangent Laplacian, see MeshOperators'
+    )
+    lumpedMassMatrix = _cached_property(
+        'lumpedMassMatrix', '_calcLumpedMassMatrix', 'sparse diagonal matrix of mixed Voronoi vertex areas'
+    )
+    massMatrix = _cached_property('massMatrix', '_calcMassMatrix', 'sparse consistent finite element mass matrix')
+    gradientOperator = _cached_property(
+        'gradientOperator', '_calcGradientOperator', 'sparse per-face gradient operator, see MeshOperators'
+    )
+    volume = _cached_property('volume', 'calcSolidMassProperties', 'volume enclosed by a closed mesh')
+    solidCentroid = _cached_property('solidCentroid', 'calcSolidMassProperties', 'centroid of the enclosed solid')
+    solidSecondMoment = _cached_property(
+        'solidSecondMoment', 'calcSolidMassProperties', 'second moment tensor of the enclosed solid about its centroid'
+    )
+    geodesicSolver = _cached_property(
+        'geodesicSolver', '_calcGeodesicSolver', 'factorised heat method solver, see geodesic.HeatGeodesicSolver'
+    )
+    pseudoNormals = _cached_property(
+        'pseudoNormals', '_calcPseudoNormals', 'face, edge and vertex pseudo-normals, see signeddistance.PseudoNormals'
+    )
+    windingTree = _cached_property(
+        'windingTree', '_calcWindingTree', 'far field winding number expansion of faceBVH, see winding.WindingTree'
+    )
+
+    topologyFingerprint = _cached_property(
+        'topologyFingerprint', '_calcTopologyFingerprint', 'hex digest of f, see fingerprint.topology_fingerprint'
+    )
+    geometryFingerprint = _cached_property(
+        'geometryFingerprint', '_calcGeometryFingerprint', 'hex digest of v, see fingerprint.geometry_fingerprint'
+    )
+
     def __init__(
             self,
             v: Optional[Union[List[List[float]], numpy.ndarray]] = None,
@@ -113,7 +275,9 @@ class SimpleMesh(object):
             k1: Optional[Union[List[List[float]], numpy.ndarray]] = None,
             k2: Optional[Union[List[List[float]], numpy.ndarray]] = None,
             E: Optional[Union[List[List[float]], numpy.ndarray]] = None,
-            data: Optional[Union[List, numpy.ndarray]] = None):
+            data: Optional[Union[List, numpy.ndarray]] = None,
+            compact: Optional[bool] = None,
+            copy: bool = True):
         """
         A representation of a surface mesh
         :param v: list of vertex coordinates
@@ -124,60 +288,309 @@ class SimpleMesh(object):
         :param k2:
         :param E:
         :param data: additional scalar or array values associated with each vertex
+        :param compact: store vertex coordinates and normals as float32 and
+            faces as int32, and leave unset curvature attributes as None.
+            Defaults to the module setting, see set_compact_default.
+        :param copy: if False, array arguments are used as given instead of
+            being copied, so that e.g. read-only memory-mapped arrays are
+            kept. Arrays are still converted if their dtype does not match
+            the compact setting.
+
+        Derived geometric attributes (faceNormals, faceAreas, faceBarycenters,
+        boundingBox, CoM, normCoM, inertial_mat, principalMoments and
+        principalAxes) are computed on first access and cached. Assigning a
+        new array to v or f invalidates the cached attributes that depend on
+        it. Call markModified after modifying v or f in place.
         """
-        self.v = numpy.array(v)
-        self.f = numpy.array(f)
-        self.H = numpy.array(H)
-        self.K = numpy.array(K)
-        self.k1 = numpy.array(k1)
-        self.k2 = numpy.array(k2)
-        self.E = numpy.array(E)
+        self._cache = {}
+        # names of cached arrays that markVerticesModified copied and that
+        # have not been returned since, so it may update them in place
+        self._ownedCache = set()
+        self._vVersion = 0
+        self._fVersion = 0
+        self.compact = _compact_default if compact is None else bool(compact)
+
+        if copy:
+            _array = numpy.array
+        else:
+            _array = numpy.asanyarray
+
+        self.v = _array(v)
+        self.f = _array(f)
+        if self.compact:
+            self.H = _compact_array(H, copy)
+            self.K = _compact_array(K, copy)
+            self.k1 = _compact_array(k1, copy)
+            self.k2 = _compact_array(k2, copy)
+            self.E = _compact_array(E, copy)
+        else:
+            self.H = _array(H)
+            self.K = _array(K)
+            self.k1 = _array(k1)
+            self.k2 = _array(k2)
+            self.E = _array(E)
         self.data = data
-        self.faceNormals = None
-        self.hasFaceNormals = False
-        self.faceAreas = None
-        self.faceBarycenters = None
-        self.boundingBox = None
-        self.normCoM = None
-        self.principalMoments = None
-        self.principalAxes = None
+        self.vertexNormals = None
+        self.hasVertexNormals = False
+        # sigma and nsize of the last calcVertexNormals
+        self._vertexNormalVoting: Optional[Tuple[float, int]] = None
+
+    @property
+    def v(self) -> numpy.ndarray:
+        return self._v
+
+    @v.setter
+    def v(self, v: numpy.ndarray) -> None:
+        if self.compact and numpy.ndim(v) > 0:
+            v = numpy.asanyarray(v, dtype=COMPACT_FLOAT_DTYPE)
+        self._v = v
+        self._vVersion += 1
+
+    @property
+    def f(self) -> numpy.ndarray:
+        return self._f
+
+    @f.setter
+    def f(self, f: numpy.ndarray) -> None:
+        if self.compact and numpy.ndim(f) > 0:
+            f = numpy.asanyarray(f, dtype=COMPACT_INT_DTYPE)
+        self._f = f
+        self._fVersion += 1
+        self._resetTopology()
+
+    @property
+    def vertexNormals(self) -> Optional[numpy.ndarray]:
+        return self._vertexNormals
+
+    @vertexNormals.setter
+    def vertexNormals(self, vertex_normals: Optional[numpy.ndarray]) -> None:
+        if self.compact and vertex_normals is not None:
+            vertex_normals = numpy.asanyarray(vertex_normals, dtype=COMPACT_FLOAT_DTYPE)
+        self._vertexNormals = vertex_normals
+
+    @property
+    def hasFaceNormals(self) -> bool:
+        return self._isCached('faceNormals')
+
+    @hasFaceNormals.setter
+    def hasFaceNormals(self, value: bool) -> None:
+        # setting False drops the cached face properties so they are
+        # recomputed on next access, True is ignored
+        if not value:
+            for name in ('faceNormals', 'faceAreas', 'faceBarycenters'):
+                self._setCached(name, None)
+
+    def markModified(self, vertices: bool = True, faces: bool = False) -> None:
+        """
+        Invalidate cached attributes after v or f has been modified in
+        place. Assigning a new array to v or f does this automatically.
+        """
+        if vertices:
+            self._vVersion += 1
+        if faces:
+            self._fVersion += 1
+            self._resetTopology()
 
+    def markVerticesModified(self, vertices: Union[Sequence[int], numpy.ndarray]) -> None:
+        """
+        Update cached attributes after the coordinates of some vertices
+        have been modified in place, recomputing only what depends on them.
+
+        faceNormals, faceAreas and faceBarycenters are recomputed for the
+        faces incident to the vertices, found through topology.vertex_faces.
+        Cached arrays are copied on the first update after they were last
+        returned, so arrays returned earlier keep their values. surfaceArea
+        and CoM are updated from the changes in the areas and area-weighted
+        barycenters of those faces. If vertexNormals were computed by
+        calcVertexNormals, the normals of the vertices whose neighbourhoods
+        contain an incident face are voted again and oriented like their
+        previous values, in place. Other cached attributes that depend on v
+        are invalidated, as by markModified.
+
+        If more than INCREMENTAL_FACE_FRACTION of the faces are incident,
+        face properties are invalidated and recomputed on next access
+        instead.
+
+        :param vertices: indices of the modified vertices
+        """
+        vertices = numpy.unique(numpy.asarray(vertices, dtype=numpy.intp))
+        if not self.has1Ring:
+            self.set1Ring()
+        faces = numpy.unique(self.faces1Ring.take(vertices).indices)
+        cached = {
+            name: self._peekCached(name)
+            for name in ('faceNormals', 'faceAreas', 'faceBarycenters', 'surfaceArea', 'CoM')
+        }
+        self._vVersion += 1
+        if len(faces) <= INCREMENTAL_FACE_FRACTION * len(self.f):
+            self._updateFaceProperties(faces, **cached)
+        if self.vertexNormals is not None and self._vertexNormalVoting is not None:
+            self._updateVertexNormals(faces)
+
+    def _updateFaceProperties(
+            self,
+            faces: numpy.ndarray,
+            faceNormals: Optional[numpy.ndarray],
+            faceAreas: Optional[numpy.ndarray],
+            faceBarycenters: Optional[numpy.ndarray],
+            surfaceArea: Optional[float],
+            CoM: Optional[numpy.ndarray]) -> None:
+        """
+        Recompute the face properties of faces, given the cached values
+        from before the vertices moved, and store them for the current
+        version of v
+        """
+        def writable(name, value):
+            if name in self._ownedCache:
+                return value
+            return value.copy()
+
+        face_vertices = self.v[self.f[faces]]
+        v1 = face_vertices[:, 1, :] - face_vertices[:, 0, :]
+        v2 = face_vertices[:, 2, :] - face_vertices[:, 0, :]
+        v1v2 = numpy.cross(v1, v2)
+        areas = 0.5 * mag2(v1v2)
+        barycenters = (face_vertices[:, 0, :] + (face_vertices[:, 1, :] + face_vertices[:, 2, :])) / 3.0
+
+        if faceAreas is not None and surfaceArea is not None:
+            new_area = surfaceArea + (areas.sum() - faceAreas[faces].sum())
+            if CoM is not None and faceBarycenters is not None and new_area > 0.0:
+                moment = (
+                    (barycenters * areas[:, numpy.newaxis]).sum(0) -
+                    (faceBarycenters[faces] * faceAreas[faces][:, numpy.newaxis]).sum(0)
+                )
+                self.CoM = (CoM * surfaceArea + moment) / new_area
+            self.surfaceArea = new_area
+
+        if faceNormals is not None:
+            # cached normals may have been flipped, e.g. by calcVertexNormals,
+            # so orient the new normals like the normals of unchanged faces
+            unchanged = numpy.ones(len(self.f), dtype=bool)
+            unchanged[faces] = False
+            sample = numpy.flatnonzero(unchanged)[:_ORIENTATION_SAMPLE]
+            sample_vertices = self.v[self.f[sample]]
+            sample_normals = numpy.cross(
+                sample_vertices[:, 1, :] - sample_vertices[:, 0, :], sample_vertices[:, 2, :] - sample_vertices[:, 0, :]
+            )
+            if (sample_normals * faceNormals[sample]).sum() < 0.0:
+                v1v2 = -v1v2
+            faceNormals = writable('faceNormals', faceNormals)
+            faceNormals[faces] = normalise2(v1v2)
+            self.faceNormals = faceNormals
+            self._ownedCache.add('faceNormals')
+        if faceAreas is not None:
+            faceAreas = writable('faceAreas', faceAreas)
+            faceAreas[faces] = areas
+            self.faceAreas = faceAreas
+            self._ownedCache.add('faceAreas')
+        if faceBarycenters is not None:
+            faceBarycenters = writable('faceBarycenters', faceBarycenters)
+            faceBarycenters[faces] = barycenters
+            self.faceBarycenters = faceBarycenters
+            self._ownedCache.add('faceBarycenters')
+
+    def _updateVertexNormals(self, faces: numpy.ndarray) -> None:
+        """
+        Vote again the normals of the vertices whose neighbourhoods contain
+        any of faces, see markVerticesModified
+        """
+        sigma, nsize = self._vertexNormalVoting
+        affected = numpy.unique(self.f[faces])
+        if nsize == 1:
+            neigh_faces = self.faces1Ring
+        else:
+            if not self.hasNeighbourhoods or self.neighbourhoodSize != nsize:
+                self.setVerticesNeighbourhoods(nsize)
+            neigh_faces = self.neighbourFaces
+            # vertices up to nsize edges away, a superset of those whose
+            # neighbourhoods contain the faces
+            affected = numpy.unique(numpy.concatenate([affected, self.neighbourVertices.take(affected).indices]))
+
+        # read the face properties without handing them out, so that they
+        # stay writable by the next update
+        f_bary, f_normal, f_area = [
+            self._peekCached(name) if self._isCached(name) else getattr(self, name)
+            for name in ('faceBarycenters', 'faceNormals', 'faceAreas')
+        ]
+        normals = _vote_vertex_normals(
+            self.v[affected], neigh_faces.take(affected), f_bary, f_normal, f_area, sigma
+        )
+        old_normals = self.vertexNormals[affected]
+        normals[(normals * old_normals).sum(1) < 0.0] *= -1.0
+        self.vertexNormals[affected] = normals
+
+    def _resetTopology(self) -> None:
+        self.topology: Optional[topology.MeshTopology] = None
+        self._meshOperators: Optional[operators.MeshOperators] = None
+        self._faceBVH: Optional[bvh.FaceBVH] = None
+        self._faceBVHVersion = None
         self.has1Ring = False
         self.faces1Ring = None
+        self.vertices1Ring = None
         self.has1RingFaces = False
         self.faces1RingFaces = None
         self.hasNeighbourhoods = False
         self.neighbourhoodSize = None
         self.neighbourFaces = None
         self.neighbourVertices = None
-
-        self.vertices1Ring = None
         self.boundaryVertexInd = None
-        self.vertexNormals = None
-        self.hasVertexNormals = False
 
-        self.inertial_mat: Optional[numpy.ndarray] = None
+    def _cacheVersions(self, name: str) -> Tuple[int, ...]:
+        versions = {'v': self._vVersion, 'f': self._fVersion}
+        return tuple(versions[d] for d in self._CACHE_DEPENDENCIES[name])
 
-    def load(self, filename: str) -> None:
-        s = _load_simple_mesh(filename)
-        self.__init__(*s)
+    def _isCached(self, name: str) -> bool:
+        entry = self._cache.get(name)
+        return entry is not None and entry[0] == self._cacheVersions(name)
+
+    def _peekCached(self, name: str) -> Optional[numpy.ndarray]:
+        """
+        Return a cached attribute if it is up to date, without computing it
+        """
+        if self._isCached(name):
+            return self._cache[name][1]
+        return None
+
+    def _getCached(self, name: str, compute: Callable) -> Optional[numpy.ndarray]:
+        if not self._isCached(name):
+            # nothing to compute on an empty mesh
+            for d in self._CACHE_DEPENDENCIES[name]:
+                if numpy.ndim(getattr(self, d)) != 2:
+                    return None
+            compute()
+        self._ownedCache.discard(name)
+        return self._peekCached(name)
+
+    def _setCached(self, name: str, value: Optional[numpy.ndarray]) -> None:
+        self._ownedCache.discard(name)
+        if value is None:
+            self._cache.pop(name, None)
+        else:
+            self._cache[name] = (self._cacheVersions(name), value)
+
+    def load(self, filename: str, attributes: Optional[List[str]] = None, mmap: bool = False) -> None:
+        """
+        Load a mesh saved by save, or a legacy shelve file.
+
+        :param filename: input filename
+        :param attributes: names of the attributes to load, any of
+            'vertices', 'faces', 'mean_curvature', 'gaussian_curvature',
+            'k1', 'k2', 'E', 'data'. All are loaded if None. Only the
+            requested arrays are read from mesh container files.
+        :param mmap: memory-map the arrays of a mesh container file instead
+            of reading them. The arrays are read-only numpy.memmap
+            instances, so processes opening the same file share its pages.
+            Arrays that do not match the compact setting of this mesh are
+            converted in memory.
+        """
+        s = _load_simple_mesh(filename, attributes, mmap)
+        self.__init__(*s, compact=self.compact, copy=not mmap)
 
     def save(self, filename: str) -> None:
-        s = shelve.open(filename, protocol=2)
-        s['vertices'] = self.v
-        s['faces'] = self.f
-        s['mean_curvature'] = self.H
-        s['gaussian_curvature'] = self.K
-        s['k1'] = self.k1
-        s['k2'] = self.k2
-        s['E'] = self.E
-        try:
-            s['data'] = self.data
-        except AttributeError:
-            pass
-
-        s.close()
-        return
+        """
+        Save the mesh to a single-file binary container, see meshfile.
+        """
+        meshfile.save_simple_mesh(self, filename)
 
     def exportINP(self, filename: str, name: Optional[str] = None, preamble: Optional[str] = None) -> None:
         elemType = 'R3D3'
@@ -201,32 +614,27 @@ class SimpleMesh(object):
         return mlab.triangular_mesh(self.v[:, 0], self.v[:, 1], self.v[:, 2], self.f, scalars=labels, figure=figure,
                                     vmax=labels.max(), vmin=labels.min())
 
-    def setVerticesNeighbourhoods(self, r: int) -> None:
+    def setVerticesNeighbourhoods(self, r: int, progress: Optional[ProgressCallback] = None) -> None:
         """ gets the neighbourhood vertices and faces up to radius r for
         each vertex V. r is the number of vertices away from V.
 
-        Populates the attributes self.neighbourFaces and self.neighbourVertices that are lists that hold the sets of
-        faces and vertices in the neighbourhood of each face or vertex, respectively, excluding the face or vertex
-        itself.
+        Populates the attributes self.neighbourFaces and self.neighbourVertices that are CSRAdjacency instances
+        that hold the faces and vertices in the neighbourhood of each vertex, excluding the vertex itself.
+        Neighbourhoods of all vertices are computed at once by topology.k_ring_neighbourhoods.
+
+        :param progress: progress callback, see gias3.mesh.progress. Defaults
+            to the callback set by progress.set_progress_callback.
         """
 
         log.debug('finding neighbourhoods of size {}'.format(r))
-        self.neighbourhoodSize = r
-        self.neighbourFaces = []
-        self.neighbourVertices = []
-
-        if not self.has1Ring:
-            self.set1Ring()
-        get_neighbour = self.makeNeighbourhoodGetter(r)
-
-        for vi, V in enumerate(self.v):
-            sys.stdout.write('\r' + str(vi))
-            sys.stdout.flush()
-            neighbour_vertices, neighbour_faces = get_neighbour(vi)
-            self.neighbourFaces.append(list(neighbour_faces))
-            self.neighbourVertices.append(list(neighbour_vertices))
-
-        sys.stdout.write('\n')
+        with ProgressReporter('neighbourhoods', self._nVertices(), progress) as reporter:
+            if not self.has1Ring:
+                self.set1Ring()
+
+            self.neighbourhoodSize = r
+            self.neighbourVertices, self.neighbourFaces = self.topology.neighbourhoods(r, update=reporter.update)
+            # cached neighbourhoods are returned without any updates
+            reporter.update(reporter.total - reporter.done)
         self.hasNeighbourhoods = 1
         return
 
@@ -234,217 +642,530 @@ class SimpleMesh(object):
         """
         for each vertex, get the set of its neighbouring vertices
         and faces.
+
+        faces1Ring and vertices1Ring are CSRAdjacency instances backed by
+        the arrays of self.topology. Indexing either with a vertex index
+        returns an array of face or vertex indices.
         """
         log.debug('setting 1-ring for vertices')
-        self.faces1Ring = {}
-        self.vertices1Ring = {}
-        for fi, f in enumerate(self.f):
-            for v in f:
-                try:
-                    self.faces1Ring[v].add(fi)
-                except KeyError:
-                    self.faces1Ring[v] = {fi}
-
-                try:
-                    self.vertices1Ring[v] = self.vertices1Ring[v].union(f)
-                except KeyError:
-                    self.vertices1Ring[v] = set(f)
-
-        for vi, f in list(self.vertices1Ring.items()):
-            f.remove(vi)
+        self.topology = topology.MeshTopology(self.f, self._nVertices())
+        self.faces1Ring = self.topology.vertex_faces
+        self.vertices1Ring = self.topology.vertex_vertices
+        self.has1Ring = True
 
+    def setTopology(
+            self,
+            mesh_topology: topology.MeshTopology,
+            mesh_operators: Optional[operators.MeshOperators] = None) -> None:
+        """
+        Use an existing MeshTopology, and optionally MeshOperators, of the
+        same faces, e.g. from a mesh with the same faces and different
+        vertex coordinates. Their arrays are read-only so they can be
+        shared between meshes.
+        """
+        self.topology = mesh_topology
+        self.faces1Ring = mesh_topology.vertex_faces
+        self.vertices1Ring = mesh_topology.vertex_vertices
         self.has1Ring = True
+        if mesh_operators is not None:
+            self._meshOperators = mesh_operators
 
-    def set1RingFaces(self) -> None:
+    @property
+    def meshOperators(self) -> operators.MeshOperators:
         """
-        Create a dict of the adjacent faces of every face in sm
+        Sparsity patterns of the mesh operators, built on first access and
+        kept until f changes. The operators themselves are the
+        uniformLaplacian, cotangentLaplacian, lumpedMassMatrix, massMatrix
+        and gradientOperator attributes, which are refilled from these
+        patterns when v changes.
         """
+        if self._meshOperators is None:
+            self._meshOperators = operators.MeshOperators(self.f, self._nVertices())
+        return self._meshOperators
+
+    @property
+    def faceBVH(self) -> bvh.FaceBVH:
+        """
+        Bounding volume hierarchy over the faces, built on first access
+        and kept until f changes. It is refitted to the current vertex
+        coordinates when v has changed since the last access. Call
+        faceBVH.build(self.v) to rebuild it after large deformations.
+        """
+        if self._faceBVH is None:
+            self._faceBVH = bvh.FaceBVH(self.v, self.f)
+        elif self._faceBVHVersion != self._vVersion:
+            self._faceBVH.refit(self.v)
+        self._faceBVHVersion = self._vVersion
+        return self._faceBVH
+
+    def _calcUniformLaplacian(self) -> None:
+        self.uniformLaplacian = self.meshOperators.uniform_laplacian()
+
+    def _calcCotangentLaplacian(self) -> None:
+        self.cotangentLaplacian = self.meshOperators.cotangent_laplacian(self.v)
+
+    def _calcLumpedMassMatrix(self) -> None:
+        self.lumpedMassMatrix = self.meshOperators.mass_matrix(self.v, lumped=True)
+
+    def _calcMassMatrix(self) -> None:
+        self.massMatrix = self.meshOperators.mass_matrix(self.v, lumped=False)
+
+    def _calcGradientOperator(self) -> None:
+        self.gradientOperator = self.meshOperators.gradient(self.v)
+
+    def _calcPseudoNormals(self) -> None:
         if not self.has1Ring:
             self.set1Ring()
+        self.pseudoNormals = signeddistance.PseudoNormals(self.v, self.f, self.topology)
 
-        log.debug('setting 1-ring for faces')
+    def _calcTopologyFingerprint(self) -> None:
+        self.topologyFingerprint = fingerprint.topology_fingerprint(self.f)
 
-        faces_1ring_faces = {}
-        # share_edge_sets = [None, None, None]
-        for fi, f in enumerate(self.f):
-            # find 3 adj faces that share a side with f
-            shared_edge_set_0 = set(self.faces1Ring[f[0]]).intersection(set(self.faces1Ring[f[1]])).difference([fi])
-            shared_edge_set_1 = set(self.faces1Ring[f[0]]).intersection(set(self.faces1Ring[f[2]])).difference([fi])
-            shared_edge_set_2 = set(self.faces1Ring[f[1]]).intersection(set(self.faces1Ring[f[2]])).difference([fi])
-            faces_1ring_faces[fi] = shared_edge_set_0.union(shared_edge_set_1).union(shared_edge_set_2)
+    def _calcGeometryFingerprint(self) -> None:
+        self.geometryFingerprint = fingerprint.geometry_fingerprint(self.v)
 
-        self.faces1RingFaces = faces_1ring_faces
+    def fingerprint(self, tol: Optional[float] = None) -> str:
+        """
+        Hex digest of the vertex coordinates and faces, stable across runs,
+        for keying caches of data derived from the whole mesh. Use
+        topologyFingerprint for data that depends on f only.
 
-    def _getAdjacent(
-            self,
-            vi: int,
-            depth: int,
-            vertex_list: Set[int],
-            face_list: Set[int]) -> Tuple[Set[int], Set[int]]:
-        """ recursive gets the adjacent faces and vertices to vertex V.
-        uses sets instead of lists
-        """
-        if self.faces1Ring.get(vi) is None:
-            # vertex vi is unconnected or does not exist
-            log.info('vertex %d is unconnected or does not exist in mesh', vi)
+        :param tol: if given, coordinates are rounded to multiples of tol
+            before hashing, see fingerprint.geometry_fingerprint. Only the
+            exact fingerprint is cached.
+        """
+        if tol is None:
+            geometry = self.geometryFingerprint
         else:
-            new_vertices = set()
-            # add adjacent faces of current vertex to faceList
-            for fid in self.faces1Ring[vi]:
-                face_list.add(fid)
-                # add adjacent vertices to vertexList
-                for vid in self.f[fid]:
-                    if vid not in vertex_list:
-                        new_vertices.add(vid)
+            geometry = fingerprint.geometry_fingerprint(self.v, tol)
+        return fingerprint.combine_fingerprints(self.topologyFingerprint, geometry)
+
+    def _calcWindingTree(self) -> None:
+        self.windingTree = winding.WindingTree(self.faceBVH)
+
+    def _calcGeodesicSolver(self) -> None:
+        if not self.has1Ring:
+            self.set1Ring()
+        self.geodesicSolver = geodesic.HeatGeodesicSolver(
+            self.v, self.f, self._nVertices(), self.meshOperators, self.topology
+        )
 
-            vertex_list = vertex_list.union(new_vertices)
+    def set1RingFaces(self) -> None:
+        """
+        Create a CSRAdjacency of the adjacent faces of every face in sm
+        """
+        if not self.has1Ring:
+            self.set1Ring()
 
-            # recurse for new vertices
-            if depth > 1:
-                for vid in new_vertices:
-                    vertex_list, face_list = self._getAdjacent(vid, depth - 1, vertex_list, face_list)
+        log.debug('setting 1-ring for faces')
+        self.faces1RingFaces = self.topology.face_faces
+        self.has1RingFaces = True
 
-        return vertex_list, face_list
+    def _nVertices(self) -> int:
+        """
+        Number of vertices, including any unreferenced by faces
+        """
+        n = 0
+        if self.v.ndim == 2:
+            n = self.v.shape[0]
+        if self.f.ndim == 2 and self.f.size:
+            n = max(n, int(self.f.max()) + 1)
+        return n
 
     def makeNeighbourhoodGetter(self, n_ring: int) -> Callable:
+        """
+        Returns a function that given a vertex index, returns the sets of
+        vertices and faces in its n_ring neighbourhood, excluding the vertex
+        itself.
+        """
 
         if not self.has1Ring:
             self.set1Ring()
 
         def get_neighbour(v_i):
-            vertex_list = {v_i}
-            face_list = set()
-            neighbour_vertices, neighbour_faces = self._getAdjacent(v_i, n_ring, vertex_list, face_list)
-            # first element of vertexList is the current vertex - remove
-            neighbour_vertices.remove(v_i)
-            return neighbour_vertices, neighbour_faces
+            if len(self.faces1Ring.get(v_i, ())) == 0:
+                # vertex v_i is unconnected or does not exist
+                log.info('vertex %d is unconnected or does not exist in mesh', v_i)
+                return set(), set()
+
+            visited = {v_i}
+            front = [v_i]
+            neighbour_faces = set()
+            for _ in range(n_ring):
+                # faces of vertices up to n_ring-1 edges away
+                for vid in front:
+                    neighbour_faces.update(self.faces1Ring[vid].tolist())
+                new_vertices = set()
+                for vid in front:
+                    new_vertices.update(self.vertices1Ring[vid].tolist())
+                front = new_vertices.difference(visited)
+                visited.update(front)
+
+            visited.remove(v_i)
+            return visited, neighbour_faces
 
         return get_neighbour
 
     def calcFaceProperties(self) -> None:
+        """
+        Recalculate face normals, areas, and barycenters.
+        """
+        self._calcFaceProperties(overwrite=True)
 
-        face_vertices = numpy.array([self.v[F] for F in self.f])
+    def _calcFaceProperties(self, overwrite: bool = False) -> None:
+        """
+        Calculate face normals, areas, and barycenters in one pass. Unless
+        overwrite is True, up-to-date cached values are kept, e.g. face
+        normals carried through transformAffine with their orientation.
+        """
+        face_vertices = self.v[self.f]
 
         v1 = face_vertices[:, 1, :] - face_vertices[:, 0, :]
         v2 = face_vertices[:, 2, :] - face_vertices[:, 0, :]
         v1v2 = numpy.cross(v1, v2)
-        self.faceNormals = normalise2(v1v2)
-        self.hasFaceNormals = True
-        self.faceAreas = 0.5 * mag2(v1v2)
-        self.faceBarycenters = (face_vertices[:, 0, :] + (face_vertices[:, 1, :] + face_vertices[:, 2, :])) / 3.0
+        if overwrite or not self._isCached('faceNormals'):
+            self.faceNormals = normalise2(v1v2)
+        if overwrite or not self._isCached('faceAreas'):
+            self.faceAreas = 0.5 * mag2(v1v2)
+        if overwrite or not self._isCached('faceBarycenters'):
+            self.faceBarycenters = (face_vertices[:, 0, :] + (face_vertices[:, 1, :] + face_vertices[:, 2, :])) / 3.0
+
+    def calcCurvature(self) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """
+        Calculate the mean, Gaussian and principal curvatures and the
+        principal directions of each vertex, see curvature.calc_curvature.
+        Results are stored in H, K, k1, k2 and E. Curvature is positive
+        where the surface bends away from the face normals.
+        """
+        log.debug('calculating curvature...')
+        if not self.has1Ring:
+            self.set1Ring()
+
+        h, k, k1, k2, e = curvature.calc_curvature(self.v, self.f, self.topology, self.meshOperators)
+        if self.compact:
+            h, k, k1, k2, e = [_compact_array(x) for x in (h, k, k1, k2, e)]
+        self.H = h
+        self.K = k
+        self.k1 = k1
+        self.k2 = k2
+        self.E = e
+        return self.H, self.K, self.k1, self.k2, self.E
+
+    def closestPoints(
+            self,
+            points: numpy.ndarray,
+            n_workers: Optional[int] = None) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """
+        Closest point on the surface to each of an (k, 3) array of points,
+        accelerated by faceBVH, see surfacequery.closest_points.
+
+        :param points: (k, 3) query points
+        :param n_workers: number of threads, defaults to the number of CPUs
+        :return: face index (k,), barycentric coordinates (k, 3) of the face
+            vertices, closest points (k, 3) and distances (k,)
+        """
+        return surfacequery.closest_points(self.v, self.f, points, self.faceBVH, n_workers=n_workers)
+
+    def interpolateVertexField(
+            self,
+            field: Union[str, numpy.ndarray],
+            faces: numpy.ndarray,
+            bary: numpy.ndarray) -> numpy.ndarray:
+        """
+        Interpolate a per-vertex field at surface points given by face
+        indices and barycentric coordinates, e.g. from closestPoints.
+
+        :param field: (n, ...) values at each vertex, or the name of a
+            per-vertex attribute such as 'H', 'K', 'k1', 'k2', 'data' or
+            'vertexNormals'
+        :param faces: (k,) face index of each point
+        :param bary: (k, 3) barycentric coordinates of each point
+        :return: (k, ...) interpolated values
+        """
+        if isinstance(field, str):
+            field = getattr(self, field)
+        return surfacequery.interpolate_vertex_field(self.f, field, faces, bary)
 
-    def calcVertexNormals(self, sigma: float, nsize: int = 1, normalsout: bool = True) -> None:
+    def calcSurfaceDistances(
+            self,
+            reference: Union['SimpleMesh', Tuple[numpy.ndarray, numpy.ndarray]],
+            hausdorff_only: bool = False,
+            n_workers: Optional[int] = None) -> Union[float, meshmetrics.MeshDistances]:
+        """
+        Distance metrics between this mesh and a reference mesh, using the
+        cached faceBVH of both, see meshmetrics.mesh_distances.
+
+        :param reference: SimpleMesh or (v, f) tuple
+        :param hausdorff_only: return only the symmetric Hausdorff distance,
+            computed with early exit
+        :param n_workers: number of threads, defaults to the number of CPUs
+        :return: Hausdorff distance if hausdorff_only, otherwise
+            meshmetrics.MeshDistances with the Hausdorff distance, ASSD, RMS
+            and the per-vertex distance maps of both meshes
+        """
+        if hausdorff_only:
+            return meshmetrics.hausdorff_distance(self, reference, n_workers=n_workers)
+        return meshmetrics.mesh_distances(self, reference, n_workers=n_workers)
+
+    def containsPoints(
+            self,
+            points: numpy.ndarray,
+            method: str = 'winding',
+            return_winding: bool = False,
+            n_workers: Optional[int] = None) -> Union[numpy.ndarray, Tuple[numpy.ndarray, numpy.ndarray]]:
+        """
+        Whether each point is inside the mesh, see winding.contains_points.
+
+        :param points: (k, 3) points
+        :param method: 'winding' for generalised winding numbers, which need
+            outward facing normals and tolerate small holes, or 'parity'
+            for ray crossing parity, which needs a watertight mesh
+        :param return_winding: also return the winding number of each point
+        :param n_workers: number of threads, defaults to the number of CPUs
+        :return: boolean array, and the winding numbers if return_winding
+        """
+        winding_tree = self.windingTree if method == 'winding' else None
+        return winding.contains_points(
+            self.faceBVH, points, method, winding_tree, return_winding=return_winding, n_workers=n_workers
+        )
+
+    def calcSignedDistance(
+            self,
+            points: numpy.ndarray,
+            sign: str = 'pseudonormal',
+            band: Optional[float] = None,
+            n_workers: Optional[int] = None) -> numpy.ndarray:
+        """
+        Signed distance from the surface of a closed mesh to each point,
+        negative inside, see signeddistance.signed_distance.
+
+        :param points: (k, 3) points
+        :param sign: 'pseudonormal', which needs outward facing normals, or
+            'parity'
+        :param band: if given, clip distances to [-band, band] and skip the
+            exact distance of points farther than band from the surface
+        :param n_workers: number of threads, defaults to the number of CPUs
+        """
+        pseudo_normals = self.pseudoNormals if sign == 'pseudonormal' else None
+        return signeddistance.signed_distance(
+            self.v, self.f, points, self.faceBVH, pseudo_normals, sign=sign, band=band, n_workers=n_workers
+        )
+
+    def calcSignedDistanceGrid(
+            self,
+            shape: Tuple[int, int, int],
+            origin: Tuple[float, float, float] = (0.0, 0.0, 0.0),
+            spacing: Tuple[float, float, float] = (1.0, 1.0, 1.0),
+            band: Optional[float] = None,
+            sign: str = 'parity',
+            n_workers: Optional[int] = None) -> numpy.ndarray:
+        """
+        Signed distance field of a closed mesh on a regular grid, where grid
+        point (i, j, k) is at origin + (i, j, k) * spacing, see
+        signeddistance.signed_distance_grid. Use a band for large grids.
+
+        :param shape: (nx, ny, nz) grid shape
+        :param origin: coordinates of grid point (0, 0, 0)
+        :param spacing: grid spacing along each axis
+        :param band: narrow band half width, in the units of v
+        :param sign: 'parity' or 'pseudonormal'
+        :param n_workers: number of threads, defaults to the number of CPUs
+        :return: float32 array of the grid shape, negative inside
+        """
+        pseudo_normals = self.pseudoNormals if sign == 'pseudonormal' else None
+        return signeddistance.signed_distance_grid(
+            self.v, self.f, shape, origin, spacing, band=band, face_bvh=self.faceBVH,
+            pseudo_normals=pseudo_normals, sign=sign, n_workers=n_workers
+        )
+
+    def calcGeodesicDistances(
+            self,
+            sources: Union[int, List[int], numpy.ndarray],
+            method: str = 'heat',
+            combined: bool = False) -> numpy.ndarray:
+        """
+        Geodesic distances over the surface from one or more source
+        vertices, see geodesic.
+
+        :param sources: index or indices of the source vertices
+        :param method: 'heat' for the heat method, which approximates
+            smooth geodesics across faces, or 'dijkstra' for exact shortest
+            paths along edges. The heat method solver is factorised on first
+            use and kept in geodesicSolver until v or f change.
+        :param combined: if True, return the distance to the nearest source.
+            Otherwise return the distances from each source.
+        :return: (n,) distances for a single source index or combined
+            sources, otherwise (k, n) distances from each of k sources.
+            Unreachable vertices have distance inf.
+        """
+        if method == 'heat':
+            return self.geodesicSolver.distances(sources, combined=combined)
+        elif method == 'dijkstra':
+            if not self.has1Ring:
+                self.set1Ring()
+            return geodesic.dijkstra_distances(self.v, self.topology.edges, sources, combined=combined)
+        else:
+            raise ValueError('unknown geodesic method {}'.format(method))
+
+    def calcVertexNormals(
+            self,
+            sigma: float,
+            nsize: int = 1,
+            normalsout: bool = True,
+            vectorised: bool = True,
+            progress: Optional[ProgressCallback] = None) -> None:
         """ calculate the normal at each vertex using normal voting. Considers
         all neighbouring vertices up to nsize edges away.
+
+        If vectorised is True, the votes and covariance tensors of all
+        vertices are computed at once and eigendecomposed in a single
+        batched call. Otherwise vertices are processed one at a time.
+
+        :param progress: progress callback, see gias3.mesh.progress. Defaults
+            to the callback set by progress.set_progress_callback.
         """
         log.debug('calculating normals...')
 
-        self.calcFaceProperties()
         if not self.has1Ring:
             self.set1Ring()
         if nsize == 1:
             all_neigh_faces = self.faces1Ring
         else:
-            self.setVerticesNeighbourhoods(nsize)
+            self.setVerticesNeighbourhoods(nsize, progress=progress)
             all_neigh_faces = self.neighbourFaces
 
+        reporter = ProgressReporter('vertex normals', self._nVertices(), progress)
+
         f_bary = self.faceBarycenters
         f_normal = self.faceNormals
         f_area = self.faceAreas
         a_max = self.faceAreas.max()
 
-        v_mat = numpy.zeros((3, 3), dtype=float)
-        self.vertexNormals = numpy.zeros((self.v.shape[0], 3), dtype=float)
-
-        # for each vertex get neighbourhood faces 
-        for vi, v in enumerate(self.v):
-            # for each face i calculate normal vote Ni and weighting
-            neigh_faces = all_neigh_faces[vi]
-            n_faces = len(neigh_faces)
-            if not n_faces:
-                raise RuntimeWarning('no faces: vertex').with_traceback(v.ID)
-
-            f_bary_v = numpy.array([f_bary[f] for f in neigh_faces])
-            f_normal_v = numpy.array([f_normal[i] for i in neigh_faces])
-            f_area_v = numpy.array([f_area[i] for i in neigh_faces])
-
-            # calc votes
-            vc = normalise2(f_bary_v - v)
-            cos_theta = f_normal_v[:, 0] * vc[:, 0] + f_normal_v[:, 1] * vc[:, 1] + f_normal_v[:, 2] * vc[:, 2]
-            normal_ind = f_normal_v - 2.0 * vc * cos_theta[:, numpy.newaxis]
-            normal_ind = numpy.where(numpy.isfinite(normal_ind), normal_ind, 0.0)
-
-            # calc vote weights
-            g_v = mag2(f_bary_v - v)
-            w_i = (f_area_v / a_max) * numpy.exp(-g_v / sigma)
-
-            # form covariance matrix V, and do eigendecomp 
-            v_mat[:, :] = 0.0
-            w_i = w_i / w_i.sum()  # normalise weights to sum to 1
-            for i, n in enumerate(normal_ind):
-                v_mat += w_i[i] * numpy.kron(n, n[:, numpy.newaxis])
-
-            try:
-                l, e = eigh(v_mat)
-            except ValueError:
-                log.debug('WARNING: singular V for vertex', vi)
-                e = numpy.eye(3)
-            else:
-                l, e = _sortEigDesc(l, e)
-
-            self.vertexNormals[vi, :] = e[:, 0]
+        if vectorised:
+            self.vertexNormals = _vote_vertex_normals(
+                self.v, all_neigh_faces, f_bary, f_normal, f_area, sigma, update=reporter.update
+            )
+        else:
+            v_mat = numpy.zeros((3, 3), dtype=float)
+            self.vertexNormals = numpy.zeros((self.v.shape[0], 3), dtype=self.v.dtype)
+
+            # for each vertex get neighbourhood faces 
+            for vi, v in enumerate(self.v):
+                # for each face i calculate normal vote Ni and weighting
+                neigh_faces = all_neigh_faces[vi]
+                n_faces = len(neigh_faces)
+                if not n_faces:
+                    raise RuntimeWarning('no faces: vertex {}'.format(vi))
+
+                f_bary_v = numpy.array([f_bary[f] for f in neigh_faces])
+                f_normal_v = numpy.array([f_normal[i] for i in neigh_faces])
+                f_area_v = numpy.array([f_area[i] for i in neigh_faces])
+
+                # calc votes
+                vc = normalise2(f_bary_v - v)
+                cos_theta = f_normal_v[:, 0] * vc[:, 0] + f_normal_v[:, 1] * vc[:, 1] + f_normal_v[:, 2] * vc[:, 2]
+                normal_ind = f_normal_v - 2.0 * vc * cos_theta[:, numpy.newaxis]
+                normal_ind = numpy.where(numpy.isfinite(normal_ind), normal_ind, 0.0)
+
+                # calc vote weights
+                g_v = mag2(f_bary_v - v)
+                w_i = (f_area_v / a_max) * numpy.exp(-g_v / sigma)
+
+                # form covariance matrix V, and do eigendecomp 
+                v_mat[:, :] = 0.0
+                w_i = w_i / w_i.sum()  # normalise weights to sum to 1
+                for i, n in enumerate(normal_ind):
+                    v_mat += w_i[i] * numpy.kron(n, n[:, numpy.newaxis])
 
+                try:
+                    l, e = eigh(v_mat)
+                except ValueError:
+                    log.debug('WARNING: singular V for vertex', vi)
+                    e = numpy.eye(3)
+                else:
+                    l, e = _sortEigDesc(l, e)
+
+                self.vertexNormals[vi, :] = e[:, 0]
+                reporter.update()
+
+        reporter.finish()
         self.filterVertexNormals()
         self.hasVertexNormals = 1
+        self._vertexNormalVoting = (sigma, nsize)
 
-        # make sure normals point out
+        # make sure normals point out, separately on each connected
+        # component since the forest orients each component on its own
         if normalsout:
-            if not normals_is_out(self.v, self.vertexNormals):
-                self.vertexNormals *= -1.0
+            labels = self.topology.vertex_components
+            n_vertices = len(labels)
+            is_out = components_normals_are_out(self.v[:n_vertices], self.vertexNormals[:n_vertices], labels)
+            self.vertexNormals[:n_vertices] *= numpy.where(is_out, 1.0, -1.0)[labels][:, numpy.newaxis]
 
-            if not normals_is_out(self.faceBarycenters, self.faceNormals):
-                self.faceNormals *= -1.0
+            face_labels = labels[self.f[:, 0]]
+            is_out = components_normals_are_out(self.faceBarycenters, self.faceNormals, face_labels)
+            if not is_out.all():
+                sign = numpy.where(is_out, 1.0, -1.0).astype(self.faceNormals.dtype)
+                self.faceNormals = self.faceNormals * sign[face_labels][:, numpy.newaxis]
 
         return
 
     def filterVertexNormals(self) -> None:
         """
         Orient vertex normals to be consistent
+
+        Normals are propagated along a breadth-first spanning forest of the
+        vertex graph, seeded at the lowest index vertex of each connected
+        component. Each child normal is flipped if it points away from its
+        parent's oriented normal. All vertices at the same depth are
+        processed in one batch.
         """
 
         log.debug('filtering normals...')
-        aligned = numpy.zeros(len(self.v), dtype=bool)
-        front = {self.f.min()}
-        aligned[self.f.min()] = True
-
-        while front:
-            v = front.pop()
-            # get vertices immediately ahead of the front
-            nvs = numpy.array([vid for vid in self.vertices1Ring[v] if not aligned[vid]], dtype=int)
-            # dot product normals to find inverted neighbours
-            d = self.vertexNormals[nvs].dot(self.vertexNormals[v])
-            self.vertexNormals[nvs[d < 0.0]] *= -1.0
-            aligned[nvs] = True
-            front = front.union(nvs)
+        if not self.has1Ring:
+            self.set1Ring()
 
+        seeds, depth, parents = topology.breadth_first_forest(self.vertices1Ring)
+        n_vertices = len(parents)
+        is_child = parents >= 0
+
+        # orientation of each child relative to its parent
+        flip = numpy.ones(n_vertices, dtype=self.vertexNormals.dtype)
+        children = numpy.flatnonzero(is_child)
+        d = (self.vertexNormals[children] * self.vertexNormals[parents[children]]).sum(1)
+        flip[children[d < 0.0]] = -1.0
+
+        # accumulate flips down the trees, one depth level at a time
+        sign = numpy.ones(n_vertices, dtype=self.vertexNormals.dtype)
+        children = children[numpy.argsort(depth[children], kind='stable')]
+        level_ends = numpy.cumsum(numpy.bincount(depth[children]))
+        level_start = 0
+        for level_end in level_ends:
+            level = children[level_start:level_end]
+            sign[level] = sign[parents[level]] * flip[level]
+            level_start = level_end
+
+        self.vertexNormals[:n_vertices] *= sign[:, numpy.newaxis]
         return
 
     def calcBoundingBox(self) -> numpy.ndarray:
         self.boundingBox = numpy.array([self.v.min(0), self.v.max(0)]).T
         return self.boundingBox
 
+    def calcSurfaceArea(self) -> float:
+        self.surfaceArea = float(self.faceAreas.sum())
+        return self.surfaceArea
+
     def calcCoM(self) -> numpy.ndarray:
 
         a = self.faceAreas
         x = self.faceBarycenters
-        self.CoM = (x * a[:, numpy.newaxis]).sum(0) / sum(a)
+        self.CoM = (x * a[:, numpy.newaxis]).sum(0) / self.surfaceArea
         return self.CoM
 
     def calcNormCoM(self) -> numpy.ndarray:
 
         box = self.boundingBox
         com = self.CoM
-        x = self.faceBarycenters
         self.normCoM = numpy.array([(com[0] - box[0, 0]) / (box[0, 1] - box[0, 0]),
                                     (com[1] - box[1, 0]) / (box[1, 1] - box[1, 0]),
                                     (com[2] - box[2, 0]) / (box[2, 1] - box[2, 0]),
@@ -479,6 +1200,26 @@ class SimpleMesh(object):
 
         return self.principalMoments, self.principalAxes
 
+    def calcSolidMassProperties(self) -> Tuple[float, numpy.ndarray, numpy.ndarray]:
+        """
+        Calculate the volume, centroid and second moment tensor of the solid
+        enclosed by the mesh, which must be closed with consistently
+        oriented faces. See massproperties.mass_properties. Unlike CoM and
+        inertial_mat, these are properties of the solid, not the surface.
+        """
+        volume, centroid, second_moment = massproperties.mass_properties(self.v, self.f)
+        self.volume = volume
+        self.solidCentroid = centroid
+        self.solidSecondMoment = second_moment
+        return volume, centroid, second_moment
+
+    def calcSolidInertia(self, density: float = 1.0) -> numpy.ndarray:
+        """
+        Inertia tensor of the solid enclosed by the mesh about its centroid,
+        for a uniform density
+        """
+        return massproperties.inertia_tensor(self.solidSecondMoment, density)
+
     def alignPAxes(self) -> numpy.ndarray:
         """ rotate mesh to align pAxes with cartesian axes
         """
@@ -490,6 +1231,80 @@ class SimpleMesh(object):
         self.transformAffine(numpy.vstack((mat, numpy.ones(4))))
         return mat
 
+    def smooth(
+            self,
+            method: str = 'taubin',
+            iterations: int = 10,
+            weights: str = 'uniform',
+            lock_boundary: bool = True,
+            feature_angle: Optional[float] = None,
+            locked: Optional[numpy.ndarray] = None,
+            relaxation: float = 0.5,
+            lam: float = smoothing.TAUBIN_LAMBDA,
+            mu: float = smoothing.TAUBIN_MU,
+            time_step: float = 1.0,
+            inplace: bool = False) -> 'SimpleMesh':
+        """
+        Smooth the mesh with sparse Laplacian operators, see the smoothing
+        module.
+
+        :param method: 'laplacian', 'taubin' or 'implicit'
+        :param iterations: number of iterations, or of time steps for
+            implicit smoothing
+        :param weights: 'uniform' or 'cotangent' Laplacian weights. For
+            implicit smoothing with cotangent weights, the lumped mass
+            matrix is used and time_step is in units of the squared mean
+            edge length.
+        :param lock_boundary: keep boundary vertices fixed
+        :param feature_angle: keep vertices on edges with a dihedral angle
+            larger than this many degrees fixed
+        :param locked: indices of further vertices to keep fixed
+        :param relaxation: step size of Laplacian smoothing
+        :param lam: positive step size of Taubin smoothing
+        :param mu: negative step size of Taubin smoothing
+        :param time_step: time step of implicit smoothing
+        :param inplace: replace the vertices of this mesh instead of
+            returning a new mesh
+        :return: the smoothed mesh. A new mesh shares the faces, topology
+            and operator patterns of this mesh.
+        """
+        if not self.has1Ring:
+            self.set1Ring()
+        mask = smoothing.locked_vertices(self.v, self.topology, lock_boundary, feature_angle, locked)
+
+        if weights == 'uniform':
+            laplacian = self.uniformLaplacian
+            mass = None
+        elif weights == 'cotangent':
+            laplacian = self.cotangentLaplacian
+            mass = self.lumpedMassMatrix
+        else:
+            raise ValueError('unknown weights {}'.format(weights))
+
+        if method == 'laplacian':
+            v = smoothing.laplacian_smooth(self.v, laplacian, iterations, relaxation, mask)
+        elif method == 'taubin':
+            v = smoothing.taubin_smooth(self.v, laplacian, iterations, lam, mu, mask)
+        elif method == 'implicit':
+            if mass is not None:
+                edges = self.topology.edges
+                edge_vectors = self.v[edges[:, 1]] - self.v[edges[:, 0]]
+                time_step = time_step * numpy.sqrt((edge_vectors * edge_vectors).sum(1)).mean() ** 2
+            v = smoothing.implicit_smooth(self.v, laplacian, mass, time_step, iterations, mask)
+        else:
+            raise ValueError('unknown smoothing method {}'.format(method))
+        v = v.astype(self.v.dtype, copy=False)
+
+        if inplace:
+            self.v = v
+            return self
+
+        mesh = SimpleMesh(v=v, f=self.f, compact=self.compact, copy=False)
+        mesh.setTopology(self.topology, self._meshOperators)
+        if self.hasNeighbourhoods:
+            mesh.setVerticesNeighbourhoods(self.neighbourhoodSize)
+        return mesh
+
     def transformAffine(self, t: numpy.ndarray) -> None:
         """ transform mesh vertices by an affine
         transformation matrix T (shape = (3,4))
@@ -497,75 +1312,76 @@ class SimpleMesh(object):
         # newV = numpy.dot( t, numpy.vstack( (self.v.T, numpy.ones(self.v.shape[0])) ) )[:3,:].T 
         # self.v = newV
 
-        self.v = transform3D.transformAffine(self.v, t)
+        face_normals = self._peekCached('faceNormals')
+        face_areas = self._peekCached('faceAreas')
+        face_barycenters = self._peekCached('faceBarycenters')
+
+        # results are cast back to the input types so that compact meshes
+        # are not upcast
+        self.v = transform3D.transformAffine(self.v, t).astype(self.v.dtype, copy=False)
         if self.vertexNormals is not None:
-            self.vertexNormals = numpy.dot(t[:3, :3], self.vertexNormals.T).T
-        if self.faceNormals is not None:
-            self.faceNormals = numpy.dot(t[:3, :3], self.faceNormals.T).T
-        if self.faceBarycenters is not None:
-            self.faceBarycenters = transform3D.transformAffine(self.faceBarycenters, t)
+            self.vertexNormals = numpy.dot(t[:3, :3], self.vertexNormals.T).T.astype(
+                self.vertexNormals.dtype, copy=False
+            )
+
+        # Carry over cached face properties. Face normals scaled by area
+        # transform exactly by the cofactor matrix of t[:3,:3], which also
+        # keeps any orientation flip applied to them.
+        if face_barycenters is not None:
+            self.faceBarycenters = transform3D.transformAffine(face_barycenters, t).astype(
+                face_barycenters.dtype, copy=False
+            )
+        det = numpy.linalg.det(t[:3, :3])
+        if face_normals is not None and face_areas is not None and det != 0.0:
+            cofactor = (det * numpy.linalg.inv(t[:3, :3]).T).astype(face_normals.dtype)
+            scaled_normals = numpy.dot(cofactor, face_normals.T).T
+            scale = mag2(scaled_normals)
+            self.faceNormals = scaled_normals / scale[:, numpy.newaxis]
+            self.faceAreas = face_areas * scale
 
     def getBoundaryVertices(self) -> Tuple[List[int], numpy.ndarray]:
         """ 
         Returns the indices and coordinates of vertices on the
-        boundary or boundaries of the mesh. Boundary vertices have 
-        and unequal number of 1-ring vertices to 1-ring faces.
+        boundary or boundaries of the mesh. Boundary vertices are
+        vertices of edges used by only one face.
         """
 
-        if self.boundaryVertexInd is not None:
-            return self.boundaryVertexInd, self.v[self.boundaryVertexInd]
-        else:
-            self.set1Ring()
-
+        if self.boundaryVertexInd is None:
             log.debug('finding boundary vertices')
-            boundaryVertexInd = []
-            for vi in range(len(self.v)):
-                try:
-                    if len(self.vertices1Ring[vi]) != len(self.faces1Ring[vi]):
-                        boundaryVertexInd.append(vi)
-                except KeyError:
-                    log.debug("WARNING: no neighbours for vertex", vi)
-                    pass
+            edges = self.getBoundaryLoops()[2]
+            self.boundaryVertexInd = numpy.unique(edges).tolist()
 
-            self.boundaryVertexInd = boundaryVertexInd
-            return self.boundaryVertexInd, self.v[self.boundaryVertexInd]
+        return self.boundaryVertexInd, self.v[self.boundaryVertexInd]
 
     def getOrderedBoundaryVertices(self) -> List[List[int]]:
         """
         Returns lists of ordered boundary vertex indices. Each list contains the 
         boundary vertices of a boundary on the mesh.
         """
+        return [loop.tolist() for loop in self.getBoundaryLoops()[0]]
+
+    def getBoundaryLoops(self) -> Tuple[List[numpy.ndarray], numpy.ndarray, numpy.ndarray]:
+        """
+        Returns a list of arrays of ordered vertex indices, one for each
+        boundary loop, an array of the length of each loop, and an (e,2)
+        array of boundary edges directed as in their faces. See
+        topology.boundary_loops.
+        """
+        if not self.has1Ring:
+            self.set1Ring()
 
-        bv = self.getBoundaryVertices()[0]
-        bv_set = set(bv)
-        boundaries = []
-        while bv_set:
-            ordered_bv = [bv_set.pop(), ]
-            search_boundary = 1
-            # starting from 1st bv, find next bv in its 1-ring
-            while search_boundary:
-                # get neighbour vertices
-                neighv = self.vertices1Ring[ordered_bv[-1]]
-                # look through each neighbour
-                search_neigh = 1
-                prev_bv = ordered_bv[-1]
-                for nvi in neighv:
-                    # if neighbour is a boundary vertex and isn't the previous one
-                    if (nvi in bv_set) and (nvi != prev_bv):
-                        ordered_bv.append(nvi)
-                        bv_set.remove(nvi)
-                        prev_bv = nvi
-                        # stop searching neighbours
-                        search_neigh = 0
-                        break
-
-                # if one wasn't found, terminate the search for this boundary
-                if search_neigh == 1:
-                    search_boundary = 0
-
-            boundaries.append(ordered_bv)
-
-        return boundaries
+        return self.topology.boundary()
+
+
+def _compact_array(x: Optional[Union[List, numpy.ndarray]], copy: bool = False) -> Optional[numpy.ndarray]:
+    """
+    Convert an optional per-vertex float attribute to compact storage
+    """
+    if x is None:
+        return None
+    if copy:
+        return numpy.array(x, dtype=COMPACT_FLOAT_DTYPE)
+    return numpy.asanyarray(x, dtype=COMPACT_FLOAT_DTYPE)
 
 
 def mag(x: numpy.ndarray) -> float:
@@ -596,6 +1412,88 @@ def _sortEigDesc(l: numpy.ndarray, e: numpy.ndarray) -> Tuple[numpy.ndarray, num
     return lSort, eSort
 
 
+def _vote_vertex_normals(
+        v: numpy.ndarray,
+        neigh_faces: topology.CSRAdjacency,
+        f_bary: numpy.ndarray,
+        f_normal: numpy.ndarray,
+        f_area: numpy.ndarray,
+        sigma: float,
+        chunk_size: int = 100000,
+        update: Optional[Callable[[int], None]] = None) -> numpy.ndarray:
+    """
+    Normal voting for all vertices at once. Every vertex-face vote and weight
+    is computed in one pass over the neighbourhood CSR arrays, the weighted
+    covariance tensors are accumulated with bincount, and the (n,3,3) stack
+    is eigendecomposed with one call to eigh. Vertices are processed in
+    blocks of chunk_size to bound memory use.
+
+    :param v: nx3 array of vertex coordinates
+    :param neigh_faces: neighbourhood faces of each vertex
+    :param f_bary: mx3 array of face barycenters
+    :param f_normal: mx3 array of face normals
+    :param f_area: array of face areas
+    :param sigma: vote weight distance decay
+    :param chunk_size: number of vertices processed per block
+    :param update: called with the number of vertices in each block once it
+        is processed
+    :return: nx3 array of unoriented vertex normals
+    """
+    n_vertices = v.shape[0]
+    counts = neigh_faces.lengths()
+    if len(counts) < n_vertices or not counts.all():
+        empty = numpy.flatnonzero(counts == 0)
+        vi = empty[0] if len(empty) else len(counts)
+        raise RuntimeWarning('no faces: vertex {}'.format(vi))
+
+    all_vi = neigh_faces.row_indices()
+    a_max = f_area.max()
+    normals = numpy.zeros((n_vertices, 3), dtype=numpy.result_type(v, f_bary, f_normal))
+    for start in range(0, n_vertices, chunk_size):
+        stop = min(start + chunk_size, n_vertices)
+        n_block = stop - start
+        lo, hi = neigh_faces.indptr[start], neigh_faces.indptr[stop]
+        vi = all_vi[lo:hi]
+        fi = neigh_faces.indices[lo:hi]
+
+        # calc votes
+        d = f_bary[fi] - v[vi]
+        g_v = mag2(d)
+        vc = d / g_v[:, numpy.newaxis]
+        f_normal_v = f_normal[fi]
+        cos_theta = (f_normal_v * vc).sum(1)
+        normal_ind = f_normal_v - 2.0 * vc * cos_theta[:, numpy.newaxis]
+        normal_ind = numpy.where(numpy.isfinite(normal_ind), normal_ind, 0.0)
+
+        # calc vote weights, normalised to sum to 1 for each vertex
+        vi = vi - start
+        w_i = (f_area[fi] / a_max) * numpy.exp(-g_v / sigma)
+        w_i = w_i / numpy.bincount(vi, weights=w_i, minlength=n_block)[vi]
+
+        # form covariance matrices V
+        v_mat = numpy.empty((n_block, 3, 3), dtype=normal_ind.dtype)
+        for j in range(3):
+            for k in range(j, 3):
+                v_mat[:, j, k] = numpy.bincount(vi, weights=w_i * normal_ind[:, j] * normal_ind[:, k],
+                                                minlength=n_block)
+                v_mat[:, k, j] = v_mat[:, j, k]
+
+        # eigendecomp, normal is the eigenvector of the largest magnitude eigenvalue
+        block = normals[start:stop]
+        valid = numpy.isfinite(v_mat).all(axis=(1, 2))
+        if not valid.all():
+            log.debug('WARNING: singular V for %d vertices', (~valid).sum())
+            block[~valid, 0] = 1.0
+
+        l, e = eigh(v_mat[valid])
+        l_max = abs(l).argmax(1)
+        block[valid] = e[numpy.arange(len(l_max)), :, l_max]
+        if update is not None:
+            update(n_block)
+
+    return normals
+
+
 def normals_is_out(x: numpy.ndarray, xn: numpy.ndarray) -> numpy.ndarray:
     """
     Given a list of vertices and their normals, determine whether each normal is pointing in or out
@@ -612,3 +1510,31 @@ def normals_is_out(x: numpy.ndarray, xn: numpy.ndarray) -> numpy.ndarray:
     v_check_point = check_point - x[c_i]
 
     return numpy.dot(v_check_point, xn[c_i]) > 0.0
+
+
+def components_normals_are_out(x: numpy.ndarray, xn: numpy.ndarray, labels: numpy.ndarray) -> numpy.ndarray:
+    """
+    normals_is_out applied separately to each group of points with the same
+    label, e.g. each connected component of a mesh
+    :param x: nx3 array of point coordinates
+    :param xn: nx3 array of point normals
+    :param labels: length n array of group labels from 0 to k-1
+    :return: a length k boolean array, True if the normals of the group are
+        pointing out. Labels without points are True.
+    """
+    if not len(labels):
+        return numpy.zeros(0, dtype=bool)
+    n_labels = int(labels.max()) + 1
+    check_points = numpy.full((n_labels, 3), -numpy.inf)
+    numpy.maximum.at(check_points, labels, x)
+    check_points *= 10.0
+
+    # find the closest point of each group to its check point
+    v_check_point = check_points[labels] - x
+    d2 = (v_check_point ** 2.0).sum(1)
+    order = numpy.lexsort((d2, labels))
+    first = order[numpy.r_[True, labels[order[1:]] != labels[order[:-1]]]]
+
+    is_out = numpy.ones(n_labels, dtype=bool)
+    is_out[labels[first]] = (v_check_point[first] * xn[first]).sum(1) > 0.0
+    return is_out
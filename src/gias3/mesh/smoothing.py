@@ -0,0 +1,190 @@
+"""
+FILE: smoothing.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Sparse Laplacian, Taubin and implicit mesh smoothing
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+The smoothing functions take an (n, k) array of values per vertex, usually
+the (n, 3) vertex coordinates, and a Laplacian from
+operators.MeshOperators. Several meshes with the same faces can be
+smoothed together with the uniform Laplacian by stacking their coordinates
+into the columns of one (n, 3N) array. Locked vertices keep their values.
+"""
+import logging
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import linalg as splinalg
+
+from gias3.mesh import topology
+
+log = logging.getLogger(__name__)
+
+# Taubin lambda|mu smoothing defaults, giving a pass-band frequency of
+# about 0.1
+TAUBIN_LAMBDA = 0.5
+TAUBIN_MU = -0.53
+
+
+def locked_vertices(
+        v: np.ndarray,
+        mesh_topology: topology.MeshTopology,
+        lock_boundary: bool = True,
+        feature_angle: Optional[float] = None,
+        locked: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Boolean mask of the vertices to keep fixed during smoothing.
+
+    :param v: (n, 3) vertex coordinates
+    :param mesh_topology: MeshTopology of the mesh faces
+    :param lock_boundary: lock vertices on boundary edges
+    :param feature_angle: lock vertices of edges whose adjacent face normals
+        differ by more than this angle in degrees
+    :param locked: indices or boolean mask of further vertices to lock
+    """
+    mask = np.zeros(len(v), dtype=bool)
+    if locked is not None:
+        mask[np.asarray(locked)] = True
+
+    edges = mesh_topology.edges
+    if lock_boundary or feature_angle is not None:
+        edge_faces = mesh_topology.edge_faces
+        interior = edge_faces[:, 1] >= 0
+        if lock_boundary:
+            mask[edges[~interior].ravel()] = True
+        if feature_angle is not None:
+            f = mesh_topology.f
+            fv = np.asarray(v, dtype=float)[f]
+            normals = np.cross(fv[:, 1] - fv[:, 0], fv[:, 2] - fv[:, 0])
+            normals /= np.maximum(np.sqrt((normals * normals).sum(1)), np.finfo(float).tiny)[:, np.newaxis]
+            a = normals[edge_faces[interior, 0]]
+            b = normals[edge_faces[interior, 1]]
+            feature = (a * b).sum(1) < np.cos(np.radians(feature_angle))
+            mask[edges[interior][feature].ravel()] = True
+
+    return mask
+
+
+def normalised_laplacian(laplacian: sparse.spmatrix, locked: Optional[np.ndarray] = None) -> sparse.csr_matrix:
+    """
+    Laplacian with each row divided by minus its diagonal, so that
+    (P x)[i] is the weighted average of the neighbours of i minus x[i].
+    Rows of locked vertices and isolated vertices are zero.
+
+    :param laplacian: (n, n) Laplacian with non-positive diagonal
+    :param locked: boolean mask of locked vertices
+    """
+    d = -laplacian.diagonal()
+    scale = np.zeros_like(d)
+    np.divide(1.0, d, out=scale, where=d > 0)
+    if locked is not None:
+        scale[locked] = 0.0
+    return (sparse.diags(scale) @ laplacian).tocsr()
+
+
+def laplacian_smooth(
+        x: np.ndarray,
+        laplacian: sparse.spmatrix,
+        iterations: int = 10,
+        relaxation: float = 0.5,
+        locked: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Explicit Laplacian smoothing, x <- x + relaxation * P x per iteration,
+    where P is the normalised Laplacian.
+
+    :param x: (n, k) values per vertex
+    :param laplacian: (n, n) uniform or cotangent Laplacian
+    :param iterations: number of iterations
+    :param relaxation: step size between 0 and 1
+    :param locked: boolean mask of vertices to keep fixed
+    :return: smoothed copy of x
+    """
+    p = normalised_laplacian(laplacian, locked)
+    x = np.array(x, dtype=float)
+    for _ in range(iterations):
+        x += relaxation * (p @ x)
+    return x
+
+
+def taubin_smooth(
+        x: np.ndarray,
+        laplacian: sparse.spmatrix,
+        iterations: int = 10,
+        lam: float = TAUBIN_LAMBDA,
+        mu: float = TAUBIN_MU,
+        locked: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Taubin lambda|mu smoothing, which alternates a shrinking step of size lam
+    and an inflating step of size mu < -lam to smooth without shrinking.
+
+    :param x: (n, k) values per vertex
+    :param laplacian: (n, n) uniform or cotangent Laplacian
+    :param iterations: number of lambda|mu step pairs
+    :param lam: positive step size
+    :param mu: negative step size with abs(mu) > lam
+    :param locked: boolean mask of vertices to keep fixed
+    :return: smoothed copy of x
+    """
+    p = normalised_laplacian(laplacian, locked)
+    x = np.array(x, dtype=float)
+    for _ in range(iterations):
+        x += lam * (p @ x)
+        x += mu * (p @ x)
+    return x
+
+
+def implicit_smooth(
+        x: np.ndarray,
+        laplacian: sparse.spmatrix,
+        mass: Optional[sparse.spmatrix] = None,
+        time_step: float = 1.0,
+        iterations: int = 1,
+        locked: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Implicit (backward Euler) smoothing, solving (M - t L) x' = M x per
+    iteration. The system is factorised once and reused for every
+    iteration and column of x. Large time steps are stable.
+
+    :param x: (n, k) values per vertex
+    :param laplacian: (n, n) Laplacian L. If mass is None, L is normalised
+        as in normalised_laplacian and M is the identity.
+    :param mass: (n, n) mass matrix M, e.g. the lumped mass matrix with the
+        cotangent Laplacian
+    :param time_step: time step t
+    :param iterations: number of time steps
+    :param locked: boolean mask of vertices to keep fixed
+    :return: smoothed copy of x
+    """
+    n = laplacian.shape[0]
+    if mass is None:
+        mass = sparse.identity(n, format='csr')
+        laplacian = normalised_laplacian(laplacian)
+    a = (mass - time_step * laplacian).tocsr()
+
+    free = None
+    if locked is not None and np.any(locked):
+        # replace the rows of locked vertices by identity rows
+        free = ~np.asarray(locked)
+        a = sparse.diags(free.astype(float)) @ a + sparse.diags((~free).astype(float))
+
+    solve = splinalg.factorized(a.tocsc())
+    x = np.array(x, dtype=float)
+    squeeze = x.ndim == 1
+    if squeeze:
+        x = x[:, np.newaxis]
+    for _ in range(iterations):
+        b = mass @ x
+        if free is not None:
+            b[~free] = x[~free]
+        x = np.column_stack([solve(b[:, k]) for k in range(x.shape[1])])
+    if squeeze:
+        x = x[:, 0]
+    return x
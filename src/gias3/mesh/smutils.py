@@ -17,13 +17,26 @@ import logging
 from typing import List, Tuple, Dict, Optional
 
 import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
 from scipy.spatial.ckdtree import cKDTree
 from scipy.stats import mode
 
+from gias3.mesh.progress import ProgressCallback, ProgressReporter
 from gias3.mesh.simplemesh import SimpleMesh
 
 log = logging.getLogger(__name__)
 
+# maximum number of candidate vertex pairs tested together by weld_vertices
+WELD_CHUNK_PAIRS = 2 ** 22
+# finest grid used to find vertices within the weld tolerance, in cells
+# along the longest side of the bounding box, so that cell keys fit in int64
+WELD_MAX_CELLS = 2 ** 20
+# the 13 neighbouring cells after a cell in key order, and the cell itself
+_WELD_OFFSETS = np.array(
+    [o for o in itertools.product((-1, 0, 1), repeat=3) if o > (0, 0, 0)] + [(0, 0, 0)]
+)
+
 
 def make_sub_mesh(sm: SimpleMesh, face_indices: List[int]) -> SimpleMesh:
     """
@@ -41,37 +54,32 @@ def make_sub_mesh(sm: SimpleMesh, face_indices: List[int]) -> SimpleMesh:
 
     new_vertices = np.array(sm.v[unique_old_vertices_indices, :])
 
-    my_map = np.zeros(unique_old_vertices_indices[-1] + 1, dtype=int)
+    my_map = np.zeros(unique_old_vertices_indices[-1] + 1, dtype=sm.f.dtype)
     my_map[unique_old_vertices_indices] = unique_new_vertices_indices
 
     new_faces = my_map[old_faces]
 
-    return SimpleMesh(new_vertices, new_faces)
+    return SimpleMesh(new_vertices, new_faces, compact=sm.compact)
 
 
 def set_1ring_faces(sm: SimpleMesh) -> None:
     """
-    Create a dict of the adjacent faces of every face in sm
+    Create a CSRAdjacency of the adjacent faces of every face in sm
     """
-    log.debug('setting 1-ring for faces')
-
-    faces_1ring_faces = {}
-    # share_edge_sets = [None, None, None]
-    for fi, f in enumerate(sm.f):
-        # find 3 adj faces that share a side with f
-        shared_edge_set_0 = set(sm.faces1Ring[f[0]]).intersection(set(sm.faces1Ring[f[1]])).difference([fi])
-        shared_edge_set_1 = set(sm.faces1Ring[f[0]]).intersection(set(sm.faces1Ring[f[2]])).difference([fi])
-        shared_edge_set_2 = set(sm.faces1Ring[f[1]]).intersection(set(sm.faces1Ring[f[2]])).difference([fi])
-        faces_1ring_faces[fi] = shared_edge_set_0.union(shared_edge_set_1).union(shared_edge_set_2)
-
-    sm.faces1RingFaces = faces_1ring_faces
+    sm.set1RingFaces()
 
 
-def partition_regions(sm: SimpleMesh, maxfaces: int) -> Tuple[Dict[int, List[int]], np.ndarray]:
+def partition_regions(
+        sm: SimpleMesh,
+        maxfaces: int,
+        progress: Optional[ProgressCallback] = None) -> Tuple[Dict[int, List[int]], np.ndarray]:
     """
     Partition the mesh into regions of up to maxfaces connected faces.
     If maxfaces is inf, partitions the mesh into connected regions.
 
+    progress is an optional progress callback, see gias3.mesh.progress,
+    reporting the number of faces assigned to regions.
+
     returns
     -------
     label_faces: a dict of label number and the faces of that label
@@ -82,6 +90,7 @@ def partition_regions(sm: SimpleMesh, maxfaces: int) -> Tuple[Dict[int, List[int
     label_faces = {}
     face_labels = np.zeros(len(sm.f), dtype=int)
     reg_label = 0
+    reporter = ProgressReporter('partition regions', len(sm.f), progress)
 
     # while there are unpartitioned faces in sm
     while remaining_faces:
@@ -113,7 +122,9 @@ def partition_regions(sm: SimpleMesh, maxfaces: int) -> Tuple[Dict[int, List[int
         label_faces[reg_label] = reg_faces
         face_labels[reg_faces] = reg_label
         reg_label += 1
+        reporter.update(reg_nfaces)
 
+    reporter.finish()
     return label_faces, face_labels
 
 
@@ -191,20 +202,29 @@ def remove_small_regions_2(sm: SimpleMesh, k: int) -> Optional[SimpleMesh]:
         return None
 
 
-def partition_mesh(sm: SimpleMesh, maxfaces: int, minfaces: int) -> List[SimpleMesh]:
+def partition_mesh(
+        sm: SimpleMesh,
+        maxfaces: int,
+        minfaces: int,
+        progress: Optional[ProgressCallback] = None) -> List[SimpleMesh]:
     """
     Partitions sm into regions with upper and lower faces bounds
     """
 
-    region_faces, face_labels = partition_regions(sm, maxfaces)
+    region_faces, face_labels = partition_regions(sm, maxfaces, progress=progress)
     log.debug('merging {} regions'.format(len(region_faces)))
-    merge_regions(sm, region_faces, face_labels, minfaces)
+    merge_regions(sm, region_faces, face_labels, minfaces, progress=progress)
     log.debug('making {} region meshes'.format(len(region_faces)))
     region_sms = make_region_meshes(sm, region_faces)
     return region_sms
 
 
-def merge_regions(sm: SimpleMesh, region_faces: Dict[int, List[int]], face_labels: np.ndarray, min_faces: int) -> None:
+def merge_regions(
+        sm: SimpleMesh,
+        region_faces: Dict[int, List[int]],
+        face_labels: np.ndarray,
+        min_faces: int,
+        progress: Optional[ProgressCallback] = None) -> None:
     """
     Given a mesh and a partitioning of its faces, merge regions with fewer
     than minfaces faces into the neighbouring region with the longest shared
@@ -221,8 +241,12 @@ def merge_regions(sm: SimpleMesh, region_faces: Dict[int, List[int]], face_label
     minfaces : int
         the minimum number of faces a region can have. Any smaller regions
         will be merged
+    progress : callable, optional
+        progress callback, see gias3.mesh.progress, reporting the number
+        of regions merged
     """
 
+    reporter = ProgressReporter('merge regions', None, progress)
     face_centre_tree = cKDTree(sm.faceBarycenters)
 
     def find_adj_by_distance(r_faces):
@@ -258,15 +282,18 @@ def merge_regions(sm: SimpleMesh, region_faces: Dict[int, List[int]], face_label
                 else:
                     # get most common label of external adjacent faces
                     ext_adj_labels = [face_labels[i] for i in ext_adj_faces_set]
-                    parent_label = mode(ext_adj_labels)[0][0]
+                    parent_label = np.atleast_1d(mode(ext_adj_labels)[0])[0]
 
                 # merge this region into the parent label region
                 region_faces[parent_label] += reg_faces
                 del region_faces[ri]
                 face_labels[face_labels == ri] = parent_label
+                reporter.update()
         else:
             is_done = True
 
+    reporter.finish()
+
 
 def merge_sms(sms: List[SimpleMesh]) -> SimpleMesh:
     """
@@ -277,7 +304,206 @@ def merge_sms(sms: List[SimpleMesh]) -> SimpleMesh:
     new_sm = copy.deepcopy(sms[0])
     for sm in sms[1:]:
         v_offset = new_sm.v.shape[0]
-        new_sm.v = np.vstack([new_sm.v, sm.v])
-        new_sm.f = np.vstack([new_sm.f, np.array(sm.f) + v_offset])
+        new_sm.v = np.vstack([new_sm.v, sm.v]).astype(new_sm.v.dtype, copy=False)
+        new_sm.f = np.vstack([new_sm.f, np.array(sm.f) + v_offset]).astype(new_sm.f.dtype, copy=False)
 
     return new_sm
+
+
+def _exact_duplicates(v: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Group rows of v with identical coordinates, by sorting a 64 bit hash of
+    their bits.
+
+    :return: index of the first row of each group, in order of first
+        occurrence, and the group of each row
+    """
+    n = len(v)
+    # adding 0.0 turns -0.0 into 0.0
+    bits = np.ascontiguousarray(v + 0.0, dtype=np.float64).view(np.uint64)
+    h = bits[:, 0] * np.uint64(0x9E3779B97F4A7C15)
+    h ^= bits[:, 1] * np.uint64(0xC2B2AE3D27D4EB4F)
+    h ^= bits[:, 2] * np.uint64(0x165667B19E3779F9)
+    h ^= h >> np.uint64(29)
+    order = np.argsort(h, kind='stable')
+    sv = v[order]
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = (sv[1:] != sv[:-1]).any(1)
+    collision = new_group[1:] & (h[order[1:]] == h[order[:-1]])
+    if collision.any():
+        # different coordinates with the same hash may be interleaved
+        order = np.lexsort(v.T[::-1])
+        sv = v[order]
+        new_group[1:] = (sv[1:] != sv[:-1]).any(1)
+    return _relabel_groups(order, new_group)
+
+
+def _relabel_groups(order: np.ndarray, new_group: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Number groups of rows by their first row, given the rows sorted so that
+    groups are contiguous with each group in increasing row order.
+
+    :param order: row indices in sorted order
+    :param new_group: True at the first sorted position of each group
+    :return: index of the first row of each group, in increasing order,
+        and the group of each row
+    """
+    sorted_group = np.cumsum(new_group) - 1
+    first = order[new_group]
+    rank = np.empty(len(first), dtype=np.intp)
+    rank[np.argsort(first, kind='stable')] = np.arange(len(first))
+    group = np.empty(len(order), dtype=np.intp)
+    group[order] = rank[sorted_group]
+    return np.sort(first), group
+
+
+def _close_pairs(v: np.ndarray, tol: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    All pairs of rows of v within distance tol, found by hashing v onto a
+    grid of cells no smaller than tol and testing the vertices of each cell
+    against those of the same and neighbouring cells.
+    """
+    n = len(v)
+    lo = v.min(0)
+    cell = max(tol, (v.max(0) - lo).max() / WELD_MAX_CELLS)
+    # pad by one cell so that neighbours of every cell have valid keys
+    q = ((v - lo) / cell).astype(np.int64) + 1
+    dims = q.max(0) + 2
+    key = (q[:, 0] * dims[1] + q[:, 1]) * dims[2] + q[:, 2]
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    cells = key[starts]
+    counts = np.diff(np.r_[starts, n])
+
+    tol2 = tol * tol
+    pairs_a = []
+    pairs_b = []
+    for dx, dy, dz in _WELD_OFFSETS:
+        same = dx == 0 and dy == 0 and dz == 0
+        if same:
+            a = np.flatnonzero(counts > 1)
+            b = a
+        else:
+            neighbour = cells + (dx * dims[1] + dy) * dims[2] + dz
+            # neighbour is sorted, which keeps the search cache friendly
+            b = np.minimum(np.searchsorted(cells, neighbour), len(cells) - 1)
+            a = np.flatnonzero(cells[b] == neighbour)
+            b = b[a]
+        n_pairs = counts[a] * counts[b]
+        bounds = np.searchsorted(np.cumsum(n_pairs), np.arange(1, n_pairs.sum() + 1, WELD_CHUNK_PAIRS))
+        for i, j in zip(bounds, np.r_[bounds[1:], len(a)]):
+            # every pair of vertices of each pair of cells
+            cb, cn = counts[b[i:j]], n_pairs[i:j]
+            k = np.arange(cn.sum()) - np.repeat(np.cumsum(cn) - cn, cn)
+            cb_k = np.repeat(cb, cn)
+            ia = k // cb_k
+            ib = k % cb_k
+            va = order[np.repeat(starts[a[i:j]], cn) + ia]
+            vb = order[np.repeat(starts[b[i:j]], cn) + ib]
+            keep = ia < ib if same else np.ones(len(k), dtype=bool)
+            d = v[va[keep]] - v[vb[keep]]
+            close = np.einsum('ij,ij->i', d, d) <= tol2
+            pairs_a.append(va[keep][close])
+            pairs_b.append(vb[keep][close])
+
+    if not pairs_a:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    return np.concatenate(pairs_a), np.concatenate(pairs_b)
+
+
+def weld_vertices(v: np.ndarray, tol: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge vertices that are closer than tol.
+
+    Exact duplicates are merged first by hashing their coordinates. With
+    tol > 0 the remaining vertices are hashed onto a grid of cells of size
+    tol, pairs within tol in the same or neighbouring cells are found in
+    chunks of at most WELD_CHUNK_PAIRS, and vertices connected by such
+    pairs are merged. Merging is transitive, so a chain of vertices each
+    within tol of the next is merged into one.
+
+    :param v: (n, 3) vertex coordinates
+    :param tol: merging distance, 0 to merge only identical coordinates
+    :return: (n', 3) coordinates of the first vertex of each merged group,
+        in order of first occurrence, and the (n,) index of the new vertex
+        of each old vertex
+    """
+    v = np.asarray(v, dtype=float)
+    if len(v) == 0:
+        return v.reshape((0, 3)), np.zeros(0, dtype=np.intp)
+    first, vertex_map = _exact_duplicates(v)
+    if tol > 0 and len(first) > 1:
+        u = v[first]
+        a, b = _close_pairs(u, tol)
+        if len(a):
+            graph = sparse.coo_matrix((np.ones(len(a), dtype=bool), (a, b)), shape=(len(u), len(u)))
+            _, labels = csgraph.connected_components(graph, directed=False)
+            # each component is a contiguous run once sorted by label, and
+            # stays in increasing order within the run
+            order = np.argsort(labels, kind='stable')
+            new_group = np.ones(len(u), dtype=bool)
+            new_group[1:] = labels[order[1:]] != labels[order[:-1]]
+            first_u, group = _relabel_groups(order, new_group)
+            first = first[first_u]
+            vertex_map = group[vertex_map]
+    log.debug('welded %d vertices into %d', len(v), len(first))
+    return v[first], vertex_map
+
+
+def clean_faces(f: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Remove degenerate faces, with a repeated vertex, and duplicate faces,
+    with the same vertices as an earlier face in any order or orientation.
+
+    :param f: (m, 3) face vertex indices
+    :return: (m', 3) remaining faces, and the (m',) indices of the
+        remaining faces in f
+    """
+    f = np.asarray(f)
+    s = np.sort(f, axis=1)
+    valid = (s[:, 0] != s[:, 1]) & (s[:, 1] != s[:, 2])
+    kept = np.flatnonzero(valid)
+    if len(kept):
+        s = s[kept]
+        order = np.lexsort(s.T[::-1])
+        s = s[order]
+        new_face = np.ones(len(s), dtype=bool)
+        new_face[1:] = (s[1:] != s[:-1]).any(1)
+        # the first face of each group is the first in sorted order
+        # because lexsort is stable
+        kept = np.sort(kept[order[new_face]])
+    return f[kept], kept
+
+
+def weld(v: np.ndarray, f: np.ndarray, tol: float = 0.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merge vertices closer than tol, remap the faces, and remove the faces
+    that become degenerate or duplicated, see weld_vertices and
+    clean_faces.
+
+    :param v: (n, 3) vertex coordinates
+    :param f: (m, 3) face vertex indices
+    :param tol: merging distance, 0 to merge only identical coordinates
+    :return: new vertices, new faces, the index of the new vertex of each
+        old vertex, and the index of the old face of each new face
+    """
+    new_v, vertex_map = weld_vertices(v, tol)
+    f = np.asarray(f)
+    new_f, kept = clean_faces(vertex_map[f].astype(f.dtype, copy=False))
+    log.debug('removed %d faces', len(f) - len(new_f))
+    return new_v, new_f, vertex_map, kept
+
+
+def weld_mesh(sm: SimpleMesh, tol: float = 0.0) -> Tuple[SimpleMesh, np.ndarray, np.ndarray]:
+    """
+    Create a mesh with the vertices of sm closer than tol merged and the
+    degenerate and duplicate faces removed, see weld.
+
+    :param sm: the mesh to weld
+    :param tol: merging distance, 0 to merge only identical coordinates
+    :return: the welded mesh, the index of the new vertex of each vertex of
+        sm, and the index of the face of sm of each new face
+    """
+    v, f, vertex_map, kept = weld(sm.v, sm.f, tol)
+    return SimpleMesh(v, f, compact=sm.compact), vertex_map, kept
@@ -0,0 +1,229 @@
+"""
+FILE: surfacequery.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Batched closest point queries on triangle mesh surfaces
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+Query points are processed in chunks. For each chunk the candidate faces
+of every point are found with a bvh.FaceBVH, the closest point on every
+candidate face is computed in one vectorised pass, and the nearest is kept.
+Chunks are independent and are run on a pool of threads; numpy releases
+the GIL in the array operations that dominate the run time.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from gias3.mesh import bvh
+
+log = logging.getLogger(__name__)
+
+# number of query points per chunk
+CHUNK_POINTS = 4096
+
+
+def run_chunked(
+        func: Callable[[int, int], None],
+        n_items: int,
+        chunk_size: int,
+        n_workers: Optional[int] = None) -> None:
+    """
+    Call func(start, stop) for consecutive chunks of range(n_items) on a
+    pool of threads. func should write its results into preallocated
+    arrays.
+
+    :param n_workers: number of threads, defaults to the number of CPUs.
+        With 1, chunks are run in the calling thread.
+    """
+    starts = range(0, n_items, chunk_size)
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = min(n_workers, len(starts))
+    if n_workers <= 1:
+        for start in starts:
+            func(start, min(start + chunk_size, n_items))
+        return
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(func, start, min(start + chunk_size, n_items)) for start in starts]
+        for future in futures:
+            # re-raise any exception from the worker
+            future.result()
+
+
+def closest_point_barycentric(p: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """
+    Barycentric coordinates of the closest point on each triangle (a, b, c)
+    to each point p, by the Voronoi region tests of Ericson, Real-Time
+    Collision Detection, 5.1.5, applied to all rows at once.
+
+    :param p: (k, 3) points
+    :param a: (k, 3) first triangle vertices
+    :param b: (k, 3) second triangle vertices
+    :param c: (k, 3) third triangle vertices
+    :return: (k, 3) barycentric coordinates of a, b and c
+    """
+    ab = b - a
+    ac = c - a
+    ap = p - a
+    bp = p - b
+    cp = p - c
+    d1 = bvh._dot(ab, ap)
+    d2 = bvh._dot(ac, ap)
+    d3 = bvh._dot(ab, bp)
+    d4 = bvh._dot(ac, bp)
+    d5 = bvh._dot(ab, cp)
+    d6 = bvh._dot(ac, cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # interior, then the edge and vertex regions in reverse order of
+        # precedence so that earlier tests overwrite later ones
+        bary = np.empty((len(p), 3))
+        denom = va + vb + vc
+        bary[:, 1] = vb / denom
+        bary[:, 2] = vc / denom
+        bary[:, 0] = 1.0 - bary[:, 1] - bary[:, 2]
+        # degenerate triangles with no region below fall back to a
+        bary[~np.isfinite(bary).all(1)] = (1.0, 0.0, 0.0)
+
+        region = (va <= 0.0) & (d4 - d3 >= 0.0) & (d5 - d6 >= 0.0)
+        w = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        bary[region] = np.column_stack([np.zeros(region.sum()), 1.0 - w[region], w[region]])
+
+        region = (vb <= 0.0) & (d2 >= 0.0) & (d6 <= 0.0)
+        w = d2 / (d2 - d6)
+        bary[region] = np.column_stack([1.0 - w[region], np.zeros(region.sum()), w[region]])
+
+        bary[(d6 >= 0.0) & (d5 <= d6)] = (0.0, 0.0, 1.0)
+
+        region = (vc <= 0.0) & (d1 >= 0.0) & (d3 <= 0.0)
+        w = d1 / (d1 - d3)
+        bary[region] = np.column_stack([1.0 - w[region], w[region], np.zeros(region.sum())])
+
+        bary[(d3 >= 0.0) & (d4 <= d3)] = (0.0, 1.0, 0.0)
+        bary[(d1 <= 0.0) & (d2 <= 0.0)] = (1.0, 0.0, 0.0)
+
+    # edges of degenerate triangles can give 0 / 0
+    bary[~np.isfinite(bary).all(1)] = (1.0, 0.0, 0.0)
+    return bary
+
+
+def nearest_of_candidates(
+        v: np.ndarray,
+        f: np.ndarray,
+        points: np.ndarray,
+        queries: np.ndarray,
+        faces: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Closest point to each query point on the nearest of its candidate
+    faces.
+
+    :param v: (n, 3) vertex coordinates
+    :param f: (m, 3) face vertex indices
+    :param points: (k, 3) query points
+    :param queries: query index of each candidate, in ascending order
+    :param faces: face index of each candidate
+    :return: face index (k,), barycentric coordinates (k, 3), closest points
+        (k, 3) and squared distances (k,). Points without candidates have
+        face -1 and squared distance inf.
+    """
+    n = len(points)
+    nearest = np.full(n, -1, dtype=np.intp)
+    bary = np.zeros((n, 3))
+    closest = np.zeros((n, 3))
+    distance2 = np.full(n, np.inf)
+    if len(queries) == 0:
+        return nearest, bary, closest, distance2
+
+    fv = v[f[faces]].astype(float, copy=False)
+    pq = points[queries]
+    b = closest_point_barycentric(pq, fv[:, 0], fv[:, 1], fv[:, 2])
+    x = np.einsum('ij,ijk->ik', b, fv)
+    d2 = bvh._norm2(x - pq)
+
+    best = np.lexsort((d2, queries))
+    is_first = np.ones(len(best), dtype=bool)
+    is_first[1:] = queries[best[1:]] != queries[best[:-1]]
+    best = best[is_first]
+    q = queries[best]
+    nearest[q] = faces[best]
+    bary[q] = b[best]
+    closest[q] = x[best]
+    distance2[q] = d2[best]
+    return nearest, bary, closest, distance2
+
+
+def closest_points(
+        v: np.ndarray,
+        f: np.ndarray,
+        points: np.ndarray,
+        face_bvh: Optional[bvh.FaceBVH] = None,
+        chunk_size: int = CHUNK_POINTS,
+        n_workers: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Closest point on a triangle mesh surface to each query point.
+
+    :param v: (n, 3) vertex coordinates
+    :param f: (m, 3) face vertex indices
+    :param points: (k, 3) query points
+    :param face_bvh: FaceBVH of the mesh, built if None
+    :param chunk_size: number of query points per chunk
+    :param n_workers: number of threads, see run_chunked
+    :return: face index (k,), barycentric coordinates (k, 3) of the face
+        vertices, closest points (k, 3) and distances (k,)
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=float))
+    if len(f) == 0:
+        raise ValueError('mesh has no faces')
+    if face_bvh is None:
+        face_bvh = bvh.FaceBVH(v, f)
+
+    n = len(points)
+    faces = np.empty(n, dtype=np.intp)
+    bary = np.empty((n, 3))
+    closest = np.empty((n, 3))
+    distance2 = np.empty(n)
+
+    def query(start, stop):
+        p = points[start:stop]
+        q, fi = face_bvh.nearest_candidates(p, chunk_size=stop - start)
+        faces[start:stop], bary[start:stop], closest[start:stop], distance2[start:stop] = nearest_of_candidates(
+            face_bvh.v, face_bvh.f, p, q, fi
+        )
+
+    run_chunked(query, n, chunk_size, n_workers)
+    return faces, bary, closest, np.sqrt(distance2)
+
+
+def interpolate_vertex_field(
+        f: np.ndarray,
+        field: np.ndarray,
+        faces: np.ndarray,
+        bary: np.ndarray) -> np.ndarray:
+    """
+    Linearly interpolate a field defined at the vertices at points given
+    by face indices and barycentric coordinates, e.g. from closest_points.
+
+    :param f: (m, 3) face vertex indices
+    :param field: (n, ...) values at each vertex
+    :param faces: (k,) face index of each point
+    :param bary: (k, 3) barycentric coordinates of each point
+    :return: (k, ...) interpolated values
+    """
+    field = np.asarray(field)
+    corners = field[np.asarray(f)[faces]]
+    weights = np.asarray(bary).reshape(bary.shape + (1,) * (field.ndim - 1))
+    return (corners * weights).sum(1)
@@ -0,0 +1,591 @@
+"""
+FILE: topology.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Array-backed adjacency structures for triangulated meshes
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+"""
+import logging
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+log = logging.getLogger(__name__)
+
+
+def _index_dtype(n: int) -> type:
+    """
+    Smallest signed integer type that can index n items
+    """
+    if n < np.iinfo(np.int32).max:
+        return np.int32
+    return np.int64
+
+
+def _unique_keys(keys: np.ndarray, return_inverse: bool = False) -> Any:
+    """
+    Sort-based unique of a 1-d integer key array. Equivalent to numpy.unique
+    but avoids the hash-based path of recent numpy versions, which is slower
+    for the large integer key arrays used here.
+    """
+    if not return_inverse:
+        k = np.sort(keys)
+        return k[np.r_[True, k[1:] != k[:-1]]]
+
+    order = np.argsort(keys, kind='stable')
+    k = keys[order]
+    is_first = np.r_[True, k[1:] != k[:-1]]
+    inverse = np.empty(len(keys), dtype=np.int64)
+    inverse[order] = np.cumsum(is_first) - 1
+    return k[is_first], inverse
+
+
+class CSRAdjacency(object):
+    """
+    A read-only ragged array in compressed sparse row form. Row i holds the
+    indices adjacent to item i in indices[indptr[i]:indptr[i+1]].
+
+    Rows are returned as numpy array views. The class supports both the
+    list-style (len, iteration over rows) and dict-style (get, keys, items)
+    access used by code written against the dict-of-sets adjacency.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray):
+        # read-only views, so that rows shared between meshes cannot be
+        # changed in place. The arrays passed in stay writeable.
+        self.indptr = np.asarray(indptr).view()
+        self.indptr.flags.writeable = False
+        self.indices = np.asarray(indices).view()
+        self.indices.flags.writeable = False
+
+    @classmethod
+    def from_pairs(cls, rows: np.ndarray, cols: np.ndarray, n_rows: int) -> 'CSRAdjacency':
+        """
+        Build from (row, column) pairs. Columns keep their relative order
+        within each row.
+        """
+        dtype = _index_dtype(max(n_rows, len(cols)))
+        order = np.argsort(rows, kind='stable')
+        counts = np.bincount(rows, minlength=n_rows)
+        indptr = np.zeros(n_rows + 1, dtype=dtype)
+        np.cumsum(counts, out=indptr[1:])
+        indices = np.asarray(cols)[order].astype(dtype, copy=False)
+        return cls(indptr, indices)
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        i = int(i)
+        if i < 0 or i >= len(self):
+            raise KeyError(i)
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(len(self)):
+            yield self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def __contains__(self, i: Any) -> bool:
+        return 0 <= int(i) < len(self)
+
+    def get(self, i: int, default: Optional[Any] = None) -> Any:
+        try:
+            return self[i]
+        except KeyError:
+            return default
+
+    def keys(self) -> range:
+        return range(len(self))
+
+    def items(self) -> Iterator[Tuple[int, np.ndarray]]:
+        return zip(self.keys(), iter(self))
+
+    def lengths(self) -> np.ndarray:
+        """
+        Number of entries in each row
+        """
+        return np.diff(self.indptr)
+
+    def row_indices(self) -> np.ndarray:
+        """
+        The row index of each entry in self.indices
+        """
+        return np.repeat(np.arange(len(self), dtype=self.indices.dtype), self.lengths())
+
+    def take(self, rows: np.ndarray) -> 'CSRAdjacency':
+        """
+        A CSRAdjacency of the given rows, in the given order
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        counts = self.indptr[rows + 1] - self.indptr[rows]
+        indptr = np.zeros(len(rows) + 1, dtype=self.indptr.dtype)
+        np.cumsum(counts, out=indptr[1:])
+        offset = np.arange(indptr[-1]) - np.repeat(indptr[:-1], counts)
+        return CSRAdjacency(indptr, self.indices[np.repeat(self.indptr[rows], counts) + offset])
+
+    def to_sparse(self, n_cols: Optional[int] = None) -> sparse.csr_matrix:
+        """
+        Return the adjacency as a boolean scipy.sparse CSR matrix
+        """
+        if n_cols is None:
+            n_cols = int(self.indices.max()) + 1 if len(self.indices) else 0
+        data = np.ones(len(self.indices), dtype=bool)
+        return sparse.csr_matrix((data, self.indices, self.indptr), shape=(len(self), n_cols))
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes
+
+
+def mesh_edges(f: np.ndarray, n_vertices: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the unique undirected edges of a triangle mesh.
+
+    :param f: (m,3) array of face vertex indices
+    :param n_vertices: number of vertices in the mesh
+    :return: (e,2) array of unique edges with edges[:,0] < edges[:,1], and an
+        (m,3) array of the index into edges of each face's edges, ordered as
+        (f0-f1, f1-f2, f2-f0).
+    """
+    f = np.asarray(f)
+    a = f.ravel()
+    b = np.roll(f, -1, axis=1).ravel()
+    lo = np.minimum(a, b).astype(np.int64)
+    hi = np.maximum(a, b).astype(np.int64)
+    keys, inverse = _unique_keys(lo * n_vertices + hi, return_inverse=True)
+    dtype = _index_dtype(n_vertices)
+    edges = np.column_stack([keys // n_vertices, keys % n_vertices]).astype(dtype)
+    face_edges = inverse.reshape(f.shape).astype(_index_dtype(len(keys)))
+    return edges, face_edges
+
+
+def edge_face_adjacency(face_edges: np.ndarray, n_edges: int) -> np.ndarray:
+    """
+    For each edge, the faces it belongs to.
+
+    :param face_edges: (m,3) array of the edge indices of each face, see
+        mesh_edges
+    :param n_edges: number of edges
+    :return: (e,2) array of the first two faces of each edge in face order,
+        with -1 for boundary edges, which belong to one face
+    """
+    fe = np.asarray(face_edges).ravel()
+    order = np.argsort(fe, kind='stable')
+    counts = np.bincount(fe, minlength=n_edges)
+    starts = np.zeros(n_edges, dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+
+    edge_faces = np.full((n_edges, 2), -1, dtype=_index_dtype(len(face_edges)))
+    has_face = counts > 0
+    edge_faces[has_face, 0] = order[starts[has_face]] // 3
+    has_two = counts > 1
+    edge_faces[has_two, 1] = order[starts[has_two] + 1] // 3
+    return edge_faces
+
+
+def vertex_face_adjacency(f: np.ndarray, n_vertices: int) -> CSRAdjacency:
+    """
+    For each vertex, the faces it belongs to.
+    """
+    f = np.asarray(f)
+    face_ind = np.repeat(np.arange(f.shape[0]), f.shape[1])
+    return CSRAdjacency.from_pairs(f.ravel(), face_ind, n_vertices)
+
+
+def vertex_vertex_adjacency(f: np.ndarray, n_vertices: int) -> CSRAdjacency:
+    """
+    For each vertex, the vertices sharing an edge with it. Neighbours are
+    sorted in ascending order.
+    """
+    edges, _ = mesh_edges(f, n_vertices)
+    # drop degenerate edges from faces with repeated vertices
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    rows = np.hstack([edges[:, 0], edges[:, 1]])
+    cols = np.hstack([edges[:, 1], edges[:, 0]])
+    order = np.lexsort((cols, rows))
+    return CSRAdjacency.from_pairs(rows[order], cols[order], n_vertices)
+
+
+def face_face_adjacency(
+        f: np.ndarray,
+        n_vertices: int,
+        face_edges: Optional[np.ndarray] = None) -> CSRAdjacency:
+    """
+    For each face, the faces sharing at least one edge with it. Non-manifold
+    edges shared by more than two faces make all of their faces adjacent.
+    face_edges, as returned by mesh_edges, is computed if not given.
+    """
+    f = np.asarray(f)
+    n_faces = f.shape[0]
+    if face_edges is None:
+        _, face_edges = mesh_edges(f, n_vertices)
+    edge_ind = face_edges.ravel()
+    face_ind = np.repeat(np.arange(n_faces), f.shape[1])
+
+    # group face-edge instances by edge
+    order = np.argsort(edge_ind, kind='stable')
+    edge_sorted = edge_ind[order]
+    face_sorted = face_ind[order]
+    group_start = np.flatnonzero(np.r_[True, edge_sorted[1:] != edge_sorted[:-1]])
+    group_size = np.diff(np.r_[group_start, len(edge_sorted)])
+
+    # pair every instance with every instance in its group
+    inst_size = np.repeat(group_size, group_size)
+    inst_start = np.repeat(group_start, group_size)
+    a = np.repeat(np.arange(len(edge_sorted)), inst_size)
+    block_start = np.repeat(np.cumsum(inst_size) - inst_size, inst_size)
+    b = np.repeat(inst_start, inst_size) + (np.arange(len(a)) - block_start)
+
+    fa = face_sorted[a]
+    fb = face_sorted[b]
+    keep = fa != fb
+    keys = _unique_keys(fa[keep].astype(np.int64) * n_faces + fb[keep])
+    return CSRAdjacency.from_pairs(keys // n_faces, keys % n_faces, n_faces)
+
+
+def _sparse_2_csr_adjacency(m: sparse.csr_matrix) -> CSRAdjacency:
+    m.sort_indices()
+    dtype = _index_dtype(max(m.shape[0], m.nnz))
+    return CSRAdjacency(m.indptr.astype(dtype, copy=False), m.indices.astype(dtype, copy=False))
+
+
+def k_ring_neighbourhoods(
+        vertex_vertices: CSRAdjacency,
+        vertex_faces: CSRAdjacency,
+        r: int,
+        n_faces: int,
+        chunk_size: int = 50000,
+        update: Optional[Callable[[int], None]] = None) -> Tuple[CSRAdjacency, CSRAdjacency]:
+    """
+    Find the r-ring vertex and face neighbourhoods of every vertex at once.
+
+    The r-ring vertices of a vertex are those at most r edges away from it,
+    excluding the vertex itself. The r-ring faces are the faces incident to
+    any vertex at most r-1 edges away, i.e. the faces spanned by the r-ring.
+
+    Neighbourhoods are found by frontier expansion with sparse boolean
+    matrix products, processed in blocks of chunk_size vertices to bound
+    memory use.
+
+    :param vertex_vertices: vertex 1-ring adjacency
+    :param vertex_faces: vertex-face adjacency
+    :param r: neighbourhood radius in edges, at least 1
+    :param n_faces: number of faces in the mesh
+    :param chunk_size: number of vertices processed per block
+    :param update: called with the number of vertices in each block once it
+        is processed, e.g. ProgressReporter.update
+    :return: CSRAdjacency of r-ring vertices and of r-ring faces, each
+        with sorted rows
+    """
+    if r < 1:
+        raise ValueError('r must be at least 1')
+
+    n_vertices = len(vertex_vertices)
+    identity = sparse.identity(n_vertices, dtype=bool, format='csr')
+    adj = (vertex_vertices.to_sparse(n_vertices) + identity).tocsr()
+    incidence = vertex_faces.to_sparse(n_faces)
+
+    vertex_blocks = []
+    face_blocks = []
+    for start in range(0, n_vertices, chunk_size):
+        stop = min(start + chunk_size, n_vertices)
+        # (r-1)-ring of the block, including the vertices themselves
+        inner = identity[start:stop]
+        for _ in range(r - 1):
+            inner = inner @ adj
+        face_blocks.append(inner @ incidence)
+
+        # expand to the r-ring and drop the vertices themselves
+        outer = (inner @ adj).tocoo()
+        keep = outer.row + start != outer.col
+        vertex_blocks.append(sparse.csr_matrix(
+            (outer.data[keep], (outer.row[keep], outer.col[keep])), shape=outer.shape
+        ))
+        if update is not None:
+            update(stop - start)
+
+    neighbour_vertices = sparse.vstack(vertex_blocks, format='csr')
+    neighbour_faces = sparse.vstack(face_blocks, format='csr')
+    return _sparse_2_csr_adjacency(neighbour_vertices), _sparse_2_csr_adjacency(neighbour_faces)
+
+
+def boundary_edges(f: np.ndarray, n_vertices: int) -> np.ndarray:
+    """
+    Find the edges used by exactly one face.
+
+    :param f: (m,3) array of face vertex indices
+    :param n_vertices: number of vertices in the mesh
+    :return: (e,2) array of boundary edges, each directed as in its face
+    """
+    f = np.asarray(f)
+    half_edges = np.column_stack([f.ravel(), np.roll(f, -1, axis=1).ravel()])
+    lo = half_edges.min(1).astype(np.int64)
+    hi = half_edges.max(1).astype(np.int64)
+    _, inverse = _unique_keys(lo * n_vertices + hi, return_inverse=True)
+    is_boundary = np.bincount(inverse)[inverse] == 1
+    return half_edges[is_boundary]
+
+
+def _walk_fan(
+        half_edges: np.ndarray,
+        half_edge_keys: np.ndarray,
+        half_edge_order: np.ndarray,
+        n_vertices: int,
+        edge: np.ndarray,
+        candidates: np.ndarray) -> int:
+    """
+    Starting from boundary edge (a,b), rotate around b through the faces
+    sharing edges with the face of (a,b) until a boundary edge leaving b is
+    reached. Returns the index into candidates of that edge, or -1 if the
+    fan cannot be walked, e.g. because face orientations are inconsistent.
+
+    half_edge_keys are the sorted keys a*n_vertices+b of half_edges, and
+    half_edge_order the argsort that sorts them.
+    """
+
+    def find(x, y):
+        k = int(x) * n_vertices + int(y)
+        i = np.searchsorted(half_edge_keys, k)
+        if i < len(half_edge_keys) and half_edge_keys[i] == k:
+            return half_edge_order[i]
+        return -1
+
+    a, b = edge
+    candidate_ends = candidates[:, 1].tolist()
+    he = find(a, b)
+    for _ in range(len(half_edges)):
+        if he < 0:
+            return -1
+        # half-edge leaving b in the same face
+        fi, j = divmod(int(he), 3)
+        c = half_edges[fi * 3 + (j + 1) % 3, 1]
+        twin = find(c, b)
+        if twin < 0:
+            # no face on the other side, so this is a boundary edge
+            return candidate_ends.index(c) if c in candidate_ends else -1
+        he = twin
+    return -1
+
+
+def boundary_loops(f: np.ndarray, n_vertices: int) -> Tuple[List[np.ndarray], np.ndarray, np.ndarray]:
+    """
+    Find the boundaries of a mesh as ordered loops of vertices.
+
+    Boundary edges are chained through a lookup of the edge leaving each
+    edge's end vertex. Where a vertex is shared by more than one boundary,
+    the fan of faces attached to the incoming edge is walked around the
+    vertex. The outgoing edge at the other end of the fan borders a
+    different boundary, so the loop continues along another outgoing edge
+    and loops do not cross over each other.
+
+    :param f: (m,3) array of face vertex indices
+    :param n_vertices: number of vertices in the mesh
+    :return: a list of arrays of the ordered vertex indices of each loop,
+        an array of the length of each loop, and the (e,2) array of
+        directed boundary edges
+    """
+    edges = boundary_edges(f, n_vertices)
+    n_edges = len(edges)
+    if n_edges == 0:
+        return [], np.zeros(0, dtype=int), edges
+
+    # next edge is the edge starting at the end of the current edge
+    order = np.argsort(edges[:, 0], kind='stable')
+    starts = edges[order, 0]
+    first = np.searchsorted(starts, edges[:, 1], side='left')
+    n_next = np.searchsorted(starts, edges[:, 1], side='right') - first
+    next_edge = np.where(n_next == 1, order[np.minimum(first, n_edges - 1)], -1)
+
+    ambiguous = np.flatnonzero(n_next > 1)
+    if len(ambiguous):
+        f = np.asarray(f)
+        half_edges = np.column_stack([f.ravel(), np.roll(f, -1, axis=1).ravel()])
+        keys = half_edges[:, 0].astype(np.int64) * n_vertices + half_edges[:, 1]
+        he_order = np.argsort(keys)
+        he_keys = keys[he_order]
+        for ei in ambiguous:
+            candidates = order[first[ei]:first[ei] + n_next[ei]]
+            # the edge at the other end of the incoming edge's fan borders a
+            # different hole, so continue along one of the other edges
+            ci = _walk_fan(half_edges, he_keys, he_order, n_vertices, edges[ei], edges[candidates])
+            next_edge[ei] = candidates[1] if ci == 0 else candidates[0]
+
+    # follow next edges, starting from edges of open chains first
+    has_previous = np.zeros(n_edges, dtype=bool)
+    has_previous[next_edge[next_edge >= 0]] = True
+    edge_starts = edges[:, 0].tolist()
+    next_list = next_edge.tolist()
+    visited = [False] * n_edges
+    loops = []
+    for start in np.r_[np.flatnonzero(~has_previous), np.flatnonzero(has_previous)].tolist():
+        if visited[start]:
+            continue
+        loop = []
+        e = start
+        while e >= 0 and not visited[e]:
+            visited[e] = True
+            loop.append(edge_starts[e])
+            e = next_list[e]
+        loops.append(np.array(loop, dtype=edges.dtype))
+
+    lengths = np.array([len(l) for l in loops], dtype=int)
+    return loops, lengths, edges
+
+
+def breadth_first_forest(adjacency: CSRAdjacency) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Breadth-first spanning forest of a graph given by its adjacency. Each
+    connected component is seeded at its lowest index node.
+
+    :param adjacency: node adjacency, e.g. MeshTopology.vertex_vertices
+    :return: seed node of each component, depth of each node in its tree,
+        and predecessor of each node (-9999 for seeds)
+    """
+    n = len(adjacency)
+    graph = adjacency.to_sparse(n)
+    n_components, labels = csgraph.connected_components(graph, directed=False)
+    # first occurrence of each label is the lowest index node of a component
+    seeds = np.unique(labels, return_index=True)[1]
+    depth, predecessors, _ = csgraph.dijkstra(
+        graph, directed=False, indices=seeds, unweighted=True,
+        return_predecessors=True, min_only=True
+    )
+    return seeds, depth.astype(_index_dtype(n)), predecessors
+
+
+class MeshTopology(object):
+    """
+    Adjacency information of a triangle mesh, built on first access and
+    stored as CSR arrays.
+
+    Attributes
+    ----------
+    vertex_faces : CSRAdjacency
+        faces incident to each vertex
+    vertex_vertices : CSRAdjacency
+        vertices sharing an edge with each vertex
+    face_faces : CSRAdjacency
+        faces sharing an edge with each face
+    edges : (e,2) array
+        unique undirected edges
+    face_edges : (m,3) array
+        index into edges of the edges of each face
+    edge_faces : (e,2) array
+        faces of each edge, -1 for the missing face of boundary edges
+    """
+
+    def __init__(self, f: np.ndarray, n_vertices: Optional[int] = None):
+        self.f = np.asarray(f)
+        if n_vertices is None:
+            n_vertices = int(self.f.max()) + 1 if self.f.size else 0
+        self.n_vertices = n_vertices
+        self.n_faces = self.f.shape[0]
+        self._vertex_faces = None
+        self._vertex_vertices = None
+        self._face_faces = None
+        self._edges = None
+        self._face_edges = None
+        self._edge_faces = None
+        self._neighbourhoods = {}
+        self._boundary = None
+        self._vertex_components = None
+
+    @property
+    def vertex_faces(self) -> CSRAdjacency:
+        if self._vertex_faces is None:
+            log.debug('building vertex-face adjacency')
+            self._vertex_faces = vertex_face_adjacency(self.f, self.n_vertices)
+        return self._vertex_faces
+
+    @property
+    def vertex_vertices(self) -> CSRAdjacency:
+        if self._vertex_vertices is None:
+            log.debug('building vertex-vertex adjacency')
+            self._vertex_vertices = vertex_vertex_adjacency(self.f, self.n_vertices)
+        return self._vertex_vertices
+
+    @property
+    def face_faces(self) -> CSRAdjacency:
+        if self._face_faces is None:
+            log.debug('building face-face adjacency')
+            self._face_faces = face_face_adjacency(self.f, self.n_vertices, self.face_edges)
+        return self._face_faces
+
+    @property
+    def edges(self) -> np.ndarray:
+        if self._edges is None:
+            self._edges, self._face_edges = mesh_edges(self.f, self.n_vertices)
+        return self._edges
+
+    @property
+    def face_edges(self) -> np.ndarray:
+        if self._face_edges is None:
+            self._edges, self._face_edges = mesh_edges(self.f, self.n_vertices)
+        return self._face_edges
+
+    @property
+    def edge_faces(self) -> np.ndarray:
+        if self._edge_faces is None:
+            self._edge_faces = edge_face_adjacency(self.face_edges, len(self.edges))
+        return self._edge_faces
+
+    @property
+    def vertex_components(self) -> np.ndarray:
+        """
+        Connected component label of each vertex
+        """
+        if self._vertex_components is None:
+            log.debug('labelling connected components')
+            graph = self.vertex_vertices.to_sparse(self.n_vertices)
+            self._vertex_components = csgraph.connected_components(graph, directed=False)[1]
+        return self._vertex_components
+
+    def boundary(self) -> Tuple[List[np.ndarray], np.ndarray, np.ndarray]:
+        """
+        Ordered boundary loops, loop lengths, and directed boundary edges.
+        See boundary_loops.
+        """
+        if self._boundary is None:
+            log.debug('finding boundary loops')
+            self._boundary = boundary_loops(self.f, self.n_vertices)
+        return self._boundary
+
+    def neighbourhoods(
+            self,
+            r: int,
+            update: Optional[Callable[[int], None]] = None) -> Tuple[CSRAdjacency, CSRAdjacency]:
+        """
+        The r-ring vertex and face neighbourhoods of every vertex. Results
+        are cached per r.
+
+        :param update: see k_ring_neighbourhoods. Not called for cached
+            results.
+        """
+        if r not in self._neighbourhoods:
+            log.debug('building %d-ring neighbourhoods', r)
+            self._neighbourhoods[r] = k_ring_neighbourhoods(
+                self.vertex_vertices, self.vertex_faces, r, self.n_faces, update=update
+            )
+        return self._neighbourhoods[r]
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the adjacency arrays built so far
+        """
+        n = 0
+        for a in (self._vertex_faces, self._vertex_vertices, self._face_faces, self._edges, self._face_edges,
+                  self._edge_faces):
+            if a is not None:
+                n += a.nbytes
+        for vertices, faces in self._neighbourhoods.values():
+            n += vertices.nbytes + faces.nbytes
+        return n
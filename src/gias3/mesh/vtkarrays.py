@@ -0,0 +1,190 @@
+"""
+FILE: vtkarrays.py
+LAST MODIFIED: 16-10-2026
+DESCRIPTION: Bulk conversion between vtkPolyData and numpy arrays
+
+===============================================================================
+This file is part of GIAS2. (https://bitbucket.org/jangle/gias2)
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+===============================================================================
+
+Arrays are read through numpy_support.vtk_to_numpy, which wraps the VTK
+buffer without copying and keeps the VTK array alive for as long as the
+numpy view exists. Functions with a copy argument return such views when
+copy is False and no conversion is needed.
+"""
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+import vtk
+from vtk.util import numpy_support
+
+log = logging.getLogger(__name__)
+
+
+def polydata_points(polydata: vtk.vtkPolyData, copy: bool = True) -> np.ndarray:
+    """
+    (n, 3) point coordinates of a vtkPolyData.
+
+    :param copy: if True, return a float64 copy. Otherwise return a view of
+        the VTK point buffer in its own dtype, usually float32.
+    """
+    points = polydata.GetPoints()
+    if points is None:
+        return np.zeros((0, 3), dtype=float)
+    x = numpy_support.vtk_to_numpy(points.GetData())
+    if copy:
+        return np.array(x, dtype=float)
+    return x
+
+
+def polydata_point_normals(polydata: vtk.vtkPolyData, copy: bool = True) -> Optional[np.ndarray]:
+    """
+    (n, 3) point normals of a vtkPolyData, or None if it has none.
+
+    :param copy: see polydata_points
+    """
+    normals = polydata.GetPointData().GetNormals()
+    if normals is None:
+        return None
+    x = numpy_support.vtk_to_numpy(normals)
+    if copy:
+        return np.array(x, dtype=float)
+    return x
+
+
+def cell_array_2_numpy(cells: vtk.vtkCellArray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Offsets and connectivity of a vtkCellArray. The point ids of cell i
+    are connectivity[offsets[i]:offsets[i+1]]. Both are views of the VTK
+    buffers for VTK 9 and later.
+    """
+    if hasattr(cells, 'GetOffsetsArray'):
+        offsets = numpy_support.vtk_to_numpy(cells.GetOffsetsArray())
+        connectivity = numpy_support.vtk_to_numpy(cells.GetConnectivityArray())
+        return offsets, connectivity
+
+    # legacy layout of (number of ids, id, id, ...) for each cell
+    legacy = numpy_support.vtk_to_numpy(cells.GetData())
+    n_cells = cells.GetNumberOfCells()
+    if n_cells == 0:
+        return np.zeros(1, dtype=np.int64), legacy[:0]
+    # every cell has the same number of ids, typically all triangles
+    size = int(legacy[0])
+    if size > 0 and len(legacy) == (size + 1) * n_cells and np.all(legacy[::size + 1] == size):
+        offsets = np.arange(0, size * n_cells + 1, size, dtype=np.int64)
+        return offsets, legacy.reshape((n_cells, size + 1))[:, 1:].ravel()
+
+    # mixed cell sizes, find the start of each cell
+    starts = np.empty(n_cells, dtype=np.int64)
+    i = 0
+    for c in range(n_cells):
+        starts[c] = i
+        i += legacy[i] + 1
+    sizes = legacy[starts]
+    offsets = np.zeros(n_cells + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    is_id = np.ones(len(legacy), dtype=bool)
+    is_id[starts] = False
+    return offsets, legacy[is_id]
+
+
+def polygons_2_triangles(offsets: np.ndarray, connectivity: np.ndarray) -> np.ndarray:
+    """
+    Fan-triangulate polygon cells. A cell with k points gives the k - 2
+    triangles (p0, pj, pj+1). Cells with fewer than 3 points are dropped.
+
+    :return: (m, 3) triangles. A view of connectivity if every cell is a
+        triangle.
+    """
+    sizes = np.diff(offsets)
+    if len(sizes) and np.all(sizes == 3) and offsets[0] == 0:
+        return connectivity[:offsets[-1]].reshape((-1, 3))
+
+    n_tris = np.maximum(sizes - 2, 0)
+    cell = np.repeat(np.arange(len(sizes)), n_tris)
+    first_tri = np.cumsum(n_tris) - n_tris
+    j = np.arange(n_tris.sum()) - first_tri[cell] + 1
+    start = offsets[:-1][cell]
+    return np.column_stack([
+        connectivity[start], connectivity[start + j], connectivity[start + j + 1]
+    ])
+
+
+def strips_2_triangles(offsets: np.ndarray, connectivity: np.ndarray) -> np.ndarray:
+    """
+    Triangulate triangle strip cells. A strip with k points gives k - 2
+    triangles, with every second triangle reversed to keep a consistent
+    orientation.
+
+    :return: (m, 3) triangles
+    """
+    sizes = np.diff(offsets)
+    n_tris = np.maximum(sizes - 2, 0)
+    cell = np.repeat(np.arange(len(sizes)), n_tris)
+    first_tri = np.cumsum(n_tris) - n_tris
+    j = np.arange(n_tris.sum()) - first_tri[cell]
+    start = offsets[:-1][cell] + j
+    odd = (j % 2).astype(bool)
+    a = np.where(odd, connectivity[start + 1], connectivity[start])
+    b = np.where(odd, connectivity[start], connectivity[start + 1])
+    return np.column_stack([a, b, connectivity[start + 2]])
+
+
+def polydata_triangles(polydata: vtk.vtkPolyData, copy: bool = True) -> np.ndarray:
+    """
+    (m, 3) triangles of the polygon and triangle strip cells of a
+    vtkPolyData. Non-triangular polygons are fan-triangulated.
+
+    :param copy: if False and all cells are triangle polygons, return a
+        view of the VTK connectivity buffer, in the vtkIdType dtype.
+        Otherwise return a new int64 array.
+    """
+    triangles = []
+    polys = polydata.GetPolys()
+    if polys is not None and polys.GetNumberOfCells() > 0:
+        triangles.append(polygons_2_triangles(*cell_array_2_numpy(polys)))
+    strips = polydata.GetStrips()
+    if strips is not None and strips.GetNumberOfCells() > 0:
+        triangles.append(strips_2_triangles(*cell_array_2_numpy(strips)))
+
+    if len(triangles) == 0:
+        return np.zeros((0, 3), dtype=np.int64)
+    if len(triangles) == 1 and not copy:
+        return triangles[0]
+    return np.concatenate(triangles).astype(np.int64)
+
+
+def triangles_2_cell_array(triangles: np.ndarray) -> vtk.vtkCellArray:
+    """
+    vtkCellArray of triangles from an (m, 3) array. The ids are copied.
+    """
+    triangles = np.asarray(triangles)
+    cells = vtk.vtkCellArray()
+    id_type = numpy_support.get_vtk_to_numpy_typemap()[vtk.VTK_ID_TYPE]
+    if hasattr(cells, 'SetData') and hasattr(cells, 'GetOffsetsArray'):
+        offsets = np.arange(0, 3 * len(triangles) + 1, 3, dtype=id_type)
+        connectivity = np.ascontiguousarray(triangles, dtype=id_type).ravel()
+        cells.SetData(
+            numpy_support.numpy_to_vtkIdTypeArray(offsets, deep=True),
+            numpy_support.numpy_to_vtkIdTypeArray(connectivity, deep=True),
+        )
+    else:
+        legacy = np.empty((len(triangles), 4), dtype=id_type)
+        legacy[:, 0] = 3
+        legacy[:, 1:] = triangles
+        cells.SetCells(len(triangles), numpy_support.numpy_to_vtkIdTypeArray(legacy.ravel(), deep=True))
+    return cells
+
+
+def points_2_vtk(points: np.ndarray) -> vtk.vtkPoints:
+    """
+    vtkPoints from an (n, 3) array. The coordinates are copied.
+    """
+    vtk_points = vtk.vtkPoints()
+    vtk_points.SetData(numpy_support.numpy_to_vtk(np.ascontiguousarray(points, dtype=float), deep=True))
+    return vtk_points
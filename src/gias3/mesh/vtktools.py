@@ -27,6 +27,7 @@ from vtk.util import numpy_support
 from gias3.image_analysis.image_tools import Scan
 from gias3.mesh import plywriter
 from gias3.mesh import simplemesh
+from gias3.mesh import vtkarrays
 
 log = logging.getLogger(__name__)
 
@@ -377,13 +378,9 @@ class Reader(object):
         #     self._points = array([P.GetTuple9(i) for i in range(self._nPoints)])
 
     def _loadTriangles(self) -> None:
-        poly_data = self.polydata.GetPolys().GetData()
-        face_indices = numpy_support.vtk_to_numpy(poly_data)
-
-        # assumes that faces are triangular
-        face_indices = array(face_indices).reshape((-1, 4))
-        self._nFaces = face_indices.shape[0]
-        self._triangles = face_indices[:, 1:].copy()
+        # polygons with more than 3 points are fan-triangulated
+        self._triangles = vtkarrays.polydata_triangles(self.polydata)
+        self._nFaces = self._triangles.shape[0]
 
         if self.verbose:
             log.debug('loaded %s faces', self._nFaces)
@@ -400,8 +397,8 @@ class Reader(object):
         if self.verbose:
             log.debug('loaded %s vertex normals', self._nVertexNormals)
 
-    def getSimplemesh(self) -> simplemesh.SimpleMesh:
-        mesh = simplemesh.SimpleMesh(self._points, self._triangles)
+    def getSimplemesh(self, compact: Optional[bool] = None) -> simplemesh.SimpleMesh:
+        mesh = simplemesh.SimpleMesh(self._points, self._triangles, compact=compact)
 
         if self._vertexNormals is not None:
             mesh.vertexNormals = array(self._vertexNormals)
@@ -415,10 +412,10 @@ def savepoly(sm: simplemesh.SimpleMesh, filename: str, ascenc: bool = True) -> N
     w.write(filename, ascenc=ascenc)
 
 
-def loadpoly(filename: str, verbose: bool = False) -> simplemesh.SimpleMesh:
+def loadpoly(filename: str, verbose: bool = False, compact: Optional[bool] = None) -> simplemesh.SimpleMesh:
     r = Reader(verbose=verbose)
     r.read(filename)
-    return r.getSimplemesh()
+    return r.getSimplemesh(compact=compact)
 
 
 def renderPolyData(data: vtk.vtkPolyData):
@@ -531,18 +528,8 @@ def tri2Polydata(
         tris: ndarray,
         normals: bool = True,
         featureangle: Optional[float] = 60.0) -> vtk.vtkPolyData:
-    points = vtk.vtkPoints()
-    triangles = vtk.vtkCellArray()
-
-    for v in vertices:
-        points.InsertNextPoint(v)
-
-    for t in tris:
-        triangle = vtk.vtkTriangle()
-        triangle.GetPointIds().SetId(0, t[0])
-        triangle.GetPointIds().SetId(1, t[1])
-        triangle.GetPointIds().SetId(2, t[2])
-        triangles.InsertNextCell(triangle)
+    points = vtkarrays.points_2_vtk(vertices)
+    triangles = vtkarrays.triangles_2_cell_array(tris)
 
     polydata = vtk.vtkPolyData()
     polydata.SetPoints(points)
@@ -580,29 +567,13 @@ def polyData2Tri(p: vtk.vtkPolyData, pipeline: bool = False) -> Tuple[ndarray, n
         raise NoPolyDataError('no points in polydata')
 
     # get vertices
-    verts = array([p.GetPoint(i) for i in range(p.GetNumberOfPoints())])
+    verts = vtkarrays.polydata_points(p)
 
-    # get triangles
-    tris = []
-    for i in range(p.GetNumberOfCells()):
-        ids = p.GetCell(i).GetPointIds()
-        tris.append((ids.GetId(0), ids.GetId(1), ids.GetId(2)))
-
-    tris = array(tris, dtype=int)
-
-    # curvature
+    # get triangles, fan-triangulating larger polygons and triangle strips
+    tris = vtkarrays.polydata_triangles(p).astype(int, copy=False)
 
     # normals
-    polydata_normals = p.GetPointData().GetNormals()
-    if polydata_normals is not None:
-        s = polydata_normals.GetDataSize()
-        normals = zeros(s, dtype=float)
-        for i in range(s):
-            normals[i] = polydata_normals.GetValue(i)
-
-        normals = normals.reshape((int(s / 3), 3))
-    else:
-        normals = None
+    normals = vtkarrays.polydata_point_normals(p)
 
     return verts, tris, normals
 
@@ -1157,7 +1128,8 @@ def smoothMeshVTK(
         usewsinc: bool = True) -> simplemesh.SimpleMesh:
     """
     Apply smoothing to a SimpleMesh instance using VTK's SmoothPolyDataFilter
-    or WindowedSincPolyDataFilter.
+    or WindowedSincPolyDataFilter. SimpleMesh.smooth provides Laplacian and
+    Taubin smoothing without converting the mesh to vtkPolyData.
 
     inputs
     ======
@@ -1207,15 +1179,13 @@ def smoothMeshVTK(
     poly_smooth = smoother.GetOutput()
 
     v, t, n = polyData2Tri(poly_smooth)
-    mesh_smooth = simplemesh.SimpleMesh(v=v, f=t)
+    mesh_smooth = simplemesh.SimpleMesh(v=v, f=t, compact=mesh.compact)
     if mesh.has1Ring:
-        mesh_smooth.vertices1Ring = dict(mesh.vertices1Ring)
-        mesh_smooth.faces1Ring = dict(mesh.faces1Ring)
-        mesh_smooth.has1Ring = True
+        # smoothing does not change topology, so the read-only adjacency
+        # arrays can be shared
+        mesh_smooth.setTopology(mesh.topology)
     if mesh.hasNeighbourhoods:
-        mesh_smooth.neighbourFaces = list(mesh.neighbourFaces)
-        mesh_smooth.neighbourVertices = list(mesh.neighbourVertices)
-        mesh_smooth.hasNeighbourhoods = True
+        mesh_smooth.setVerticesNeighbourhoods(mesh.neighbourhoodSize)
     return mesh_smooth
 
 
@@ -1280,7 +1250,7 @@ def optimiseMesh(sm: simplemesh.SimpleMesh, deci_ratio: float, clean: bool = Fal
 
     # convert back to sm
     v, f, normals = polyData2Tri(get_previous_output())
-    new_sm = simplemesh.SimpleMesh(v=v, f=f)
+    new_sm = simplemesh.SimpleMesh(v=v, f=f, compact=sm.compact)
     return new_sm
 
 